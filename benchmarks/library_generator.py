@@ -0,0 +1,105 @@
+import os
+import random
+from dataclasses import dataclass
+from pathlib import Path
+
+from embroidery_template_cleaner.core.configuration import TEMPLATE_FILE_EXTENSIONS
+
+# The format benchmark runs keep; every other template format is deleted.
+KEPT_EXTENSION = '.pes'
+
+# Formats a vendor ships for each design (.ds_store is noise, not a format).
+DESIGN_FORMATS = sorted(TEMPLATE_FILE_EXTENSIONS - {'.ds_store', KEPT_EXTENSION})
+
+PREVIEW_FILE_NAMES = ['preview.png', 'preview.jpg', 'instructions.pdf']
+
+# --- Library Shape ---
+
+@dataclass
+class LibrarySpec:
+    """
+    The shape of a synthetic embroidery library. Designs sit in their own
+    folders, depth folder levels below a vendor folder, with fan_out entries
+    per folder. Each design folder ends up in one of three states after a
+    cleaning run that keeps only KEPT_EXTENSION:
+
+    - kept: it still holds the kept format (most designs),
+    - display-only: only preview files are left, so it needs confirmation,
+    - empty: nothing is left and the folder is removed.
+    """
+    entries: int
+    depth: int = 2
+    fan_out: int = 10
+    formats_per_design: int = 8
+    display_only_fraction: float = 0.05
+    empty_fraction: float = 0.15
+    preview_fraction: float = 0.3
+    ds_store_fraction: float = 0.5
+    max_file_size: int = 2048
+    seed: int = 0
+
+# --- Generator ---
+
+def generate_library(root: Path, spec: LibrarySpec) -> int:
+    """
+    Fills root with a synthetic library of about spec.entries files and
+    folders, deterministically for a given seed. Returns the exact number of
+    entries created below root.
+    """
+    rng = random.Random(spec.seed)
+    formats_per_design = min(spec.formats_per_design, len(DESIGN_FORMATS))
+    created_directories: set[str] = set()
+    entry_count = 0
+    design_index = 0
+
+    def make_directory(path: str):
+        nonlocal entry_count
+        if path in created_directories:
+            return
+        make_directory(os.path.dirname(path))
+        os.mkdir(path)
+        created_directories.add(path)
+        entry_count += 1
+        if rng.random() < spec.ds_store_fraction:
+            write_file(os.path.join(path, '.DS_Store'))
+
+    def write_file(path: str):
+        nonlocal entry_count
+        with open(path, 'wb') as handle:
+            handle.write(b'\0' * rng.randint(1, spec.max_file_size))
+        entry_count += 1
+
+    created_directories.add(str(root))
+    while entry_count < spec.entries:
+        design_directory = os.path.join(str(root), *_design_folder_parts(design_index, spec))
+        make_directory(design_directory)
+
+        stem = f"design_{design_index:07d}"
+        roll = rng.random()
+        if roll < spec.display_only_fraction:
+            extensions = rng.sample(DESIGN_FORMATS, formats_per_design)
+            previews = rng.sample(PREVIEW_FILE_NAMES, rng.randint(1, len(PREVIEW_FILE_NAMES)))
+        elif roll < spec.display_only_fraction + spec.empty_fraction:
+            extensions = rng.sample(DESIGN_FORMATS, formats_per_design)
+            previews = []
+        else:
+            extensions = [KEPT_EXTENSION] + rng.sample(DESIGN_FORMATS, formats_per_design - 1)
+            previews = PREVIEW_FILE_NAMES[:1] if rng.random() < spec.preview_fraction else []
+
+        for extension in extensions:
+            write_file(os.path.join(design_directory, f"{stem}{extension}"))
+        for name in previews:
+            write_file(os.path.join(design_directory, name))
+        design_index += 1
+
+    return entry_count
+
+def _design_folder_parts(design_index: int, spec: LibrarySpec) -> list[str]:
+    """Places consecutive designs side by side, fan_out to a folder, under numbered vendor and collection folders."""
+    parts = [f"design_{design_index:07d}"]
+    folder_index = design_index // spec.fan_out
+    for level in range(spec.depth - 1):
+        parts.append(f"collection_{folder_index % spec.fan_out:03d}")
+        folder_index //= spec.fan_out
+    parts.append(f"vendor_{folder_index:04d}")
+    return parts[::-1]
\ No newline at end of file
@@ -0,0 +1,233 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from embroidery_template_cleaner.cli import AutoResponder
+from embroidery_template_cleaner.core.configuration import Configuration, TEMPLATE_FILE_EXTENSIONS
+from embroidery_template_cleaner.core.events import (
+    RequestConfirmation,
+    RequestBatchConfirmation,
+    RequestRetrySkipAbort,
+    RunStatistics,
+    CleaningResult,
+    ErrorOccurred,
+    RetrySkipAbortChoice,
+)
+from embroidery_template_cleaner.core.worker import run_cleaning_task
+from .library_generator import KEPT_EXTENSION, LibrarySpec, generate_library
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+RESULTS_DIRECTORY = Path(__file__).parent / 'results'
+
+# File system calls made through the os module are counted by wrapping these.
+# (os.DirEntry methods answer from the directory listing and are not counted.)
+COUNTED_OS_FUNCTIONS = ['stat', 'lstat', 'scandir', 'listdir', 'unlink', 'remove', 'rmdir', 'open', 'rename', 'replace']
+
+# --- Measurement (runs in a fresh process) ---
+
+def _install_os_call_counters() -> Counter:
+    counts = Counter()
+    lock = threading.Lock()
+
+    def counting(name, function):
+        def wrapper(*args, **kwargs):
+            with lock:
+                counts[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    for name in COUNTED_OS_FUNCTIONS:
+        setattr(os, name, counting(name, getattr(os, name)))
+    return counts
+
+def _read_proc_io() -> dict[str, int]:
+    """Per-process syscall counters from /proc (Linux only)."""
+    try:
+        with open('/proc/self/io') as handle:
+            return {key: int(value) for key, value in (line.split(': ') for line in handle)}
+    except OSError:
+        return {}
+
+def _peak_rss_bytes() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        return None # Not available on Windows.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def measure_cleaning_run(root: str, extensions_to_delete: list[str], deletion_workers: int) -> dict:
+    """
+    Cleans root the way the CLI does (worker thread, automatic answers to
+    every prompt) and returns its measurements. Meant to run in a process of
+    its own, so peak RSS and syscall counts belong to this run alone.
+    """
+    config = Configuration(
+        target_directory=Path(root),
+        extensions_to_delete=set(extensions_to_delete),
+        deletion_workers=deletion_workers
+    )
+    responder = AutoResponder(
+        accept_confirmations=True,
+        error_choice=RetrySkipAbortChoice.SKIP,
+        max_retries=0
+    )
+    os_calls = _install_os_call_counters()
+    io_before = _read_proc_io()
+
+    update_queue = queue.Queue()
+    response_queue = queue.Queue()
+    start_time = time.perf_counter()
+    worker_thread = threading.Thread(
+        target=run_cleaning_task,
+        args=(config, update_queue, response_queue),
+        daemon=True
+    )
+    worker_thread.start()
+
+    progress_updates = 0
+    statistics = None
+    while True:
+        event = update_queue.get()
+        match event:
+            case RequestConfirmation() | RequestBatchConfirmation() | RequestRetrySkipAbort():
+                response_queue.put(responder.respond(event))
+            case RunStatistics():
+                statistics = event
+            case CleaningResult() | ErrorOccurred():
+                break
+            case _:
+                progress_updates += 1
+
+    wall_seconds = time.perf_counter() - start_time
+    worker_thread.join()
+    if isinstance(event, ErrorOccurred):
+        raise RuntimeError(f"Cleaning run failed: {event.message}\n{event.traceback}")
+
+    io_after = _read_proc_io()
+    return {
+        'wall_seconds': round(wall_seconds, 4),
+        'items_scanned': event.items_scanned,
+        'files_deleted': event.deleted_files_count,
+        'directories_removed': event.directories_removed,
+        'items_per_second': round(event.items_scanned / wall_seconds, 1),
+        'files_per_second': round(event.deleted_files_count / wall_seconds, 1),
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'os_calls': dict(os_calls),
+        'stat_calls': os_calls['stat'] + os_calls['lstat'],
+        # Stats the cleaner made through its metadata cache, including DirEntry.stat calls.
+        'cleaner_stat_calls': statistics.operation_counts.get('stat', 0),
+        'read_syscalls': io_after.get('syscr', 0) - io_before.get('syscr', 0) if io_after else None,
+        'write_syscalls': io_after.get('syscw', 0) - io_before.get('syscw', 0) if io_after else None,
+        'progress_updates': progress_updates,
+        'phase_seconds': {name: round(seconds, 4) for name, seconds in statistics.phase_seconds.items()},
+        'operation_counts': statistics.operation_counts,
+        'operation_seconds': {name: round(seconds, 4) for name, seconds in statistics.operation_seconds.items()}
+    }
+
+# --- Benchmark Driver ---
+
+def run_benchmark(spec: LibrarySpec, deletion_workers: int, temp_directory: str | None) -> dict:
+    """Generates a library for spec, cleans it in a fresh process and returns the result record."""
+    root = tempfile.mkdtemp(prefix='embroidery-benchmark-', dir=temp_directory)
+    try:
+        start_time = time.perf_counter()
+        entries = generate_library(Path(root), spec)
+        generation_seconds = time.perf_counter() - start_time
+
+        extensions_to_delete = sorted(TEMPLATE_FILE_EXTENSIONS - {KEPT_EXTENSION})
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            measurements = executor.submit(measure_cleaning_run, root, extensions_to_delete, deletion_workers).result()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        'target_entries': spec.entries,
+        'entries': entries,
+        'deletion_workers': deletion_workers,
+        'generation_seconds': round(generation_seconds, 3),
+        'spec': vars(spec),
+        **measurements
+    }
+
+def _result_key(result: dict) -> tuple:
+    return (result['target_entries'], result['deletion_workers'])
+
+def _print_result(result: dict, baseline: dict | None):
+    line = (f"{result['entries']:>9} entries, {result['deletion_workers']:>2} workers: "
+            f"{result['wall_seconds']:8.2f}s  {result['files_per_second']:>10.0f} files/s  "
+            f"{result['stat_calls']:>9} stats  peak RSS {(result['peak_rss_bytes'] or 0) / 2**20:7.1f} MiB")
+    if baseline is not None:
+        line += f"  ({result['wall_seconds'] / baseline['wall_seconds']:.2f}x the time of the baseline)"
+    print(line, flush=True)
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run_benchmarks',
+        description='Generate synthetic embroidery libraries and measure how a cleaning run scales.'
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, metavar='N',
+                        help='Approximate library sizes in files and folders (default: 10k, 100k and 1M).')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], metavar='N',
+                        help='Deletion worker counts to run each size with (default: 1).')
+    parser.add_argument('--depth', type=int, default=LibrarySpec.depth,
+                        help='Folder levels from a vendor folder down to a design folder.')
+    parser.add_argument('--fan-out', type=int, default=LibrarySpec.fan_out,
+                        help='Subfolders (or designs) per folder.')
+    parser.add_argument('--formats-per-design', type=int, default=LibrarySpec.formats_per_design,
+                        help='Template files per design.')
+    parser.add_argument('--seed', type=int, default=LibrarySpec.seed)
+    parser.add_argument('--temp-dir', metavar='PATH',
+                        help='Where to generate libraries (default: the system temp directory).')
+    parser.add_argument('--output', type=Path, metavar='PATH',
+                        help=f'Where to save the results as JSON (default: a new file in {RESULTS_DIRECTORY}).')
+    parser.add_argument('--compare', type=Path, metavar='PATH',
+                        help='Results of an earlier run to compare wall times against.')
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if args.compare:
+        baselines = {_result_key(r): r for r in json.loads(args.compare.read_text())['results']}
+
+    results = []
+    for size in args.sizes:
+        spec = LibrarySpec(
+            entries=size,
+            depth=args.depth,
+            fan_out=args.fan_out,
+            formats_per_design=args.formats_per_design,
+            seed=args.seed
+        )
+        for deletion_workers in args.workers:
+            result = run_benchmark(spec, deletion_workers, args.temp_dir)
+            results.append(result)
+            _print_result(result, baselines.get(_result_key(result)))
+
+    output = args.output or RESULTS_DIRECTORY / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }, indent=2))
+    print(f"Saved results to {output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
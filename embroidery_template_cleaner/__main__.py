@@ -0,0 +1,7 @@
+import sys
+
+from .cli import main
+
+# Guarded, since the processes of a sharded run import this module afresh.
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
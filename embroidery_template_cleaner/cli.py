@@ -0,0 +1,550 @@
+import argparse
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+# Only core modules are imported here: the CLI must start quickly and run
+# on machines without a display, so nothing from gui/ (or tkinter) is loaded.
+from .core.cancellation import CancellationToken
+from .core.configuration import (
+    Configuration,
+    DEFAULT_ARCHIVE_WORKERS,
+    DEFAULT_DELETION_WORKERS,
+    DEFAULT_HASH_WORKERS,
+    DEFAULT_QUARANTINE_RETENTION_DAYS,
+    DEFAULT_QUARANTINE_WORKERS,
+    DEFAULT_SCAN_WORKERS,
+    DEFAULT_SHARD_PROCESSES,
+    DEFAULT_TRANSIENT_ERROR_RETRIES,
+    setup_logging,
+)
+from .core.events import (
+    Event,
+    Response,
+    ProgressUpdate,
+    RequestConfirmation,
+    RequestBatchConfirmation,
+    RequestRetrySkipAbort,
+    RunStatistics,
+    CleaningResult,
+    ErrorOccurred,
+    UserConfirmationResponse,
+    BatchConfirmationResponse,
+    RetrySkipAbortResponse,
+    RetrySkipAbortChoice,
+)
+from .core.instrumentation import format_run_statistics
+from .core.journal import RunJournal
+from .core.planner import DeletionPlan, plan_directory_generator
+from .core.progress import estimate_remaining_seconds, format_duration, format_file_count, format_io_rates
+from .core.quarantine import QuarantineSummary, purge_quarantine_generator, restore_quarantine_generator
+from .core.worker import run_cleaning_task
+
+# --- Non-Interactive Event Handler ---
+
+class AutoResponder:
+    """
+    Answers the cleaner's interactive requests from fixed policies instead of
+    dialogs, so a run can complete unattended.
+
+    Args:
+        accept_confirmations: Whether display-only directories are deleted.
+        error_choice: What to do when an operation fails. RETRY is attempted
+                      at most max_retries times for the same path before
+                      falling back to SKIP.
+        max_retries: Retry budget per path when error_choice is RETRY.
+    """
+
+    def __init__(self, accept_confirmations: bool, error_choice: RetrySkipAbortChoice, max_retries: int):
+        self.accept_confirmations = accept_confirmations
+        self.error_choice = error_choice
+        self.max_retries = max_retries
+        self._retries_by_path: dict[str, int] = {}
+
+    def respond(self, event: Event) -> Response:
+        match event:
+            case RequestConfirmation(path, _):
+                logging.info(f"Auto-{'accepting' if self.accept_confirmations else 'rejecting'} confirmation for '{path}'")
+                return UserConfirmationResponse(accepted=self.accept_confirmations)
+
+            case RequestBatchConfirmation(directories):
+                logging.info(f"Auto-{'accepting' if self.accept_confirmations else 'rejecting'} "
+                             f"confirmation for {len(directories)} display-only folders")
+                accepted_paths = [d.path for d in directories] if self.accept_confirmations else []
+                return BatchConfirmationResponse(accepted_paths=accepted_paths)
+
+            case RequestRetrySkipAbort(op_desc, path, error_msg):
+                choice = self.error_choice
+                if choice == RetrySkipAbortChoice.RETRY:
+                    retries = self._retries_by_path.get(path, 0)
+                    if retries >= self.max_retries:
+                        choice = RetrySkipAbortChoice.SKIP
+                    else:
+                        self._retries_by_path[path] = retries + 1
+                logging.error(f"{error_msg} on {op_desc}; responding {choice.name}")
+                return RetrySkipAbortResponse(choice=choice)
+
+        raise TypeError(f"Unexpected request from worker: {event!r}")
+
+# --- Command Line Interface ---
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='embroidery_template_cleaner',
+        description='Recursively delete unwanted embroidery template formats without the GUI.'
+    )
+    parser.add_argument('directories', nargs='*', type=Path, metavar='directory',
+                        help='Directories to clean. Defaults to those in --config.')
+    parser.add_argument('-e', '--extension', dest='extensions', action='append', default=[], metavar='EXT',
+                        help="Extension to delete, e.g. '.pes'. May be repeated. Defaults to those in --config.")
+    parser.add_argument('-p', '--pattern', dest='patterns', action='append', default=[], metavar='GLOB',
+                        help="File name glob to delete as well, e.g. 'preview_*.png'. May be repeated.")
+    parser.add_argument('--min-size', type=int, metavar='BYTES',
+                        help='Only delete matching files of at least this many bytes.')
+    parser.add_argument('--max-size', type=int, metavar='BYTES',
+                        help='Only delete matching files of at most this many bytes.')
+    parser.add_argument('--older-than', type=int, metavar='DAYS',
+                        help='Only delete matching files last modified more than DAYS days ago.')
+    parser.add_argument('--no-ignore-files', action='store_true',
+                        help='Do not read .cleanerignore files, which list entries to leave alone.')
+    parser.add_argument('--keep-formats', type=int, metavar='N',
+                        help='Keep the best N formats of every design (files of a folder sharing a name) '
+                             'and delete its other formats, whatever the extensions to delete.')
+    parser.add_argument('--prefer', dest='preferred_formats', action='append', default=[], metavar='EXT',
+                        help='Format to keep with --keep-formats, best first. May be repeated '
+                             '(default: .pes, .dst, .exp, .jef, .vp3 and other common formats).')
+    parser.add_argument('--config', type=Path, metavar='PATH',
+                        help='Load settings from a JSON configuration file; other options override it.')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help=f'Number of parallel deletion workers (default: {DEFAULT_DELETION_WORKERS}).')
+    parser.add_argument('--processes', type=int, metavar='N',
+                        help='Clean the directories, or the top-level folders of a single directory, in N '
+                             f'processes at once (default: {DEFAULT_SHARD_PROCESSES}).')
+    parser.add_argument('--index', action='store_true',
+                        help='Use the persistent scan index to skip listing folders that have not changed.')
+    parser.add_argument('--scan-workers', type=int, metavar='N',
+                        help='Number of folders listed at once while scanning, e.g. on a network drive '
+                             f'(default: {DEFAULT_SCAN_WORKERS}).')
+    parser.add_argument('--ordered-scan', action='store_true',
+                        help='Scan folders and files in name order, so every run processes them in the same order.')
+    parser.add_argument('--no-dir-fd', action='store_true',
+                        help='Delete files and folders by their full paths rather than relative to the open folder.')
+    parser.add_argument('--max-ops', type=float, metavar='N',
+                        help='Throttle the run to at most N folder listings and file or folder removals per second, '
+                             'to spare a shared drive.')
+    parser.add_argument('--max-bytes-per-second', type=int, metavar='BYTES',
+                        help='Throttle the run to deleting files of at most BYTES bytes per second.')
+    parser.add_argument('--adaptive-throttle', action='store_true',
+                        help='Run fewer of the --workers deletions at once while the drive answers slowly, '
+                             'and more again once it recovers.')
+    parser.add_argument('--count-bytes', action='store_true',
+                        help='Report the bytes freed, at the cost of one stat of every file deleted.')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Also delete byte-identical copies of template files, keeping the one nearest the top.')
+    parser.add_argument('--hash-workers', type=int, metavar='N',
+                        help=f'Number of threads hashing files for --dedup (default: {DEFAULT_HASH_WORKERS}).')
+    parser.add_argument('--archives', action='store_true',
+                        help='Also remove the extensions from inside .zip archives, rewriting them in place.')
+    parser.add_argument('--archive-workers', type=int, metavar='N',
+                        help=f'Number of archives rewritten at once with --archives (default: {DEFAULT_ARCHIVE_WORKERS}).')
+    parser.add_argument('--quarantine', action='store_true',
+                        help='Move files into a quarantine folder in each directory instead of deleting them, '
+                             'so the run can be undone with --restore.')
+    parser.add_argument('--quarantine-days', type=int, metavar='N',
+                        help='Purge quarantined runs older than N days when quarantining again; 0 keeps them '
+                             f'(default: {DEFAULT_QUARANTINE_RETENTION_DAYS}).')
+    parser.add_argument('--restore', nargs='?', const='all', metavar='RUN',
+                        help="Move quarantined files back instead of cleaning: every quarantined run, "
+                             "or only RUN ('latest' for the newest).")
+    parser.add_argument('--purge', nargs='?', const='all', metavar='RUN',
+                        help="Delete quarantined files for good instead of cleaning: every quarantined run, "
+                             "or only RUN ('latest' for the newest).")
+    parser.add_argument('--journal', action='store_true',
+                        help='Record the run in a crash-safe journal so it can be resumed if interrupted.')
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='JOURNAL',
+                        help='Resume an interrupted journaled run (default: the newest one, '
+                             'for the given directory if there is one).')
+    parser.add_argument('--confirm', choices=['yes', 'no'], default='no',
+                        help='Answer for folders that only contain display files (default: no).')
+    parser.add_argument('--on-error', choices=['retry', 'skip', 'abort'], default='skip',
+                        help='What to do when a file or folder cannot be removed (default: skip).')
+    parser.add_argument('--max-retries', type=int, default=3, metavar='N',
+                        help='Retries per path before skipping, with --on-error retry (default: 3).')
+    parser.add_argument('--transient-retries', type=int, metavar='N',
+                        help='Automatic retries, with backoff, of errors such as locked files or network '
+                             f'hiccups before --on-error applies (default: {DEFAULT_TRANSIENT_ERROR_RETRIES}).')
+    parser.add_argument('--watch', action='store_true',
+                        help='After cleaning, keep running and clean new files as they arrive, until interrupted.')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only report what would be deleted; nothing on disk is changed.')
+    parser.add_argument('--plan-output', type=Path, metavar='PATH',
+                        help='With --dry-run, save the full deletion plan as JSON to PATH.')
+    parser.add_argument('--apply-plan', type=Path, metavar='PATH',
+                        help='Carry out a plan saved with --plan-output instead of scanning again.')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print how long each phase and file system operation of the run took.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run with cProfile; the top functions are included in --timings '
+                             'and the full profile is saved next to the log file.')
+    parser.add_argument('--format', choices=['text', 'json'], default='text',
+                        help='Output format for the result (default: text).')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Do not show progress on the terminal.')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Echo every log message to the terminal.')
+    return parser
+
+def _config_from_args(args: argparse.Namespace, plan: DeletionPlan | None) -> Configuration:
+    # --confirm answers every display-only folder up front, so none are asked about.
+    confirmation_policy = 'always' if args.confirm == 'yes' else 'never'
+    if len(args.directories) > 1 and (plan is not None or args.dry_run):
+        raise ValueError("Only a single directory can be cleaned with --dry-run, --apply-plan or --resume.")
+    if args.dedup and (plan is not None or args.dry_run):
+        raise ValueError("--dedup cannot be combined with --dry-run, --apply-plan or --resume.")
+    if args.archives and (plan is not None or args.dry_run):
+        raise ValueError("--archives cannot be combined with --dry-run, --apply-plan or --resume.")
+    if args.watch and (plan is not None or args.dry_run):
+        raise ValueError("--watch cannot be combined with --dry-run, --apply-plan or --resume.")
+    if args.quarantine and plan is not None:
+        raise ValueError("--quarantine cannot be combined with --apply-plan or --resume.")
+    if plan is not None:
+        # The plan fixes what is deleted; only execution options still apply.
+        return Configuration(
+            target_directory=Path(plan.target_directory),
+            extensions_to_delete=set(plan.extensions_to_delete),
+            deletion_workers=args.workers or DEFAULT_DELETION_WORKERS,
+            use_scan_index=args.index,
+            confirmation_policy=confirmation_policy,
+            transient_error_retries=_first_given(args.transient_retries, DEFAULT_TRANSIENT_ERROR_RETRIES),
+            profile_run=args.profile,
+            max_operations_per_second=args.max_ops,
+            max_bytes_per_second=args.max_bytes_per_second,
+            adaptive_throttle=args.adaptive_throttle,
+            count_bytes_freed=args.count_bytes
+        )
+
+    base = Configuration.from_json_file(args.config) if args.config else None
+
+    if args.directories:
+        target_directory, *additional_target_directories = args.directories
+    elif base:
+        target_directory, additional_target_directories = base.target_directory, base.additional_target_directories
+    else:
+        target_directory, additional_target_directories = None, []
+    if not target_directory:
+        raise ValueError("No target directory given.")
+
+    extensions = {ext.lower() if ext.startswith('.') else f'.{ext.lower()}' for ext in args.extensions}
+    extensions = extensions or (base.extensions_to_delete if base else set())
+    delete_patterns = args.patterns or (base.delete_patterns if base else [])
+    keep_formats = _first_given(args.keep_formats, base.keep_formats if base else 0)
+    if not extensions and not delete_patterns and not keep_formats:
+        raise ValueError("No extensions or patterns to delete given.")
+    format_preference = [ext.lower() if ext.startswith('.') else f'.{ext.lower()}' for ext in args.preferred_formats]
+    format_preference = format_preference or (base.format_preference if base else None)
+
+    deletion_workers = args.workers or (base.deletion_workers if base else DEFAULT_DELETION_WORKERS)
+    use_scan_index = args.index or (base.use_scan_index if base else False)
+    use_journal = args.journal or (base.use_journal if base else False)
+    if args.watch and use_journal:
+        raise ValueError("--watch cannot be combined with --journal.")
+    transient_error_retries = _first_given(
+        args.transient_retries,
+        base.transient_error_retries if base else DEFAULT_TRANSIENT_ERROR_RETRIES
+    )
+
+    return Configuration(
+        target_directory=target_directory,
+        extensions_to_delete=extensions,
+        deletion_workers=deletion_workers,
+        use_scan_index=use_scan_index,
+        use_journal=use_journal,
+        confirmation_policy=confirmation_policy,
+        transient_error_retries=transient_error_retries,
+        skip_permission_errors=base.skip_permission_errors if base else True,
+        defer_failed_operations=base.defer_failed_operations if base else True,
+        profile_run=args.profile or (base.profile_run if base else False),
+        additional_target_directories=additional_target_directories,
+        shard_processes=args.processes or (base.shard_processes if base else DEFAULT_SHARD_PROCESSES),
+        remove_duplicates=args.dedup or (base.remove_duplicates if base else False),
+        hash_workers=args.hash_workers or (base.hash_workers if base else DEFAULT_HASH_WORKERS),
+        filter_archives=args.archives or (base.filter_archives if base else False),
+        archive_workers=args.archive_workers or (base.archive_workers if base else DEFAULT_ARCHIVE_WORKERS),
+        use_quarantine=args.quarantine or (base.use_quarantine if base else False),
+        quarantine_retention_days=_first_given(
+            args.quarantine_days,
+            base.quarantine_retention_days if base else DEFAULT_QUARANTINE_RETENTION_DAYS
+        ),
+        scan_workers=args.scan_workers or (base.scan_workers if base else DEFAULT_SCAN_WORKERS),
+        ordered_scan=args.ordered_scan or (base.ordered_scan if base else False),
+        use_dir_fd=not args.no_dir_fd and (base.use_dir_fd if base else True),
+        delete_patterns=delete_patterns,
+        min_file_size=_first_given(args.min_size, base.min_file_size if base else 0),
+        max_file_size=_first_given(args.max_size, base.max_file_size if base else None),
+        min_file_age_days=_first_given(args.older_than, base.min_file_age_days if base else 0),
+        use_ignore_files=not args.no_ignore_files and (base.use_ignore_files if base else True),
+        keep_formats=keep_formats,
+        format_preference=format_preference,
+        max_operations_per_second=_first_given(args.max_ops, base.max_operations_per_second if base else None),
+        max_bytes_per_second=_first_given(args.max_bytes_per_second, base.max_bytes_per_second if base else None),
+        adaptive_throttle=args.adaptive_throttle or (base.adaptive_throttle if base else False),
+        count_bytes_freed=args.count_bytes or (base.count_bytes_freed if base else False)
+    )
+
+def _first_given(value, default):
+    return default if value is None else value
+
+def _quarantine_roots_from_args(args: argparse.Namespace) -> list[Path]:
+    """The directories whose quarantine --restore or --purge works on."""
+    if args.restore and args.purge:
+        raise ValueError("--restore and --purge cannot be combined.")
+    base = Configuration.from_json_file(args.config) if args.config else None
+    roots = args.directories or (base.target_directories if base else [])
+    if not roots:
+        raise ValueError("No target directory given.")
+    for root in roots:
+        if not root.is_dir():
+            raise ValueError(f"Target directory does not exist: {root}")
+    return roots
+
+def _journal_from_args(args: argparse.Namespace) -> RunJournal | None:
+    if not args.resume:
+        return None
+
+    if args.resume == 'latest':
+        path = RunJournal.find_unfinished(args.directories[0] if args.directories else None)
+        if path is None:
+            raise ValueError("No interrupted run to resume.")
+    else:
+        path = Path(args.resume)
+
+    journal = RunJournal.load(path)
+    if journal.finished:
+        raise ValueError(f"The run in {path} already finished.")
+    return journal
+
+def _print_result(
+    event: CleaningResult | ErrorOccurred,
+    output_format: str,
+    elapsed: float,
+    statistics: RunStatistics | None = None,
+    quarantined: bool = False,
+):
+    """
+    Prints the outcome. Statistics, if given, are included in JSON output.
+    quarantined says the files were moved into the quarantine, not deleted.
+    """
+    match event:
+        case CleaningResult(deleted_files_count, target_dir, directories_removed, items_scanned, bytes_freed, cancelled):
+            if output_format == 'json':
+                print(json.dumps({
+                    'status': 'cancelled' if cancelled else 'completed',
+                    'target_directory': target_dir,
+                    'deleted_files_count': deleted_files_count,
+                    'directories_removed': directories_removed,
+                    'items_scanned': items_scanned,
+                    'bytes_freed': bytes_freed,
+                    'quarantined': quarantined,
+                    'elapsed_seconds': round(elapsed, 3),
+                    'statistics': asdict(statistics) if statistics else None
+                }, indent=2))
+            elif quarantined:
+                print(f"{'Cancelled after quarantining' if cancelled else 'Quarantined'} "
+                      f"{format_file_count(deleted_files_count, bytes_freed)} (restore with --restore) and removed "
+                      f"{directories_removed} folders from {target_dir} ({items_scanned} items scanned in {elapsed:.1f}s).")
+            else:
+                print(f"{'Cancelled after deleting' if cancelled else 'Deleted'} "
+                      f"{format_file_count(deleted_files_count, bytes_freed)} and "
+                      f"{directories_removed} folders from {target_dir} ({items_scanned} items scanned in {elapsed:.1f}s).")
+
+        case ErrorOccurred(message, _):
+            if output_format == 'json':
+                print(json.dumps({'status': 'error', 'message': message}, indent=2))
+            else:
+                print(f"Error: {message}", file=sys.stderr)
+
+def _print_plan(plan: DeletionPlan, output_format: str):
+    if output_format == 'json':
+        print(json.dumps({
+            'status': 'planned',
+            'target_directory': plan.target_directory,
+            'files_count': len(plan.files),
+            'total_bytes': plan.total_bytes,
+            'files_by_extension': plan.files_by_extension,
+            'bytes_by_extension': plan.bytes_by_extension,
+            'bytes_by_top_level_folder': plan.bytes_by_top_level_folder,
+            'directories_count': len(plan.directories),
+            'directories_needing_confirmation': sum(1 for d in plan.directories if d.display_files),
+            'confirmation_bytes': plan.confirmation_bytes,
+            'items_scanned': plan.items_scanned
+        }, indent=2))
+        return
+
+    print(f"Would delete {len(plan.files)} files ({plan.total_bytes} bytes) from {plan.target_directory}.")
+    for extension in sorted(plan.bytes_by_extension):
+        print(f"  {extension:<10} {plan.files_by_extension[extension]:>8} files {plan.bytes_by_extension[extension]:>14} bytes")
+    print("By top-level folder:")
+    for folder, size in sorted(plan.bytes_by_top_level_folder.items(), key=lambda item: -item[1]):
+        print(f"  {size:>14} bytes  {folder}")
+    needing_confirmation = sum(1 for d in plan.directories if d.display_files)
+    print(f"Would remove {len(plan.directories)} folders, {needing_confirmation} of them only after confirming "
+          f"deletion of their display files ({plan.confirmation_bytes} bytes).")
+
+def _run_dry_run(config: Configuration, args: argparse.Namespace) -> int:
+    generator = plan_directory_generator(config)
+    try:
+        while True:
+            logging.info(next(generator).message)
+    except StopIteration as e:
+        plan: DeletionPlan = e.value
+
+    if args.plan_output:
+        args.plan_output.write_text(plan.to_json_str())
+    _print_plan(plan, args.format)
+    return 0
+
+def _run_quarantine_operation(roots: list[Path], args: argparse.Namespace) -> int:
+    """Restores or purges the quarantine of each directory. Fails if any file is left quarantined."""
+    workers = args.workers or DEFAULT_QUARANTINE_WORKERS
+    action = 'restored' if args.restore else 'purged'
+    run = args.restore or args.purge
+    summaries: dict[Path, QuarantineSummary] = {}
+    for root in roots:
+        if args.restore:
+            generator = restore_quarantine_generator(root, workers, None if run == 'all' else run)
+        else:
+            generator = purge_quarantine_generator(root, workers, None if run == 'all' else run)
+        try:
+            while True:
+                logging.info(next(generator).message)
+        except StopIteration as e:
+            summaries[root] = e.value
+
+    if args.format == 'json':
+        print(json.dumps({
+            'status': action,
+            'directories': [
+                {'target_directory': str(root), **asdict(summary)} for root, summary in summaries.items()
+            ]
+        }, indent=2))
+    else:
+        for root, summary in summaries.items():
+            print(f"{action.capitalize()} {summary.files} files from {summary.runs} quarantined runs in {root}"
+                  + (f" ({summary.files_left} left in quarantine)." if summary.files_left else "."))
+    return 1 if any(summary.files_left for summary in summaries.values()) else 0
+
+def _format_progress(update: ProgressUpdate) -> str:
+    """
+    The progress line: the share of the estimated total done and the time
+    left, once they are known, and the rates of a throttled run.
+    """
+    line = (f"Scanned {update.items_scanned} items ({update.items_per_second:.0f}/s), deleted "
+            f"{format_file_count(update.files_deleted, update.bytes_freed)} and {update.directories_removed} folders")
+    io_rates = format_io_rates(update)
+    if io_rates is not None:
+        line = f"{line} [{io_rates}]"
+    total = update.estimated_total_items
+    if not total:
+        return line
+    line = f"{min(100.0, 100 * update.items_scanned / total):3.0f}% {line}"
+    remaining = estimate_remaining_seconds(update)
+    return line if remaining is None else f"{line}, {format_duration(remaining)} left"
+
+def main(argv: list[str] | None = None) -> int:
+    """Runs a cleaning pass headlessly. Returns the process exit code."""
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+
+    if args.restore or args.purge:
+        try:
+            roots = _quarantine_roots_from_args(args)
+        except ValueError as err:
+            parser.error(str(err))
+        setup_logging(console_level=logging.INFO if args.verbose else logging.WARNING)
+        return _run_quarantine_operation(roots, args)
+
+    try:
+        journal = _journal_from_args(args)
+        if journal is not None:
+            plan = journal.plan
+        else:
+            plan = DeletionPlan.from_json_file(args.apply_plan) if args.apply_plan else None
+        config = _config_from_args(args, plan)
+    except ValueError as err:
+        parser.error(str(err))
+
+    setup_logging(console_level=logging.INFO if args.verbose else logging.WARNING)
+    if args.dry_run:
+        return _run_dry_run(config, args)
+
+    responder = AutoResponder(
+        accept_confirmations=args.confirm == 'yes',
+        error_choice=RetrySkipAbortChoice[args.on_error.upper()],
+        max_retries=args.max_retries
+    )
+    show_progress = not args.quiet and sys.stderr.isatty()
+
+    # Drive the same worker the GUI uses, answering its requests from the
+    # policies above instead of dialogs.
+    update_queue = queue.Queue()
+    response_queue = queue.Queue()
+    cancellation = CancellationToken()
+    worker_thread = threading.Thread(
+        target=run_cleaning_task,
+        args=(config, update_queue, response_queue, plan, journal),
+        # Estimating the total costs a quick listing of the trees; only worth it if progress is shown.
+        kwargs={'watch': args.watch, 'estimate_total': show_progress, 'cancellation': cancellation},
+        daemon=True
+    )
+    start_time = time.monotonic()
+    worker_thread.start()
+
+    statistics: RunStatistics | None = None
+    while True:
+        try:
+            event: Event = update_queue.get()
+        except KeyboardInterrupt:
+            # The first Ctrl+C cancels the run, which then reports what it
+            # did; a second one exits without waiting for it.
+            if cancellation.is_cancelled:
+                raise
+            cancellation.cancel()
+            if not args.watch:
+                print("\nCancelling...", file=sys.stderr)
+            continue
+
+        match event:
+            case ProgressUpdate():
+                if show_progress:
+                    # Cleared to the end of the line, which may have been longer before.
+                    print(f"\r{_format_progress(event)}\033[K", end='', file=sys.stderr, flush=True)
+
+            case RequestConfirmation() | RequestBatchConfirmation() | RequestRetrySkipAbort():
+                response_queue.put(responder.respond(event))
+
+            case RunStatistics():
+                statistics = event
+
+            case CleaningResult() | ErrorOccurred():
+                if show_progress:
+                    print(file=sys.stderr)
+                if isinstance(event, ErrorOccurred):
+                    logging.error(f"Error during cleaning: {event.message}\n{event.traceback}")
+                if args.timings and statistics is not None:
+                    print(format_run_statistics(statistics), file=sys.stderr)
+                # Lets a sharded run release its process resources before exiting.
+                worker_thread.join()
+                if isinstance(event, CleaningResult) and event.cancelled and args.watch:
+                    # Interrupting is how a watch is ended, so it is not an error.
+                    print(f"Stopped watching after deleting {event.deleted_files_count} files and "
+                          f"{event.directories_removed} folders.")
+                    return 0
+                _print_result(event, args.format, time.monotonic() - start_time, statistics, config.use_quarantine)
+                if isinstance(event, ErrorOccurred):
+                    return 1
+                return 130 if event.cancelled else 0
\ No newline at end of file
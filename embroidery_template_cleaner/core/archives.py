@@ -0,0 +1,232 @@
+import os
+import posixpath
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from .rules import DeletionRules
+
+ARCHIVE_EXTENSIONS = {'.zip'}
+
+# Retained members are copied through a buffer of this size, so memory use
+# does not grow with the size of an archive or of its members.
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Zip records (see PKWARE's APPNOTE.TXT), laid out as in the zipfile module.
+_LOCAL_FILE_HEADER = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_FILE_HEADER_SIGNATURE = b'PK\x03\x04'
+_CENTRAL_DIRECTORY_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_CENTRAL_DIRECTORY_HEADER_SIGNATURE = b'PK\x01\x02'
+_END_OF_CENTRAL_DIRECTORY = struct.Struct('<4s4H2LH')
+_END_OF_CENTRAL_DIRECTORY_SIGNATURE = b'PK\x05\x06'
+_DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+_DATA_DESCRIPTOR_FLAG = 0x08
+_UTF8_NAME_FLAG = 0x800
+_ZIP64_EXTRA_ID = 0x0001
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_COUNT_LIMIT = 0xFFFF
+
+class UnsupportedArchiveError(Exception):
+    """Raised for a valid archive that is left alone, such as a Zip64 one."""
+    pass
+
+@dataclass
+class ArchiveFilterResult:
+    members_removed: int
+    bytes_saved: int
+
+# --- Raw Member Copying ---
+
+def _copy_bytes(source: BinaryIO, target: BinaryIO, count: int):
+    while count:
+        chunk = source.read(min(count, COPY_CHUNK_BYTES))
+        if not chunk:
+            raise zipfile.BadZipFile("Archive is truncated")
+        target.write(chunk)
+        count -= len(chunk)
+
+def _copy_member(source: BinaryIO, target: BinaryIO, member: zipfile.ZipInfo):
+    """
+    Copies a member's local header, compressed data and data descriptor as
+    they are, so the data is never decompressed or compressed again.
+    """
+    source.seek(member.header_offset)
+    header = source.read(_LOCAL_FILE_HEADER.size)
+    if len(header) != _LOCAL_FILE_HEADER.size or header[:4] != _LOCAL_FILE_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad local file header for {member.filename}")
+    name_length, extra_length = _LOCAL_FILE_HEADER.unpack(header)[-2:]
+
+    target.write(header)
+    _copy_bytes(source, target, name_length + extra_length + member.compress_size)
+    if member.flag_bits & _DATA_DESCRIPTOR_FLAG:
+        # The descriptor's signature is optional.
+        descriptor_length = 16 if source.read(4) == _DATA_DESCRIPTOR_SIGNATURE else 12
+        source.seek(-4, os.SEEK_CUR)
+        _copy_bytes(source, target, descriptor_length)
+
+def _central_directory_record(member: zipfile.ZipInfo, header_offset: int) -> bytes:
+    """The member's central directory record, pointing at its new local header."""
+    year, month, day, hour, minute, second = member.date_time
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    name = member.orig_filename.encode('utf-8' if member.flag_bits & _UTF8_NAME_FLAG else 'cp437')
+    return _CENTRAL_DIRECTORY_HEADER.pack(
+        _CENTRAL_DIRECTORY_HEADER_SIGNATURE,
+        member.create_version, member.create_system, member.extract_version, member.reserved,
+        member.flag_bits, member.compress_type, dos_time, dos_date,
+        member.CRC, member.compress_size, member.file_size,
+        len(name), len(member.extra), len(member.comment),
+        member.volume, member.internal_attr, member.external_attr, header_offset
+    ) + name + member.extra + member.comment
+
+def _has_zip64_extra(extra: bytes) -> bool:
+    while len(extra) >= 4:
+        header_id, size = struct.unpack('<2H', extra[:4])
+        if header_id == _ZIP64_EXTRA_ID:
+            return True
+        extra = extra[4 + size:]
+    return False
+
+def _check_supported(members: list[zipfile.ZipInfo]):
+    if len(members) >= _ZIP64_COUNT_LIMIT or any(
+        member.header_offset >= _ZIP64_LIMIT
+        or member.compress_size >= _ZIP64_LIMIT
+        or member.file_size >= _ZIP64_LIMIT
+        or _has_zip64_extra(member.extra)
+        for member in members
+    ):
+        raise UnsupportedArchiveError("Zip64 archives are not filtered")
+
+# --- Archive Filtering ---
+
+def _member_name(member: zipfile.ZipInfo) -> str:
+    return posixpath.basename(member.filename)
+
+def filter_archive(path: str, rules: DeletionRules) -> ArchiveFilterResult:
+    """
+    Rewrites the zip archive at path without the members whose names rules
+    match (by extension or pattern; the size and age limits do not apply).
+    Kept members are copied raw, so memory use stays constant whatever the
+    size of the archive. The new archive is written to a temporary file next
+    to the old one, checked and flushed to disk, and then swapped in
+    atomically: if anything fails, the old archive is left untouched.
+
+    Raises zipfile.BadZipFile for an archive that cannot be read and
+    UnsupportedArchiveError for one that is left alone.
+    """
+    with open(path, 'rb') as source:
+        with zipfile.ZipFile(source) as archive:
+            members = archive.infolist()
+            comment = archive.comment
+        kept = [m for m in members if m.is_dir() or not rules.matches_name(_member_name(m))]
+        if len(kept) == len(members):
+            return ArchiveFilterResult(members_removed=0, bytes_saved=0)
+        _check_supported(members)
+
+        # The temporary file is hidden, and on the same file system so it can replace the archive.
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.zip.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as target:
+                records = []
+                for member in kept:
+                    records.append(_central_directory_record(member, target.tell()))
+                    _copy_member(source, target, member)
+                central_directory_offset = target.tell()
+                for record in records:
+                    target.write(record)
+                target.write(_END_OF_CENTRAL_DIRECTORY.pack(
+                    _END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0, 0, len(records), len(records),
+                    target.tell() - central_directory_offset, central_directory_offset, len(comment)
+                ) + comment)
+                target.flush()
+                os.fsync(target.fileno())
+                new_size = target.tell()
+
+            with zipfile.ZipFile(temp_path) as check:
+                if check.namelist() != [m.filename for m in kept]:
+                    raise zipfile.BadZipFile("The filtered archive does not list the kept members")
+            shutil.copymode(path, temp_path)
+            old_size = os.fstat(source.fileno()).st_size
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    # Swapped in only once the old archive is closed (Windows cannot replace an open file).
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return ArchiveFilterResult(members_removed=len(members) - len(kept), bytes_saved=old_size - new_size)
+
+# --- Bounded Parallel Archive Filter ---
+
+class ParallelArchiveFilter:
+    """
+    Filters many archives at once on a bounded thread pool, much like
+    ParallelUnlinker: results are handed back in submission order, so any
+    error can go through the usual Retry/Skip/Abort handling. Also keeps a
+    tally of what the run removed from archives.
+    """
+
+    def __init__(self, max_workers: int, rules: DeletionRules, max_in_flight: int | None = None):
+        self.rules = rules
+        self.archives_filtered = 0
+        self.members_removed = 0
+        self.bytes_saved = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="archive")
+        self._in_flight: deque[tuple[Future, str]] = deque()
+        self.max_in_flight = max_in_flight or max_workers * 2
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self._in_flight) >= self.max_in_flight
+
+    def filter(self, path: str) -> ArchiveFilterResult:
+        """Filters one archive on the calling thread, adding it to the tally."""
+        result = filter_archive(path, self.rules)
+        self.record(result)
+        return result
+
+    def record(self, result: ArchiveFilterResult):
+        if result.members_removed:
+            self.archives_filtered += 1
+            self.members_removed += result.members_removed
+            self.bytes_saved += result.bytes_saved
+
+    def _timed_filter(self, path: str) -> tuple[ArchiveFilterResult, float]:
+        start = time.perf_counter()
+        result = filter_archive(path, self.rules)
+        return result, time.perf_counter() - start
+
+    def submit(self, path: str):
+        """Schedules filtering the archive at path without waiting for it."""
+        self._in_flight.append((self._executor.submit(self._timed_filter, path), path))
+
+    def pop_oldest(self) -> tuple[str, ArchiveFilterResult | None, float, Exception | None]:
+        """
+        Waits for the oldest submitted archive and returns its path, result,
+        the seconds it took and the error it raised (None on success).
+        Successful results are added to the tally.
+        """
+        future, path = self._in_flight.popleft()
+        try:
+            result, seconds = future.result()
+        except (OSError, zipfile.BadZipFile, UnsupportedArchiveError) as e:
+            return path, None, 0.0, e
+        self.record(result)
+        return path, result, seconds, None
+
+    def shutdown(self):
+        """Cancels queued archives and waits for the ones already being filtered."""
+        self._in_flight.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
\ No newline at end of file
@@ -0,0 +1,58 @@
+import threading
+from typing import Generator, Iterable, TypeVar
+
+# Anything that blocks (waiting for new files, for shard processes or
+# before a retry) checks for cancellation at least this often.
+CANCELLATION_POLL_SECONDS = 0.1
+
+T = TypeVar('T')
+
+class OperationCancelledError(Exception):
+    """Raised when a run notices it was cancelled, once the work it had in flight has been settled."""
+    pass
+
+class CancellationToken:
+    """
+    Lets a run be cancelled from another thread (the GUI's Cancel button, or
+    Ctrl+C in the CLI). The run checks it between operations: loops over the
+    scan read is_cancelled, which is a plain attribute so checking it for
+    every entry costs next to nothing, and waits are made through wait() so
+    they end as soon as the run is cancelled.
+    """
+
+    def __init__(self):
+        self.is_cancelled = False
+        self._event = threading.Event()
+
+    def cancel(self):
+        self.is_cancelled = True
+        self._event.set()
+
+    def follow(self, event):
+        """Cancels this token once event (e.g. a multiprocessing Event shared with another process) is set."""
+        def wait_for_event():
+            event.wait()
+            self.cancel()
+        threading.Thread(target=wait_for_event, name="cancellation", daemon=True).start()
+
+    def wait(self, timeout: float) -> bool:
+        """Sleeps for timeout seconds, or until cancelled. Returns True if cancelled."""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled:
+            raise OperationCancelledError("The run was cancelled.")
+
+def cancellable(items: Iterable[T], cancellation: CancellationToken) -> Generator[T, None, None]:
+    """
+    Passes items through, raising OperationCancelledError before the next
+    one once cancelled. Closing it closes items, such as a scan.
+    """
+    iterator = iter(items)
+    try:
+        for item in iterator:
+            cancellation.raise_if_cancelled()
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
\ No newline at end of file
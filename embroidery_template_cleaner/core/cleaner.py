@@ -1,16 +1,43 @@
+import os
+import time
+import zipfile
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
-from typing import Generator, List, Callable
+from typing import Generator, Iterable, Iterator, Callable
 
-from .configuration import Configuration, DISPLAY_FILE_EXTENSIONS
+from .configuration import (
+    Configuration,
+    DEFAULT_QUARANTINE_WORKERS,
+    DISPLAY_FILE_EXTENSIONS,
+    INDEX_FILE_LOCATION,
+    matches_extensions,
+)
 from .events import (
     Event,
     Response,
     StatusUpdate,
     RequestConfirmation,
+    RequestBatchConfirmation,
+    DisplayOnlyDirectory,
     RequestRetrySkipAbort,
     RetrySkipAbortResponse,
     RetrySkipAbortChoice
 )
+from .archives import ARCHIVE_EXTENSIONS, ParallelArchiveFilter, UnsupportedArchiveError
+from .duplicates import find_duplicates_generator
+from .formats import FormatPolicy, FormatSelection, select_formats_generator
+from .dir_fd import DIR_FD_SUPPORTED, OpenDirectories, scan_tree_by_fd
+from .error_policy import ErrorPolicy
+from .executor import ParallelUnlinker
+from .instrumentation import RunMetrics
+from .progress import CleaningProgress
+from .quarantine import Quarantine, purge_quarantine_generator
+from .rules import DeletionRules, inherited_ignore_context
+from .scan_index import ScanIndex
+from .scanner import configured_scan_tree, scan_top_level, scan_new_entries, ScanItem, DirectoryEntered, DirectoryExited, UnlistedEntries, ScanError
+from .sharding import Shard
+from .throttle import IoThrottle, throttled, throttled_scan
 
 # --- Type Definitions ---
 
@@ -24,6 +51,11 @@ def _retryable_operation_generator(
     operation: Callable[[], None],
     operation_description: str,
     path: Path,
+    initial_error: OSError | None = None,
+    error_policy: ErrorPolicy | None = None,
+    on_deferred_success: Callable[[], None] | None = None,
+    attempts: int = 0,
+    metrics: RunMetrics | None = None,
 ) -> Generator[Event, Response, bool]:
     """
     A generic generator that executes a given operation and handles OSErrors
@@ -34,141 +66,893 @@ def _retryable_operation_generator(
         operation: A no-argument function that performs the I/O.
         operation_description: A human-readable string for the dialog.
         path: The file path involved in the operation.
+        initial_error: An error from an attempt already made elsewhere (e.g. on
+                       a worker thread). If given, the user is asked first and
+                       the operation only runs again on Retry.
+        error_policy: If given, it may answer for the user, retry transient
+                      errors automatically or defer the failure.
+        on_deferred_success: Lets the failure be deferred to the error
+                             policy's retry queue; called if a later attempt
+                             succeeds. A deferred operation returns False.
+        attempts: Automatic retries already made, counted against the
+                  policy's limit for transient errors.
+        metrics: If given, every attempt is timed in it under the
+                 operation's name (e.g. 'unlink' or 'rmdir').
     """
+    error = initial_error
     while True:
-        try:
-            operation()
-            return True # Success, exit the generator
-        except OSError as e:
+        if error is None:
+            try:
+                if metrics is None:
+                    operation()
+                else:
+                    metrics.timed(operation.__name__, operation)
+                return True # Success, exit the generator
+            except FileNotFoundError:
+                # Already gone (e.g. removed by an earlier pass); nothing to do.
+                return False
+            except OSError as e:
+                error = e
+
+        choice = error_policy.automatic_choice(error) if error_policy else None
+        if choice is None and error_policy is not None:
+            if error_policy.defer_failures and on_deferred_success is not None:
+                yield StatusUpdate(message=f"Error {operation_description}: {error}. Will retry later.")
+                error_policy.defer(operation, operation_description, path, error, on_deferred_success, attempts)
+                return False
+            if error_policy.should_retry(error, attempts):
+                delay = error_policy.backoff_delay(attempts)
+                yield StatusUpdate(message=f"Error {operation_description}: {error}. Retrying in {delay:.1f}s...")
+                if metrics is None:
+                    time.sleep(delay)
+                else:
+                    metrics.timed('retry backoff', time.sleep, delay)
+                attempts += 1
+                error = None
+                continue
+
+        if choice is None:
             # The operation failed, ask the user what to do.
             response: RetrySkipAbortResponse = yield RequestRetrySkipAbort(
                 operation_description=operation_description,
                 path=str(path),
-                error_message=str(e)
+                error_message=str(error)
             )
-            if response.choice == RetrySkipAbortChoice.ABORT:
-                raise OperationAbortedError("User aborted the operation.")
-            if response.choice == RetrySkipAbortChoice.SKIP:
-                return False # User chose to skip, exit the generator
-            # If RETRY, the loop continues and the operation is attempted again.
+            choice = response.choice
+            if response.apply_to_all and error_policy is not None:
+                error_policy.remember_choice(error, choice)
+        else:
+            action = "Aborting" if choice == RetrySkipAbortChoice.ABORT else "Skipping"
+            yield StatusUpdate(message=f"Error {operation_description}: {error}. {action} automatically.")
 
-# --- Sub-generator for Directory Emptiness Check ---
+        if choice == RetrySkipAbortChoice.ABORT:
+            raise OperationAbortedError("User aborted the operation.")
+        if choice == RetrySkipAbortChoice.SKIP:
+            return False # User chose to skip, exit the generator
+        # If RETRY, the loop continues and the operation is attempted again.
+        error = None
+
+# --- Per-Directory Bookkeeping for Post-Order Pruning ---
 
-def _is_directory_empty_and_confirm(path: Path) -> Generator[Event, Response, bool]:
+@dataclass
+class _DeferredDirectory:
     """
-    A generator that checks if a directory is empty or only contains display files.
-    If it only contains display files, it yields a RequestConfirmation.
-    Returns True if the directory is or becomes empty, False otherwise.
+    A directory whose removal waits for the batched confirmation at the end of
+    the run: it holds only display files and deferred subdirectories. It can
+    only be removed once all of its deferred subdirectories have been.
     """
-    if not path.is_dir():
-        return False
+    path: Path
+    display_files: list[os.DirEntry]
+    children: list['_DeferredDirectory']
+
+@dataclass
+class _DirectoryTally:
+    """
+    Tracks what is left in a directory while the scanner is inside it, so the
+    directory can be judged empty (or display-only) when it is exited without
+    listing it again.
+    """
+    path: Path
+    remaining_count: int = 0
+    display_files: list[os.DirEntry] = field(default_factory=list)
+    # Unlinks submitted to the parallel executor but not yet settled.
+    pending_count: int = 0
+    # Only directories that lost an entry during this run are pruning
+    # candidates; directories that were already empty are left alone.
+    changed: bool = False
+    # Subdirectories left for the batched confirmation; each still counts
+    # towards remaining_count.
+    deferred_children: list[_DeferredDirectory] = field(default_factory=list)
+
+# --- Sub-generator for File Deletion ---
+
+def _removal_operation(
+    path: Path,
+    quarantine: Quarantine | None,
+    directories: OpenDirectories | None = None,
+    throttle: IoThrottle | None = None,
+    size: int = 0,
+) -> Callable[[], None]:
+    """
+    Deletes the file at path or, given a quarantine, moves it there. The
+    operation is timed as 'unlink' or 'rename' accordingly. Given the scan's
+    open directories, the file is deleted relative to its directory. Given a
+    throttle, it waits for its turn, for a file of size bytes.
+    """
+    if quarantine is not None:
+        def rename():
+            quarantine.move(str(path))
+        return throttled(rename, throttle, size)
+    if directories is not None:
+        # Looked up when it runs, so a deferred retry falls back to the path.
+        def unlink():
+            directories.unlink(str(path))
+        return throttled(unlink, throttle, size)
+    return throttled(path.unlink, throttle, size)
+
+def _removal_verb(quarantine: Quarantine | None) -> str:
+    return "Deleting" if quarantine is None else "Quarantining"
 
+def _delete_file_generator(
+    entry: os.DirEntry,
+    error_policy: ErrorPolicy | None = None,
+    on_deferred_success: Callable[[], None] | None = None,
+    metrics: RunMetrics | None = None,
+    quarantine: Quarantine | None = None,
+    directories: OpenDirectories | None = None,
+    throttle: IoThrottle | None = None,
+    size: int = 0,
+) -> Generator[Event, Response, bool]:
+    """Deletes (or quarantines) a single file of size bytes, returning True if it was removed."""
+    path = Path(entry.path)
+    verb = _removal_verb(quarantine)
+    yield StatusUpdate(message=f"{verb} file: {path}")
+    return (yield from _retryable_operation_generator(
+        operation=_removal_operation(path, quarantine, directories, throttle, size),
+        operation_description=f"{verb.lower()} file '{path.name}'",
+        path=path,
+        error_policy=error_policy,
+        on_deferred_success=on_deferred_success,
+        metrics=metrics
+    ))
+
+def _counts_bytes_freed(config: Configuration) -> bool:
+    """
+    Whether a run counts the bytes it frees: if it is asked to, if its
+    throttle paces bytes, which needs every file's size anyway, or if its
+    size and age limits already stat every file the rules delete.
+    """
+    limits_stat_matches = (
+        DeletionRules.from_configuration(config).stats_matches
+        and not config.keep_formats and not config.remove_duplicates
+    )
+    return config.count_bytes_freed or config.max_bytes_per_second is not None or limits_stat_matches
+
+def _file_size(entry: os.DirEntry, progress: CleaningProgress, stat_cached: bool = False) -> int | None:
+    """
+    The size of a file about to be deleted, for the bytes freed (0 if it
+    cannot be found, None if the run does not count them). Unless the
+    entry's stat is cached (stat_cached), this is one more stat, and it
+    takes a turn of the throttle like the removal does.
+    """
+    if progress.bytes_freed is None:
+        return None
     try:
-        items = list(path.iterdir())
-    except PermissionError:
-        yield StatusUpdate(message=f"Permission error reading {path}. Skipping.")
-        return False
+        if stat_cached:
+            return entry.stat(follow_symlinks=False).st_size
+        return throttled(partial(progress.metadata.lstat, entry), progress.throttle)().st_size
+    except OSError:
+        return 0
+
+def _settle_oldest_unlink_generator(
+    unlinker: ParallelUnlinker,
+    progress: CleaningProgress,
+    error_policy: ErrorPolicy | None = None,
+    quarantine: Quarantine | None = None,
+    directories: OpenDirectories | None = None,
+) -> Generator[Event, Response, bool]:
+    """
+    Waits for the oldest in-flight parallel unlink, counts it if the file was
+    removed and records its outcome in its directory's tally. A failure goes
+    through the same Retry/Skip/Abort protocol as a serial deletion. Returns
+    True if the file was removed.
+    """
+    path_str, (entry, tally), size, error = progress.metrics.timed('parallel unlink wait', unlinker.pop_oldest)
+    tally.pending_count -= 1
+
+    if error is None:
+        deleted = True
+    elif isinstance(error, FileNotFoundError):
+        deleted = False
+    else:
+        path = Path(path_str)
+        size = _file_size(entry, progress)
+        deleted = yield from _retryable_operation_generator(
+            operation=_removal_operation(path, quarantine, directories, progress.throttle, size or 0),
+            operation_description=f"{_removal_verb(quarantine).lower()} file '{path.name}'",
+            path=path,
+            initial_error=error,
+            error_policy=error_policy,
+            on_deferred_success=partial(_count_deleted_file, progress, size),
+            metrics=progress.metrics
+        )
+
+    if deleted:
+        _count_deleted_file(progress, size)
+    _record_file_outcome(tally, entry, deleted)
+    return deleted
 
-    if not items:
+def _settle_oldest_archive_generator(
+    archive_filter: ParallelArchiveFilter,
+    progress: CleaningProgress,
+    error_policy: ErrorPolicy | None = None,
+) -> Generator[Event, Response, None]:
+    """
+    Waits for the oldest archive being filtered. A file system error goes
+    through the usual Retry/Skip/Abort protocol; an archive that cannot be
+    read (or is not filtered) is skipped with a message.
+    """
+    path, result, seconds, error = archive_filter.pop_oldest()
+    if isinstance(error, (zipfile.BadZipFile, UnsupportedArchiveError)):
+        yield StatusUpdate(message=f"Skipping archive {path}: {error}")
+        return
+    if isinstance(error, FileNotFoundError):
+        return
+
+    if error is None:
+        progress.metrics.record('filter_archive', seconds)
+    else:
+        results = []
+        def filter_archive():
+            results.append(archive_filter.filter(path))
+        yield from _retryable_operation_generator(
+            operation=filter_archive,
+            operation_description=f"filtering archive '{os.path.basename(path)}'",
+            path=Path(path),
+            initial_error=error,
+            error_policy=error_policy,
+            metrics=progress.metrics
+        )
+        result = results[-1] if results else None
+
+    if result is not None and result.members_removed:
+        if progress.bytes_freed is not None:
+            progress.bytes_freed += result.bytes_saved
+        yield StatusUpdate(message=f"Removed {result.members_removed} files from archive: {path}")
+
+def _record_file_outcome(tally: _DirectoryTally, entry: os.DirEntry, deleted: bool, is_file: bool = True):
+    """
+    Updates a directory's tally for an entry that was either deleted or kept.
+    is_file says whether the entry is a file, as already looked up by the
+    caller, so it is not classified twice.
+    """
+    if deleted:
+        tally.changed = True
+        return
+
+    tally.remaining_count += 1
+    if is_file and matches_extensions(entry.name, DISPLAY_FILE_EXTENSIONS):
+        tally.display_files.append(entry)
+
+# --- Sub-generator for Directory Emptiness Check ---
+
+def _is_directory_empty_and_confirm(
+    tally: _DirectoryTally,
+    confirmation_policy: str,
+    error_policy: ErrorPolicy | None = None,
+    metrics: RunMetrics | None = None,
+    quarantine: Quarantine | None = None,
+    directories: OpenDirectories | None = None,
+    throttle: IoThrottle | None = None,
+) -> Generator[Event, Response, bool]:
+    """
+    A generator that checks, from the tally gathered during the scan, if a
+    directory is empty or only contains display files. If it only contains
+    display files, they are deleted if confirmation_policy approves: 'ask'
+    yields a RequestConfirmation, 'always' and 'never' decide without asking
+    and 'batch' leaves the directory for the end of the run.
+    Returns True if the directory is or becomes empty, False otherwise.
+    """
+    if tally.remaining_count == 0:
         return True
 
-    display_files = [item for item in items if item.is_file() and item.suffix.lower() in DISPLAY_FILE_EXTENSIONS]
-    
-    if len(display_files) == len(items):
+    if tally.remaining_count != len(tally.display_files) or confirmation_policy == 'batch':
+        return False
+
+    path = tally.path
+    if confirmation_policy == 'ask':
         response: Response = yield RequestConfirmation(
             path=str(path),
-            files_in_dir=[f.name for f in display_files]
+            files_in_dir=[f.name for f in tally.display_files]
         )
+        accepted = response.accepted
+    else:
+        accepted = confirmation_policy == 'always'
 
-        if not response.accepted:
-            yield StatusUpdate(message=f"Skipping deletion of display files in {path.name}.")
-            return False
+    if not accepted:
+        yield StatusUpdate(message=f"Skipping deletion of display files in {path.name}.")
+        return False
 
-        yield StatusUpdate(message=f"Deleting display files in {path.name}...")
-        # Note: We don't need the count back from this, so we just yield from it.
-        yield from _delete_matching_files_generator(
-            all_paths=display_files,
-            config=Configuration(target_directory=path, extensions_to_delete=DISPLAY_FILE_EXTENSIONS)
-        )
+    yield StatusUpdate(message=f"{_removal_verb(quarantine)} display files in {path.name}...")
+    for display_file in tally.display_files:
+        if (yield from _delete_file_generator(
+            display_file, error_policy, metrics=metrics, quarantine=quarantine, directories=directories,
+            throttle=throttle
+        )):
+            tally.remaining_count -= 1
+
+    return tally.remaining_count == 0
+
+# --- Sub-generator for Post-Order Directory Pruning ---
+
+def _prune_directory_generator(
+    tally: _DirectoryTally,
+    progress: CleaningProgress,
+    confirmation_policy: str,
+    error_policy: ErrorPolicy | None = None,
+    quarantine: Quarantine | None = None,
+    directories: OpenDirectories | None = None,
+) -> Generator[Event, Response, bool]:
+    """
+    Called once per directory when the scanner exits it. Removes the directory
+    if it lost entries during this run and is now empty (or display-only and
+    confirmed). Returns True if the directory was removed.
+    """
+    if not tally.changed:
+        return False
+
+    if not (yield from _is_directory_empty_and_confirm(
+        tally, confirmation_policy, error_policy, progress.metrics, quarantine, directories, progress.throttle
+    )):
+        return False
+
+    return (yield from _remove_directory_generator(tally.path, progress, error_policy, deferrable=True, directories=directories))
+
+def _remove_directory_generator(
+    path: Path,
+    progress: CleaningProgress,
+    error_policy: ErrorPolicy | None = None,
+    deferrable: bool = False,
+    directories: OpenDirectories | None = None,
+) -> Generator[Event, Response, bool]:
+    """Removes an empty directory, relative to its parent if given the scan's open directories."""
+    operation = path.rmdir
+    if directories is not None:
+        def rmdir():
+            directories.rmdir(str(path))
+        operation = rmdir
+    operation = throttled(operation, progress.throttle)
+    yield StatusUpdate(message=f"Removing empty directory: {path}")
+    removed = yield from _retryable_operation_generator(
+        operation=operation,
+        operation_description=f"removing directory '{path.name}'",
+        path=path,
+        error_policy=error_policy,
+        on_deferred_success=partial(_count_removed_directory, progress) if deferrable else None,
+        metrics=progress.metrics
+    )
+    if removed:
+        progress.directories_removed += 1
+    return removed
+
+# --- Deferred Retries ---
+
+def _count_deleted_file(progress: CleaningProgress, size: int | None = 0):
+    progress.files_deleted += 1
+    if progress.bytes_freed is not None:
+        progress.bytes_freed += size or 0
+
+def _count_removed_directory(progress: CleaningProgress):
+    progress.directories_removed += 1
+
+def _retry_deferred_operations_generator(
+    error_policy: ErrorPolicy,
+    progress: CleaningProgress,
+    prune_below: Path | None = None,
+) -> Generator[Event, Response, None]:
+    """
+    Works through the failures the error policy deferred during the pass, in
+    the order they fall due. Transient errors are retried with exponential
+    backoff; whatever still fails then goes through the usual Retry/Skip/Abort
+    handling. If prune_below is given, directories below it that are left
+    empty by a late deletion are removed as well.
+    """
+    if error_policy.deferred_count:
+        yield StatusUpdate(message=f"Retrying {error_policy.deferred_count} failed operations...")
+
+    while (deferred := error_policy.pop_deferred()) is not None:
+        progress.cancellation.raise_if_cancelled()
+        delay = deferred.due_time - time.monotonic()
+        if delay > 0:
+            yield StatusUpdate(message=f"Waiting {delay:.1f}s before retrying {deferred.operation_description}...")
+            progress.metrics.timed('retry backoff', progress.cancellation.wait, delay)
+            progress.cancellation.raise_if_cancelled()
 
-        # After deletion, check if the directory is now actually empty.
         try:
-            return not any(path.iterdir())
-        except PermissionError:
-            yield StatusUpdate(message=f"Permission error after display file deletion in {path}.")
-            return False
+            progress.metrics.timed(deferred.operation.__name__, deferred.operation)
+            succeeded = True
+        except FileNotFoundError:
+            succeeded = False
+        except OSError as e:
+            attempts = deferred.attempts + 1
+            if error_policy.should_retry(e, attempts):
+                error_policy.defer(
+                    deferred.operation, deferred.operation_description, deferred.path, e, deferred.on_success, attempts
+                )
+                continue
+            succeeded = yield from _retryable_operation_generator(
+                operation=deferred.operation,
+                operation_description=deferred.operation_description,
+                path=deferred.path,
+                initial_error=e,
+                error_policy=error_policy,
+                attempts=attempts,
+                metrics=progress.metrics
+            )
+
+        if succeeded:
+            deferred.on_success()
+        if prune_below is not None:
+            yield from _remove_emptied_parents_generator(deferred.path.parent, prune_below, progress)
+
+def _remove_emptied_parents_generator(directory: Path, root: Path, progress: CleaningProgress) -> Generator[Event, Response, None]:
+    """
+    Removes directory and then its parents, up to but not including root, for
+    as long as they are empty. Used after a late deletion, when the post-order
+    pass has already moved past these directories.
+    """
+    while directory != root and root in directory.parents:
+        try:
+            progress.metrics.timed('rmdir', throttled(directory.rmdir, progress.throttle))
+        except OSError:
+            return # Not empty (or not removable); its parents are not either.
+        progress.directories_removed += 1
+        yield StatusUpdate(message=f"Removed empty directory: {directory}")
+        directory = directory.parent
 
-    return False
+# --- Batched Confirmation of Display-Only Directories ---
 
-# --- Sub-generator for Directory Deletion on File Delete ---
+def _defer_directory(tally: _DirectoryTally) -> _DeferredDirectory | None:
+    """
+    Returns a deferred entry for a directory that lost entries during this run
+    and now only holds display files and deferred subdirectories, or None if
+    anything else is left in it.
+    """
+    deferred_count = len(tally.display_files) + len(tally.deferred_children)
+    if not tally.changed or deferred_count == 0 or tally.remaining_count != deferred_count:
+        return None
+    return _DeferredDirectory(path=tally.path, display_files=tally.display_files, children=tally.deferred_children)
 
-def _delete_empty_parent_directories(anchor_file: Path, top_directory: Path) -> Generator[Event, Response, None]:
-    current_directory = anchor_file.parent
+def _iter_deferred_directories(deferred: list[_DeferredDirectory]) -> Iterator[_DeferredDirectory]:
+    for directory in deferred:
+        yield from _iter_deferred_directories(directory.children)
+        yield directory
 
-    while (yield from _is_directory_empty_and_confirm(current_directory)):
-        # don't walk above the target directory
-        if not top_directory in current_directory.parents:
-            yield StatusUpdate(message=f"Stopping empty directory deletion walk at target directory.")
-            return
+def _confirm_deferred_directories_generator(
+    deferred: list[_DeferredDirectory],
+    progress: CleaningProgress,
+    error_policy: ErrorPolicy | None = None,
+    quarantine: Quarantine | None = None,
+) -> Generator[Event, Response, None]:
+    """
+    Asks once about every deferred display-only directory, then removes the
+    approved ones (and deferred parents that are left empty) bottom-up.
+    """
+    response: Response = yield RequestBatchConfirmation(directories=[
+        DisplayOnlyDirectory(path=str(directory.path), files_in_dir=[f.name for f in directory.display_files])
+        for directory in _iter_deferred_directories(deferred)
+        if directory.display_files
+    ])
+    accepted_paths = set(response.accepted_paths)
+    yield StatusUpdate(message=f"{_removal_verb(quarantine)} display files in {len(accepted_paths)} confirmed folders...")
+    for directory in deferred:
+        yield from _remove_deferred_directory_generator(directory, accepted_paths, progress, error_policy, quarantine)
 
-        yield StatusUpdate(message=f"Removing empty directory: {current_directory}")
-        yield from _retryable_operation_generator(
-            operation=current_directory.rmdir,
-            operation_description=f"removing directory '{current_directory.name}'",
-            path=current_directory
-        )
+def _remove_deferred_directory_generator(
+    directory: _DeferredDirectory,
+    accepted_paths: set[str],
+    progress: CleaningProgress,
+    error_policy: ErrorPolicy | None = None,
+    quarantine: Quarantine | None = None,
+) -> Generator[Event, Response, bool]:
+    """Removes a deferred directory after its deferred subdirectories. Returns True if removed."""
+    all_removed = True
+    for child in directory.children:
+        removed = yield from _remove_deferred_directory_generator(child, accepted_paths, progress, error_policy, quarantine)
+        all_removed = all_removed and removed
+    if not all_removed:
+        return False
 
-        current_directory = current_directory.parent
+    if directory.display_files:
+        if str(directory.path) not in accepted_paths:
+            yield StatusUpdate(message=f"Skipping deletion of display files in {directory.path.name}.")
+            return False
+        for display_file in directory.display_files:
+            if not (yield from _delete_file_generator(
+                display_file, error_policy, metrics=progress.metrics, quarantine=quarantine, throttle=progress.throttle
+            )):
+                return False
 
+    return (yield from _remove_directory_generator(directory.path, progress, error_policy))
 
 # --- Sub-generator for File Deletion Pass ---
 
-def _delete_matching_files_generator(all_paths: List[Path], config: Configuration) -> Generator[Event, Response, int]:
+def _delete_matching_files_generator(
+    scan_items: Iterable[ScanItem],
+    config: Configuration,
+    progress: CleaningProgress,
+    unlinker: ParallelUnlinker | None = None,
+    error_policy: ErrorPolicy | None = None,
+    on_directory_changed: Callable[[Path], None] | None = None,
+    remove_empty_root: bool = False,
+    duplicate_paths: set[str] | None = None,
+    archive_filter: ParallelArchiveFilter | None = None,
+    quarantine: Quarantine | None = None,
+    directories: OpenDirectories | None = None,
+    format_selection: FormatSelection | None = None,
+) -> Generator[Event, Response, int]:
     """
-    Iterates over a given list of paths and deletes files matching the extensions.
-    Returns the count of deleted files.
+    Consumes the scanner's stream, deleting files matching the deletion rules
+    (or listed in duplicate_paths) as they arrive and pruning each emptied directory exactly once, in post-order,
+    when the scanner leaves it. The target directory itself is never removed.
+    Counts are kept in progress as the pass goes. Returns the count of deleted
+    files.
+
+    If an unlinker is given, deletions are handed to it and many are kept in
+    flight; each directory's pending unlinks are settled before it is pruned.
+    If an archive filter is given, every zip archive found is handed to it to
+    have the matching files removed from it; the archive itself is kept.
+    If a quarantine is given, files are moved into it rather than deleted
+    (the unlinker must move them there too).
+    If the scan's open directories are given (scan_items comes from
+    scan_tree_by_fd), files and directories are removed relative to them.
+    If a format selection is given, the files of designs are deleted by it
+    instead of by extension.
+
+    With the 'batch' confirmation policy, display-only directories are set
+    aside instead of being asked about one by one, and confirmed all at once
+    after the scan. Likewise, failures the error policy defers are retried
+    after the scan.
+
+    on_directory_changed, if given, is called with every directory this pass
+    changed, as it is exited (a scan index must not keep its listing).
+    Entries are classified through progress.metadata, so a file is only
+    stat'ed if it is a symlink.
+
+    progress.cancellation is checked before every entry. Once the run is
+    cancelled, the scan stops, the deletions and archives in flight are
+    settled, so the counts are exact, and OperationCancelledError is raised.
+
+    The root of the scan is normally left in place. With remove_empty_root
+    (for a shard that is a subtree of the target directory) it is pruned like
+    any other directory, and not counted, since the shard that lists its
+    parent counts it.
     """
-    deleted_files_count = 0
-    for path in all_paths:
-        if not (path.is_file() and path.exists()):
-            continue
+    tallies: list[_DirectoryTally] = []
+    deferred: list[_DeferredDirectory] = []
+    rules = DeletionRules.from_configuration(config, format_selection)
+
+    with progress.metrics.phase('scan and delete'):
+        for item in scan_items:
+            if progress.cancellation.is_cancelled:
+                break
+
+            if isinstance(item, DirectoryEntered):
+                if tallies or not remove_empty_root:
+                    progress.items_scanned += 1
+                if tallies:
+                    tallies[-1].remaining_count += 1
+                tallies.append(_DirectoryTally(path=item.path))
+                continue
+
+            if isinstance(item, DirectoryExited):
+                tally = tallies.pop()
+                while tally.pending_count:
+                    yield from _settle_oldest_unlink_generator(unlinker, progress, error_policy, quarantine, directories)
+                if tally.changed and on_directory_changed is not None:
+                    on_directory_changed(tally.path)
+                if not tallies and not remove_empty_root:
+                    deferred.extend(tally.deferred_children)
+                elif (yield from _prune_directory_generator(
+                    tally, progress, config.confirmation_policy, error_policy, quarantine, directories
+                )):
+                    if tallies:
+                        tallies[-1].remaining_count -= 1
+                        tallies[-1].changed = True
+                elif config.confirmation_policy == 'batch' and (deferred_directory := _defer_directory(tally)):
+                    if tallies:
+                        tallies[-1].deferred_children.append(deferred_directory)
+                        tallies[-1].changed = True
+                    else:
+                        deferred.append(deferred_directory)
+                else:
+                    # This directory stays, but its deferred subdirectories can
+                    # still be removed on their own.
+                    deferred.extend(tally.deferred_children)
+                continue
 
-        if path.suffix.lower() in config.extensions_to_delete or path.name.lower() in config.extensions_to_delete:
-            yield StatusUpdate(message=f"Deleting file: {path}")
-            operation_successful = yield from _retryable_operation_generator(
-                operation=path.unlink,
-                operation_description=f"deleting file '{path.name}'",
-                path=path
+            if isinstance(item, UnlistedEntries):
+                progress.items_scanned += item.count
+                tallies[-1].remaining_count += item.count
+                continue
+
+            if isinstance(item, ScanError):
+                yield StatusUpdate(message=f"Error reading {item.path}: {item.error}. Skipping.")
+                # Whatever could not be listed still occupies its parent.
+                if tallies:
+                    tallies[-1].remaining_count += 1
+                continue
+
+            progress.items_scanned += 1
+            tally = tallies[-1]
+            # The file type comes from the directory listing, so this normally
+            # costs no stat call.
+            is_file = progress.metadata.is_file(item)
+            matched_by_rules = is_file and rules.matches(item, progress.metadata)
+            if not (matched_by_rules or (is_file and duplicate_paths and item.path in duplicate_paths)):
+                _record_file_outcome(tally, item, deleted=False, is_file=is_file)
+                if archive_filter is not None and is_file and matches_extensions(item.name, ARCHIVE_EXTENSIONS):
+                    while archive_filter.is_full:
+                        yield from _settle_oldest_archive_generator(archive_filter, progress, error_policy)
+                    archive_filter.submit(item.path)
+                continue
+
+            # The limits have stat'ed whatever the rules matched, if they have any.
+            stat_cached = matched_by_rules and rules.stats_matches
+            if unlinker is None:
+                size = _file_size(item, progress, stat_cached)
+                on_deferred_deletion = partial(_count_deleted_file, progress, size)
+                deleted = yield from _delete_file_generator(
+                    item, error_policy, on_deferred_deletion, progress.metrics, quarantine, directories,
+                    progress.throttle, size or 0
+                )
+                if deleted:
+                    _count_deleted_file(progress, size)
+                _record_file_outcome(tally, item, deleted)
+                continue
+
+            while unlinker.is_full:
+                yield from _settle_oldest_unlink_generator(unlinker, progress, error_policy, quarantine, directories)
+            yield StatusUpdate(message=f"{_removal_verb(quarantine)} file: {item.path}")
+            unlinker.submit(
+                item.path, context=(item, tally), size=_file_size(item, progress, stat_cached) if stat_cached else None
             )
-            if operation_successful:
-                deleted_files_count += 1
+            tally.pending_count += 1
+
+        while unlinker is not None and len(unlinker):
+            yield from _settle_oldest_unlink_generator(unlinker, progress, error_policy, quarantine, directories)
+        while archive_filter is not None and len(archive_filter):
+            yield from _settle_oldest_archive_generator(archive_filter, progress, error_policy)
+    progress.cancellation.raise_if_cancelled()
 
-                # clean up empty directories left by this file deletion
-                yield from _delete_empty_parent_directories(anchor_file=path, top_directory=config.target_directory)
+    if error_policy is not None:
+        with progress.metrics.phase('deferred retries'):
+            yield from _retry_deferred_operations_generator(error_policy, progress, prune_below=config.target_directory)
 
+    if deferred:
+        with progress.metrics.phase('batch confirmation'):
+            yield from _confirm_deferred_directories_generator(deferred, progress, error_policy, quarantine)
+
+    return progress.files_deleted
+
+# --- Main Orchestrator Generators ---
+
+def _clean_scanned_items_generator(
+    scan_items: Iterator[ScanItem],
+    config: Configuration,
+    progress: CleaningProgress,
+    on_directory_changed: Callable[[Path], None] | None = None,
+    remove_empty_root: bool = False,
+    duplicate_paths: set[str] | None = None,
+    quarantine: Quarantine | None = None,
+    directories: OpenDirectories | None = None,
+    format_selection: FormatSelection | None = None,
+) -> Generator[Event, Response, int]:
+    """
+    Runs the file deletion pass over scan_items with the parallel executors
+    the configuration asks for, and closes the scan and shuts them down
+    however the pass ends. Given a quarantine, files are moved into it
+    instead of being deleted. Given the scan's open directories, files are
+    deleted relative to them.
+    """
+    # Time spent producing each entry is the cost of listing the tree.
+    scan_items = progress.metrics.timed_iteration('scan', scan_items)
+    if progress.throttle is not None:
+        scan_items = throttled_scan(scan_items, progress.throttle)
+    if not _counts_bytes_freed(config):
+        progress.bytes_freed = None
+    unlinker = None
+    if config.deletion_workers > 1:
+        # Files whose size is not already known are only stat'ed if the run counts bytes.
+        lstat = progress.metadata.lstat_path if progress.bytes_freed is not None else None
+        if quarantine is not None:
+            unlinker = ParallelUnlinker(
+                max_workers=config.deletion_workers, remove=quarantine.move, lstat=lstat, throttle=progress.throttle
+            )
+        elif directories is not None:
+            unlinker = ParallelUnlinker(
+                max_workers=config.deletion_workers, remove=directories.unlink,
+                lstat=partial(lstat, lstat=directories.lstat) if lstat else None, throttle=progress.throttle
+            )
+        else:
+            unlinker = ParallelUnlinker(max_workers=config.deletion_workers, lstat=lstat, throttle=progress.throttle)
+    archive_filter = None
+    if config.filter_archives:
+        archive_filter = ParallelArchiveFilter(config.archive_workers, DeletionRules.from_configuration(config))
+    try:
+        deleted_files_count = yield from _delete_matching_files_generator(
+            scan_items=scan_items,
+            config=config,
+            progress=progress,
+            unlinker=unlinker,
+            error_policy=ErrorPolicy.from_configuration(config),
+            on_directory_changed=on_directory_changed,
+            remove_empty_root=remove_empty_root,
+            duplicate_paths=duplicate_paths,
+            archive_filter=archive_filter,
+            quarantine=quarantine,
+            directories=directories,
+            format_selection=format_selection
+        )
+    finally:
+        # The unlinks still running may use the scan's open directories,
+        # which closing the scan closes.
+        if unlinker is not None:
+            unlinker.shutdown()
+        if archive_filter is not None:
+            archive_filter.shutdown()
+        scan_items.close()
+
+    if archive_filter is not None:
+        yield StatusUpdate(
+            message=f"Archives: removed {archive_filter.members_removed} files from {archive_filter.archives_filtered} "
+                    f"archives, saving {archive_filter.bytes_saved} bytes."
+        )
     return deleted_files_count
 
-# --- Main Orchestrator Generator ---
+def _quarantine_summary(quarantine: Quarantine) -> StatusUpdate:
+    return StatusUpdate(message=f"Quarantined {quarantine.files_moved} files in {quarantine.run_directory}.")
 
-def clean_directory_generator(config: Configuration) -> Generator[Event, Response, int]:
+def clean_directory_generator(
+    config: Configuration,
+    progress: CleaningProgress | None = None,
+    shard: Shard | None = None,
+) -> Generator[Event, Response, int]:
     """
     Main generator that orchestrates the cleaning process by calling sub-generators.
+    If a progress object is given, its counters are updated as the run goes.
+    Only config.target_directory is cleaned, or just the given shard of it.
+
+    With config.use_quarantine, files are moved into a new quarantined run
+    of the target directory instead of being deleted, and runs older than
+    config.quarantine_retention_days are purged first.
+
+    With config.keep_formats, a first pass lists the tree to select the
+    formats of each design to delete, and the deletion pass lists it again.
+    If config throttles the run, the listings of both passes and the
+    removals are paced through progress.throttle.
     """
     if not config.target_directory:
         return 0
+    if progress is None:
+        progress = CleaningProgress()
+    if progress.throttle is None:
+        progress.throttle = IoThrottle.from_configuration(config, progress.cancellation)
+    root = shard.root if shard else config.target_directory
+    # A shard's configuration is for its own root; the target directory it
+    # is part of holds the quarantine and the ignore files above the root.
+    target_directory = shard.target_directory if shard else config.target_directory
+
+    quarantine = None
+    if config.use_quarantine:
+        # The shards of a split target directory share its quarantine; only
+        # the one for its top level purges it.
+        if config.quarantine_retention_days and not (shard and shard.remove_empty_root):
+            with progress.metrics.phase('quarantine purge'):
+                yield from purge_quarantine_generator(
+                    target_directory, DEFAULT_QUARANTINE_WORKERS, older_than_days=config.quarantine_retention_days
+                )
+        quarantine = Quarantine(target_directory)
+
+    ignore = inherited_ignore_context(target_directory, root) if config.use_ignore_files else None
+    format_selection = None
+    format_policy = FormatPolicy.from_configuration(config)
+    if format_policy is not None:
+        yield StatusUpdate(message=f"Grouping the formats of the designs in {root}...")
+        format_scan_items = scan_top_level(root, ignore) if shard and shard.top_level_only else configured_scan_tree(root, config, ignore)
+        if progress.throttle is not None:
+            format_scan_items = throttled_scan(format_scan_items, progress.throttle)
+        format_selection = yield from select_formats_generator(format_scan_items, format_policy, progress)
 
-    yield StatusUpdate(message="Scanning all items in target directory...")
+    duplicate_paths = None
+    if config.remove_duplicates:
+        duplicates = yield from find_duplicates_generator(root, config, progress, format_selection)
+        duplicate_paths = {copy for duplicate in duplicates for copy in duplicate.copies}
+
+    # Files are deleted as the scan streams them in, rather than after the
+    # whole tree has been listed.
+    yield StatusUpdate(message=f"Scanning {root} and deleting specified file types...")
+    # The index only records files by extension, so it would hide duplicates
+    # and the formats of designs it does not delete by extension.
+    use_scan_index = config.use_scan_index and not duplicate_paths and format_selection is None
+    index = None
+    directories = None
+    if shard and shard.top_level_only:
+        scan_items = scan_top_level(root, ignore)
+    elif use_scan_index:
+        # Archives are recorded like deletable files, so they are looked into on every run.
+        recorded_extensions = config.extensions_to_delete | (ARCHIVE_EXTENSIONS if config.filter_archives else set())
+        index = ScanIndex(INDEX_FILE_LOCATION, DeletionRules(recorded_extensions, config.delete_patterns), progress.metadata)
+        scan_items = index.scan(root, ignore)
+    elif config.use_dir_fd and DIR_FD_SUPPORTED and config.scan_workers == 1 and not config.ordered_scan:
+        # Only the serial walk holds its directories open while it is in them.
+        directories = OpenDirectories()
+        scan_items = scan_tree_by_fd(root, directories, ignore)
+    else:
+        scan_items = configured_scan_tree(root, config, ignore)
     try:
-        all_paths = list(config.target_directory.rglob("*"))
-    except Exception as e:
-        yield StatusUpdate(message=f"Fatal error scanning directory: {e}")
-        return 0
+        deleted_files_count = yield from _clean_scanned_items_generator(
+            scan_items=scan_items,
+            config=config,
+            progress=progress,
+            on_directory_changed=index.mark_changed if index else None,
+            remove_empty_root=bool(shard and shard.remove_empty_root),
+            duplicate_paths=duplicate_paths,
+            quarantine=quarantine,
+            directories=directories,
+            format_selection=format_selection
+        )
+    finally:
+        if index is not None:
+            index.close()
+        if quarantine is not None:
+            quarantine.close()
 
-    # delete matching files
-    yield StatusUpdate(message=f"Found {len(all_paths)} items. Deleting specified file types...")
-    deleted_files_count = yield from _delete_matching_files_generator(
-        all_paths=all_paths,
-        config=config
-    )
+    if index is not None:
+        yield StatusUpdate(
+            message=f"Scan index: listed {index.directories_listed} directories, "
+                    f"reused {index.directories_replayed} unchanged ones."
+        )
+    if quarantine is not None and quarantine.files_moved:
+        yield _quarantine_summary(quarantine)
+
+    return deleted_files_count
+
+def clean_new_entries_generator(
+    config: Configuration,
+    progress: CleaningProgress,
+    directory: Path,
+    names: set[str],
+) -> Generator[Event, Response, int]:
+    """
+    Cleans only the entries of directory with the given names, and the trees
+    below them, such as a drop of new files into a watched folder. The rules
+    and the pruning of emptied folders are those of a full run, but directory
+    itself is never removed, since the rest of it was not looked at. Only
+    the new files of a design are grouped by format, so a design that gains a
+    format keeps the best of its new ones, whatever it held already.
+    """
+    yield StatusUpdate(message=f"Cleaning {len(names)} new entries in {directory}...")
+    if progress.throttle is None:
+        progress.throttle = IoThrottle.from_configuration(config, progress.cancellation)
+    ignore = inherited_ignore_context(config.target_directory, directory) if config.use_ignore_files else None
+    format_selection = None
+    format_policy = FormatPolicy.from_configuration(config)
+    if format_policy is not None:
+        format_selection = yield from select_formats_generator(
+            scan_new_entries(directory, names, ignore), format_policy, progress
+        )
+
+    quarantine = Quarantine(config.target_directory) if config.use_quarantine else None
+    try:
+        deleted_files_count = yield from _clean_scanned_items_generator(
+            scan_new_entries(directory, names, ignore), config, progress,
+            quarantine=quarantine, format_selection=format_selection
+        )
+    finally:
+        if quarantine is not None:
+            quarantine.close()
 
+    if quarantine is not None and quarantine.files_moved:
+        yield _quarantine_summary(quarantine)
     return deleted_files_count
\ No newline at end of file
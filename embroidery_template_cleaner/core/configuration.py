@@ -1,8 +1,20 @@
+import copy
 import json
+import logging
+import os
+import stat
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
 CONFIG_FILE_LOCATION = Path.home() / 'embroidery_template_cleaner.config.json'
 LOG_FILE_LOCATION = Path.home() / 'embroidery_template_cleaner.log'
+INDEX_FILE_LOCATION = Path.home() / 'embroidery_template_cleaner.index.sqlite3'
+JOURNAL_DIRECTORY = Path.home() / 'embroidery_template_cleaner.journals'
+PROFILE_FILE_LOCATION = Path.home() / 'embroidery_template_cleaner.prof'
+
+# Quarantined files are kept in a folder of this name directly in the target
+# directory, so they stay on its file system. Scans never look into it.
+QUARANTINE_DIRECTORY_NAME = '.embroidery_template_cleaner.quarantine'
 
 TEMPLATE_FILE_EXTENSIONS = {
     '.exp', 
@@ -34,23 +46,340 @@ DISPLAY_FILE_EXTENSIONS = {
 }
 
 
+DEFAULT_DELETION_WORKERS = 1
+
+# 1 cleans every target directory in the worker thread; more shards them
+# across that many processes.
+DEFAULT_SHARD_PROCESSES = 1
+
+# How folders that only hold display files are confirmed: 'ask' prompts for
+# each folder as it is found, 'batch' collects them and prompts once at the
+# end of the run, 'always' and 'never' decide without prompting.
+CONFIRMATION_POLICIES = ('ask', 'batch', 'always', 'never')
+DEFAULT_CONFIRMATION_POLICY = 'batch'
+
+DEFAULT_TRANSIENT_ERROR_RETRIES = 3
+
+# Threads hashing files at once when looking for duplicate designs.
+DEFAULT_HASH_WORKERS = 4
+
+# Threads listing directories at once while scanning; 1 lists them one by
+# one as the scan goes.
+DEFAULT_SCAN_WORKERS = 1
+
+# Zip archives rewritten at once when filtering archives.
+DEFAULT_ARCHIVE_WORKERS = 2
+
+# Quarantined runs older than this are purged at the start of the next
+# quarantining run of the same target directory; 0 keeps them until purged.
+DEFAULT_QUARANTINE_RETENTION_DAYS = 30
+
+# Threads moving files back out of (or deleting them from) the quarantine.
+DEFAULT_QUARANTINE_WORKERS = 8
+
+# A design's formats, best first, when only the best few of them are kept.
+# Formats not listed are left to the extensions to delete.
+DEFAULT_FORMAT_PREFERENCE = [
+    '.pes',
+    '.dst',
+    '.exp',
+    '.jef',
+    '.vp3',
+    '.hus',
+    '.vip',
+    '.xxx',
+    '.sew',
+    '.pec',
+    '.pcs',
+    '.shv',
+    '.csd',
+    '.jan',
+    '.emb',
+    '.art',
+]
+
+
+def matches_extensions(name: str, extensions: set[str]) -> bool:
+    """Checks a file name against a set of extensions (or full names such as '.ds_store')."""
+    name = name.lower()
+    return os.path.splitext(name)[1] in extensions or name in extensions
+
+def is_recognized_extension(extension: str) -> bool:
+    """
+    A known template or display file extension, or a multi-part suffix
+    with one among its parts, such as '.pes.bak'.
+    """
+    known_extensions = TEMPLATE_FILE_EXTENSIONS | DISPLAY_FILE_EXTENSIONS
+    if extension in known_extensions:
+        return True
+    parts = extension.split('.')
+    return (
+        len(parts) > 2 and parts[0] == '' and all(parts[1:])
+        and any(f'.{part}' in known_extensions for part in parts[1:])
+    )
+
+
 class Configuration:
     target_directory: Path | None
     extensions_to_delete: set[str]
+    deletion_workers: int
+    use_scan_index: bool
+    use_journal: bool
+    confirmation_policy: str
+    transient_error_retries: int
+    skip_permission_errors: bool
+    defer_failed_operations: bool
+    profile_run: bool
+    additional_target_directories: list[Path]
+    shard_processes: int
+    remove_duplicates: bool
+    hash_workers: int
+    filter_archives: bool
+    archive_workers: int
+    use_quarantine: bool
+    quarantine_retention_days: int
+    scan_workers: int
+    ordered_scan: bool
+    use_dir_fd: bool
+    delete_patterns: list[str]
+    min_file_size: int
+    max_file_size: int | None
+    min_file_age_days: int
+    use_ignore_files: bool
+    keep_formats: int
+    format_preference: list[str]
+    max_operations_per_second: float | None
+    max_bytes_per_second: int | None
+    adaptive_throttle: bool
+    count_bytes_freed: bool
     
-    def __init__(self, target_directory: Path | None, extensions_to_delete: set[str]):
-        if target_directory:
-            if not target_directory.exists():
-                raise ValueError(f"Target directory does not exist: {target_directory}")
-            if not target_directory.is_dir():
-                raise ValueError(f"Target path is not a directory: {target_directory}")
-
-        unrecognized_exts = extensions_to_delete - (TEMPLATE_FILE_EXTENSIONS | DISPLAY_FILE_EXTENSIONS)
+    def __init__(
+        self,
+        target_directory: Path | None,
+        extensions_to_delete: set[str],
+        deletion_workers: int = DEFAULT_DELETION_WORKERS,
+        use_scan_index: bool = False,
+        use_journal: bool = False,
+        confirmation_policy: str = DEFAULT_CONFIRMATION_POLICY,
+        transient_error_retries: int = DEFAULT_TRANSIENT_ERROR_RETRIES,
+        skip_permission_errors: bool = True,
+        defer_failed_operations: bool = True,
+        profile_run: bool = False,
+        additional_target_directories: list[Path] | None = None,
+        shard_processes: int = DEFAULT_SHARD_PROCESSES,
+        remove_duplicates: bool = False,
+        hash_workers: int = DEFAULT_HASH_WORKERS,
+        filter_archives: bool = False,
+        archive_workers: int = DEFAULT_ARCHIVE_WORKERS,
+        use_quarantine: bool = False,
+        quarantine_retention_days: int = DEFAULT_QUARANTINE_RETENTION_DAYS,
+        scan_workers: int = DEFAULT_SCAN_WORKERS,
+        ordered_scan: bool = False,
+        use_dir_fd: bool = True,
+        delete_patterns: list[str] | None = None,
+        min_file_size: int = 0,
+        max_file_size: int | None = None,
+        min_file_age_days: int = 0,
+        use_ignore_files: bool = True,
+        keep_formats: int = 0,
+        format_preference: list[str] | None = None,
+        max_operations_per_second: float | None = None,
+        max_bytes_per_second: int | None = None,
+        adaptive_throttle: bool = False,
+        count_bytes_freed: bool = False,
+    ):
+        additional_target_directories = list(additional_target_directories or [])
+        if additional_target_directories and not target_directory:
+            raise ValueError("Additional target directories need a target directory.")
+
+        all_directories = ([target_directory] if target_directory else []) + additional_target_directories
+        for directory in all_directories:
+            # One stat answers both questions.
+            try:
+                target_mode = os.stat(directory).st_mode
+            except OSError:
+                raise ValueError(f"Target directory does not exist: {directory}")
+            if not stat.S_ISDIR(target_mode):
+                raise ValueError(f"Target path is not a directory: {directory}")
+
+        # Overlapping roots would be cleaned twice, possibly at the same time.
+        roots = [Path(os.path.abspath(d)) for d in all_directories]
+        for i, root in enumerate(roots):
+            for other in roots[i + 1:]:
+                if root == other or root in other.parents or other in root.parents:
+                    raise ValueError(f"Target directories overlap: {root} and {other}")
+
+        unrecognized_exts = {ext for ext in extensions_to_delete if not is_recognized_extension(ext)}
         if unrecognized_exts:
             raise ValueError(f"Unrecognized extensions provided: {unrecognized_exts}")
+
+        # 1 deletes serially; more keeps that many unlinks in flight at once.
+        if not isinstance(deletion_workers, int) or deletion_workers < 1:
+            raise ValueError(f"Deletion workers must be a positive integer: {deletion_workers}")
+
+        if not isinstance(use_scan_index, bool):
+            raise ValueError(f"Use scan index must be true or false: {use_scan_index}")
+
+        if not isinstance(use_journal, bool):
+            raise ValueError(f"Use journal must be true or false: {use_journal}")
+
+        if confirmation_policy not in CONFIRMATION_POLICIES:
+            raise ValueError(f"Confirmation policy must be one of {', '.join(CONFIRMATION_POLICIES)}: {confirmation_policy}")
+
+        # 0 turns off automatic retries of transient errors.
+        if not isinstance(transient_error_retries, int) or transient_error_retries < 0:
+            raise ValueError(f"Transient error retries must be a non-negative integer: {transient_error_retries}")
+
+        if not isinstance(skip_permission_errors, bool):
+            raise ValueError(f"Skip permission errors must be true or false: {skip_permission_errors}")
+
+        if not isinstance(defer_failed_operations, bool):
+            raise ValueError(f"Defer failed operations must be true or false: {defer_failed_operations}")
+
+        if not isinstance(profile_run, bool):
+            raise ValueError(f"Profile run must be true or false: {profile_run}")
+
+        if not isinstance(shard_processes, int) or shard_processes < 1:
+            raise ValueError(f"Shard processes must be a positive integer: {shard_processes}")
+
+        if not isinstance(remove_duplicates, bool):
+            raise ValueError(f"Remove duplicates must be true or false: {remove_duplicates}")
+
+        # A journaled run carries out a plan, which only knows about extensions.
+        if remove_duplicates and use_journal:
+            raise ValueError("Duplicates cannot be removed in a journaled run.")
+
+        if not isinstance(hash_workers, int) or hash_workers < 1:
+            raise ValueError(f"Hash workers must be a positive integer: {hash_workers}")
+
+        if not isinstance(filter_archives, bool):
+            raise ValueError(f"Filter archives must be true or false: {filter_archives}")
+
+        if filter_archives and use_journal:
+            raise ValueError("Archives cannot be filtered in a journaled run.")
+
+        if not isinstance(archive_workers, int) or archive_workers < 1:
+            raise ValueError(f"Archive workers must be a positive integer: {archive_workers}")
+
+        if not isinstance(use_quarantine, bool):
+            raise ValueError(f"Use quarantine must be true or false: {use_quarantine}")
+
+        if use_quarantine and use_journal:
+            raise ValueError("A journaled run cannot quarantine files.")
+
+        # A filtered archive is rewritten in place, which could not be undone.
+        if use_quarantine and filter_archives:
+            raise ValueError("Archives cannot be filtered in a quarantining run.")
+
+        if not isinstance(quarantine_retention_days, int) or quarantine_retention_days < 0:
+            raise ValueError(f"Quarantine retention days must be a non-negative integer: {quarantine_retention_days}")
+
+        if not isinstance(scan_workers, int) or scan_workers < 1:
+            raise ValueError(f"Scan workers must be a positive integer: {scan_workers}")
+
+        if not isinstance(ordered_scan, bool):
+            raise ValueError(f"Ordered scan must be true or false: {ordered_scan}")
+
+        # Where the platform cannot work relative to open directories, full
+        # paths are used either way.
+        if not isinstance(use_dir_fd, bool):
+            raise ValueError(f"Use dir fd must be true or false: {use_dir_fd}")
+
+        # Patterns are matched against file names, like extensions.
+        delete_patterns = list(delete_patterns or [])
+        for pattern in delete_patterns:
+            if not isinstance(pattern, str) or not pattern or '/' in pattern or '\\' in pattern:
+                raise ValueError(f"Delete patterns must be file name globs: {pattern}")
+
+        if not isinstance(min_file_size, int) or min_file_size < 0:
+            raise ValueError(f"Minimum file size must be a non-negative integer: {min_file_size}")
+
+        # None deletes matching files of any size.
+        if max_file_size is not None and (not isinstance(max_file_size, int) or max_file_size < min_file_size):
+            raise ValueError(f"Maximum file size must be an integer no less than the minimum: {max_file_size}")
+
+        if not isinstance(min_file_age_days, int) or min_file_age_days < 0:
+            raise ValueError(f"Minimum file age days must be a non-negative integer: {min_file_age_days}")
+
+        if not isinstance(use_ignore_files, bool):
+            raise ValueError(f"Use ignore files must be true or false: {use_ignore_files}")
+
+        # 0 leaves every format to the extensions to delete.
+        if not isinstance(keep_formats, int) or keep_formats < 0:
+            raise ValueError(f"Keep formats must be a non-negative integer: {keep_formats}")
+
+        format_preference = list(DEFAULT_FORMAT_PREFERENCE if format_preference is None else format_preference)
+        design_formats = TEMPLATE_FILE_EXTENSIONS - {'.ds_store'}
+        unrecognized_formats = [ext for ext in format_preference if ext not in design_formats]
+        if unrecognized_formats or len(set(format_preference)) != len(format_preference):
+            raise ValueError(f"Format preference must list distinct template extensions: {format_preference}")
+        if keep_formats and not format_preference:
+            raise ValueError("Keeping the best formats needs a format preference.")
+
+        # None leaves the rate unlimited.
+        if max_operations_per_second is not None and (
+            isinstance(max_operations_per_second, bool)
+            or not isinstance(max_operations_per_second, (int, float))
+            or max_operations_per_second <= 0
+        ):
+            raise ValueError(f"Maximum operations per second must be a positive number: {max_operations_per_second}")
+
+        if max_bytes_per_second is not None and (not isinstance(max_bytes_per_second, int) or max_bytes_per_second < 1):
+            raise ValueError(f"Maximum bytes per second must be a positive integer: {max_bytes_per_second}")
+
+        if not isinstance(adaptive_throttle, bool):
+            raise ValueError(f"Adaptive throttle must be true or false: {adaptive_throttle}")
+
+        if not isinstance(count_bytes_freed, bool):
+            raise ValueError(f"Count bytes freed must be true or false: {count_bytes_freed}")
         
         self.target_directory = target_directory
         self.extensions_to_delete = extensions_to_delete
+        self.deletion_workers = deletion_workers
+        self.use_scan_index = use_scan_index
+        self.use_journal = use_journal
+        self.confirmation_policy = confirmation_policy
+        self.transient_error_retries = transient_error_retries
+        self.skip_permission_errors = skip_permission_errors
+        self.defer_failed_operations = defer_failed_operations
+        self.profile_run = profile_run
+        self.additional_target_directories = additional_target_directories
+        self.shard_processes = shard_processes
+        self.remove_duplicates = remove_duplicates
+        self.hash_workers = hash_workers
+        self.filter_archives = filter_archives
+        self.archive_workers = archive_workers
+        self.use_quarantine = use_quarantine
+        self.quarantine_retention_days = quarantine_retention_days
+        self.scan_workers = scan_workers
+        self.ordered_scan = ordered_scan
+        self.use_dir_fd = use_dir_fd
+        self.delete_patterns = delete_patterns
+        self.min_file_size = min_file_size
+        self.max_file_size = max_file_size
+        self.min_file_age_days = min_file_age_days
+        self.use_ignore_files = use_ignore_files
+        self.keep_formats = keep_formats
+        self.format_preference = format_preference
+        self.max_operations_per_second = max_operations_per_second
+        self.max_bytes_per_second = max_bytes_per_second
+        self.adaptive_throttle = adaptive_throttle
+        self.count_bytes_freed = count_bytes_freed
+
+    @property
+    def target_directories(self) -> list[Path]:
+        """Every directory to clean: the target directory, then any additional ones."""
+        if not self.target_directory:
+            return []
+        return [self.target_directory] + self.additional_target_directories
+
+    def for_root(self, root: Path) -> 'Configuration':
+        """Returns a copy of this configuration that cleans only root, in a single process."""
+        root_config = copy.copy(self)
+        root_config.target_directory = root
+        root_config.additional_target_directories = []
+        root_config.shard_processes = 1
+        return root_config
 
     @staticmethod
     def from_json_file(json_path: Path) -> 'Configuration':
@@ -62,16 +391,109 @@ class Configuration:
 
         target_dir_str = config_dict.get('target_directory')
         extensions = set(config_dict.get('extensions_to_delete', []))
+        deletion_workers = config_dict.get('deletion_workers', DEFAULT_DELETION_WORKERS)
+        use_scan_index = config_dict.get('use_scan_index', False)
+        use_journal = config_dict.get('use_journal', False)
+        confirmation_policy = config_dict.get('confirmation_policy', DEFAULT_CONFIRMATION_POLICY)
+        transient_error_retries = config_dict.get('transient_error_retries', DEFAULT_TRANSIENT_ERROR_RETRIES)
+        skip_permission_errors = config_dict.get('skip_permission_errors', True)
+        defer_failed_operations = config_dict.get('defer_failed_operations', True)
+        profile_run = config_dict.get('profile_run', False)
+        additional_dirs = [Path(d) for d in config_dict.get('additional_target_directories', [])]
+        shard_processes = config_dict.get('shard_processes', DEFAULT_SHARD_PROCESSES)
+        remove_duplicates = config_dict.get('remove_duplicates', False)
+        hash_workers = config_dict.get('hash_workers', DEFAULT_HASH_WORKERS)
+        filter_archives = config_dict.get('filter_archives', False)
+        archive_workers = config_dict.get('archive_workers', DEFAULT_ARCHIVE_WORKERS)
+        use_quarantine = config_dict.get('use_quarantine', False)
+        quarantine_retention_days = config_dict.get('quarantine_retention_days', DEFAULT_QUARANTINE_RETENTION_DAYS)
+        scan_workers = config_dict.get('scan_workers', DEFAULT_SCAN_WORKERS)
+        ordered_scan = config_dict.get('ordered_scan', False)
+        use_dir_fd = config_dict.get('use_dir_fd', True)
+        delete_patterns = config_dict.get('delete_patterns', [])
+        min_file_size = config_dict.get('min_file_size', 0)
+        max_file_size = config_dict.get('max_file_size')
+        min_file_age_days = config_dict.get('min_file_age_days', 0)
+        use_ignore_files = config_dict.get('use_ignore_files', True)
+        keep_formats = config_dict.get('keep_formats', 0)
+        format_preference = config_dict.get('format_preference')
+        max_operations_per_second = config_dict.get('max_operations_per_second')
+        max_bytes_per_second = config_dict.get('max_bytes_per_second')
+        adaptive_throttle = config_dict.get('adaptive_throttle', False)
+        count_bytes_freed = config_dict.get('count_bytes_freed', False)
 
         target_dir = Path(target_dir_str) if target_dir_str else None
         
-        return Configuration(target_directory=target_dir, extensions_to_delete=extensions)
+        return Configuration(
+            target_directory=target_dir,
+            extensions_to_delete=extensions,
+            deletion_workers=deletion_workers,
+            use_scan_index=use_scan_index,
+            use_journal=use_journal,
+            confirmation_policy=confirmation_policy,
+            transient_error_retries=transient_error_retries,
+            skip_permission_errors=skip_permission_errors,
+            defer_failed_operations=defer_failed_operations,
+            profile_run=profile_run,
+            additional_target_directories=additional_dirs,
+            shard_processes=shard_processes,
+            remove_duplicates=remove_duplicates,
+            hash_workers=hash_workers,
+            filter_archives=filter_archives,
+            archive_workers=archive_workers,
+            use_quarantine=use_quarantine,
+            quarantine_retention_days=quarantine_retention_days,
+            scan_workers=scan_workers,
+            ordered_scan=ordered_scan,
+            use_dir_fd=use_dir_fd,
+            delete_patterns=delete_patterns,
+            min_file_size=min_file_size,
+            max_file_size=max_file_size,
+            min_file_age_days=min_file_age_days,
+            use_ignore_files=use_ignore_files,
+            keep_formats=keep_formats,
+            format_preference=format_preference,
+            max_operations_per_second=max_operations_per_second,
+            max_bytes_per_second=max_bytes_per_second,
+            adaptive_throttle=adaptive_throttle,
+            count_bytes_freed=count_bytes_freed
+        )
     
     def to_json_str(self) -> str:
         """Serializes the configuration to a JSON string."""
         return json.dumps({
             'target_directory': str(self.target_directory.resolve()) if self.target_directory else '',
-            'extensions_to_delete': sorted(list(self.extensions_to_delete))
+            'extensions_to_delete': sorted(list(self.extensions_to_delete)),
+            'deletion_workers': self.deletion_workers,
+            'use_scan_index': self.use_scan_index,
+            'use_journal': self.use_journal,
+            'confirmation_policy': self.confirmation_policy,
+            'transient_error_retries': self.transient_error_retries,
+            'skip_permission_errors': self.skip_permission_errors,
+            'defer_failed_operations': self.defer_failed_operations,
+            'profile_run': self.profile_run,
+            'additional_target_directories': [str(d.resolve()) for d in self.additional_target_directories],
+            'shard_processes': self.shard_processes,
+            'remove_duplicates': self.remove_duplicates,
+            'hash_workers': self.hash_workers,
+            'filter_archives': self.filter_archives,
+            'archive_workers': self.archive_workers,
+            'use_quarantine': self.use_quarantine,
+            'quarantine_retention_days': self.quarantine_retention_days,
+            'scan_workers': self.scan_workers,
+            'ordered_scan': self.ordered_scan,
+            'use_dir_fd': self.use_dir_fd,
+            'delete_patterns': self.delete_patterns,
+            'min_file_size': self.min_file_size,
+            'max_file_size': self.max_file_size,
+            'min_file_age_days': self.min_file_age_days,
+            'use_ignore_files': self.use_ignore_files,
+            'keep_formats': self.keep_formats,
+            'format_preference': self.format_preference,
+            'max_operations_per_second': self.max_operations_per_second,
+            'max_bytes_per_second': self.max_bytes_per_second,
+            'adaptive_throttle': self.adaptive_throttle,
+            'count_bytes_freed': self.count_bytes_freed
         }, indent=2)
 
 def load_config() -> Configuration:
@@ -85,4 +507,19 @@ def load_config() -> Configuration:
 
 def save_config(config: Configuration):
     """Saves the given configuration to the default location."""
-    CONFIG_FILE_LOCATION.write_text(config.to_json_str())
\ No newline at end of file
+    CONFIG_FILE_LOCATION.write_text(config.to_json_str())
+
+def setup_logging(console_level: int = logging.INFO):
+    """Logs to the rotating log file and, at console_level and above, to the console."""
+    log_handler = RotatingFileHandler(
+        filename=LOG_FILE_LOCATION, 
+        maxBytes=5*1024*1024, # 5MB
+        backupCount=3
+    )
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(console_level)
+    logging.basicConfig(
+        handlers=[log_handler, console_handler],
+        level=logging.INFO, 
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
\ No newline at end of file
@@ -0,0 +1,204 @@
+import os
+import stat
+from pathlib import Path
+from typing import Generator, Iterator
+
+from .configuration import QUARANTINE_DIRECTORY_NAME
+from .rules import IgnoreContext
+from .scanner import ScanItem, DirectoryEntered, DirectoryExited, UnlistedEntries, ScanError
+
+# Operations relative to an open directory need all of these; where they
+# are missing (Windows), files and folders are removed by their full paths.
+DIR_FD_SUPPORTED = (
+    {os.open, os.stat, os.unlink, os.rmdir} <= os.supports_dir_fd
+    and os.scandir in os.supports_fd
+)
+
+_DIRECTORY_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)
+# Subdirectories are opened through their parent without following a
+# symlink, so one swapped in after the listing is never descended into.
+_SUBDIRECTORY_FLAGS = _DIRECTORY_FLAGS | getattr(os, 'O_NOFOLLOW', 0)
+
+# --- Open Directories ---
+
+class OpenDirectories:
+    """
+    The descriptors of the directories a scan is in, by path. Removing a
+    file (or stat'ing it, or removing a subdirectory) through the descriptor
+    of its directory only hands the kernel the last component of the path,
+    instead of a full path it resolves again, component by component, for
+    every operation; in a deep tree on a network share that is most of the
+    cost. It also pins the directory: if one of its parents is renamed
+    while the run is in it, the operation still happens in the directory
+    that was listed, never at whatever the old path now leads to.
+
+    A path whose directory is not open (any more) falls back to the full
+    path, so operations retried after the scan still work. The unlink
+    workers may use a descriptor while the scan holds it; the scan only
+    closes a directory after it was exited, once its unlinks have settled.
+    """
+
+    def __init__(self):
+        self._descriptors: dict[str, int] = {}
+
+    def open(self, directory: Path, descriptor: int):
+        self._descriptors[str(directory)] = descriptor
+
+    def close(self, directory: Path):
+        descriptor = self._descriptors.pop(str(directory), None)
+        if descriptor is not None:
+            os.close(descriptor)
+
+    def _split(self, path: str) -> tuple[str, int | None]:
+        """The name to use for path, and the descriptor it is relative to (None: none)."""
+        directory, name = os.path.split(path)
+        descriptor = self._descriptors.get(directory)
+        return (path, None) if descriptor is None else (name, descriptor)
+
+    def unlink(self, path: str):
+        name, descriptor = self._split(path)
+        os.unlink(name, dir_fd=descriptor)
+
+    def rmdir(self, path: str):
+        name, descriptor = self._split(path)
+        os.rmdir(name, dir_fd=descriptor)
+
+    def lstat(self, path: str) -> os.stat_result:
+        name, descriptor = self._split(path)
+        return os.stat(name, dir_fd=descriptor, follow_symlinks=False)
+
+    def stat(self, path: str) -> os.stat_result:
+        name, descriptor = self._split(path)
+        return os.stat(name, dir_fd=descriptor)
+
+class FdEntry:
+    """
+    Stands in for an os.DirEntry listed through a directory descriptor,
+    whose own path would only be its name. The file type reported by the
+    listing is kept when it is listed, and stat results are looked up
+    through OpenDirectories, so the entry stays usable once its directory
+    has been closed. Like a DirEntry, it caches its stat results.
+    """
+    __slots__ = ('name', 'path', '_directories', '_is_dir', '_is_file', '_is_symlink', '_stat', '_lstat')
+
+    def __init__(self, directories: OpenDirectories, directory: str, entry: os.DirEntry):
+        self.name = entry.name
+        self.path = os.path.join(directory, entry.name)
+        self._directories = directories
+        self._is_dir = entry.is_dir(follow_symlinks=False)
+        self._is_file = entry.is_file(follow_symlinks=False)
+        self._is_symlink = entry.is_symlink()
+        self._stat: os.stat_result | None = None
+        self._lstat: os.stat_result | None = None
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        if self._is_symlink and follow_symlinks:
+            try:
+                return stat.S_ISREG(self.stat().st_mode)
+            except OSError:
+                return False
+        return self._is_file
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        if self._is_symlink and follow_symlinks:
+            try:
+                return stat.S_ISDIR(self.stat().st_mode)
+            except OSError:
+                return False
+        return self._is_dir
+
+    def is_symlink(self) -> bool:
+        return self._is_symlink
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        if not follow_symlinks or not self._is_symlink:
+            if self._lstat is None:
+                self._lstat = self._directories.lstat(self.path)
+            return self._lstat
+        if self._stat is None:
+            self._stat = self._directories.stat(self.path)
+        return self._stat
+
+# --- Descriptor-Relative Tree Walk ---
+
+def _open_listing(name: str | Path, flags: int, dir_fd: int | None = None) -> tuple[int, Iterator[os.DirEntry]]:
+    descriptor = os.open(name, flags, dir_fd=dir_fd)
+    try:
+        # scandir lists a duplicate of the descriptor, which stays ours.
+        return descriptor, os.scandir(descriptor)
+    except OSError:
+        os.close(descriptor)
+        raise
+
+def scan_tree_by_fd(
+    root: Path,
+    directories: OpenDirectories,
+    ignore: IgnoreContext | None = None,
+) -> Generator[ScanItem, None, None]:
+    """
+    Walks the tree below root like scanner.scan_tree and yields the same
+    items, but opens every subdirectory relative to its parent's descriptor
+    and lists it through its own, which stays registered in directories
+    until the consumer is done with its DirectoryExited marker. Entries are
+    yielded as FdEntry, so consumers can remove them through directories
+    (and prune a directory through its parent) without any path lookup.
+
+    Only the descriptors of the directories on the current path are open,
+    so their number is bounded by the depth of the tree. Ignore files are
+    honoured as by scan_tree, and read through the same descriptors.
+    """
+    try:
+        descriptor, iterator = _open_listing(root, _DIRECTORY_FLAGS)
+    except OSError as e:
+        yield ScanError(path=root, error=e)
+        return
+
+    directories.open(root, descriptor)
+    context = ignore.child(root, dir_fd=descriptor) if ignore is not None else None
+    stack = [(root, str(root), descriptor, iterator, context)]
+    yield DirectoryEntered(path=root)
+    try:
+        while stack:
+            directory, directory_str, descriptor, iterator, context = stack[-1]
+            try:
+                entry = next(iterator)
+            except StopIteration:
+                iterator.close()
+                # Popped only after the consumer is done with it, so the
+                # descriptor is closed even if the consumer stops here.
+                yield DirectoryExited(path=directory)
+                stack.pop()
+                directories.close(directory)
+                continue
+            except OSError as e:
+                # The listing broke off part way through; keep what was seen.
+                iterator.close()
+                yield ScanError(path=directory, error=e)
+                yield DirectoryExited(path=directory)
+                stack.pop()
+                directories.close(directory)
+                continue
+
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if context is not None and context.is_ignored(os.path.join(directory_str, entry.name), is_dir):
+                yield UnlistedEntries(path=directory, count=1)
+            elif is_dir:
+                if entry.name == QUARANTINE_DIRECTORY_NAME:
+                    yield UnlistedEntries(path=directory, count=1)
+                    continue
+                subdirectory = directory / entry.name
+                try:
+                    sub_descriptor, sub_iterator = _open_listing(entry.name, _SUBDIRECTORY_FLAGS, dir_fd=descriptor)
+                except OSError as e:
+                    yield ScanError(path=subdirectory, error=e)
+                    continue
+                directories.open(subdirectory, sub_descriptor)
+                sub_context = context.child(subdirectory, dir_fd=sub_descriptor) if context is not None else None
+                stack.append((subdirectory, str(subdirectory), sub_descriptor, sub_iterator, sub_context))
+                yield DirectoryEntered(path=subdirectory)
+            else:
+                yield FdEntry(directories, directory_str, entry)
+    finally:
+        for directory, _, _, iterator, _ in stack:
+            iterator.close()
+            directories.close(directory)
\ No newline at end of file
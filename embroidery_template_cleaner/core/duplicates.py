@@ -0,0 +1,182 @@
+import hashlib
+import mmap
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Generator
+
+from .cancellation import cancellable
+from .configuration import Configuration, TEMPLATE_FILE_EXTENSIONS
+from .events import Event, Response, StatusUpdate
+from .formats import FormatSelection
+from .progress import CleaningProgress
+from .rules import DeletionRules, inherited_ignore_context
+from .scanner import configured_scan_tree
+from .throttle import throttled_scan
+
+# Bytes read from each end of a file for its partial hash. A file no larger
+# than twice this is read whole, so its partial hash is already final.
+PARTIAL_HASH_BYTES = 4096
+
+# --- Duplicate Groups ---
+
+@dataclass
+class DuplicateGroup:
+    """
+    Byte-identical files: the one that is kept, and its copies. Paths are as
+    the scanner reports them, so they can be matched against a later scan.
+    """
+    size: int
+    original: str
+    copies: list[str]
+
+def _keep_order(path: str) -> tuple[int, str]:
+    """The copy nearest the top of the tree is kept, then the first by name."""
+    return (path.count(os.sep), path)
+
+# --- Hashing (runs on the hash threads) ---
+
+def _partial_hash(path: str, size: int) -> bytes:
+    with open(path, 'rb') as handle:
+        if size <= 2 * PARTIAL_HASH_BYTES:
+            return hashlib.blake2b(handle.read()).digest()
+        head = handle.read(PARTIAL_HASH_BYTES)
+        handle.seek(size - PARTIAL_HASH_BYTES)
+        return hashlib.blake2b(head + handle.read(PARTIAL_HASH_BYTES)).digest()
+
+def _full_hash(path: str, size: int) -> bytes:
+    # The file is mapped rather than read, so hashing it needs no buffer of
+    # its own; hashlib releases the GIL while it works through the mapping.
+    with open(path, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        return hashlib.blake2b(mapping).digest()
+
+def _timed_hash(hash_function: Callable[[str, int], bytes], path: str, size: int) -> tuple[bytes | None, float]:
+    """Returns the file's hash (None if it cannot be read) and how long it took."""
+    start = time.perf_counter()
+    try:
+        digest = hash_function(path, size)
+    except (OSError, ValueError):
+        digest = None
+    return digest, time.perf_counter() - start
+
+# --- Duplicate Search ---
+
+def _rehash_groups(
+    groups: list[list[str]],
+    size_of: dict[str, int],
+    hash_function: Callable[[str, int], bytes],
+    operation_name: str,
+    executor: ThreadPoolExecutor,
+    progress: CleaningProgress,
+) -> list[list[str]]:
+    """
+    Splits each group of files by hash_function, hashing on the executor, and
+    returns the new groups that still hold more than one file. Files that
+    cannot be read are dropped, so they are never treated as copies.
+    If the run is cancelled, the hashes not yet started are dropped and
+    OperationCancelledError is raised.
+    """
+    paths = [path for group in groups for path in group]
+    sizes = [size_of[path] for path in paths]
+    results = executor.map(_timed_hash, [hash_function] * len(paths), paths, sizes)
+
+    by_hash: dict[tuple[int, bytes], list[str]] = defaultdict(list)
+    for path, (digest, seconds) in zip(paths, results):
+        if progress.cancellation.is_cancelled:
+            executor.shutdown(wait=False, cancel_futures=True)
+            progress.cancellation.raise_if_cancelled()
+        # Timed on the hash threads, recorded here, where the metrics live.
+        progress.metrics.record(operation_name, seconds)
+        if digest is not None:
+            by_hash[(size_of[path], digest)].append(path)
+    return [group for group in by_hash.values() if len(group) > 1]
+
+def find_duplicates_generator(
+    root: Path,
+    config: Configuration,
+    progress: CleaningProgress,
+    format_selection: FormatSelection | None = None,
+) -> Generator[Event, Response, list[DuplicateGroup]]:
+    """
+    Finds byte-identical template files below root, without reading most of
+    the bytes of a large library:
+
+    1. Files are grouped by size, which the directory listing (or one stat)
+       gives for free; a file of a unique size has no copies.
+    2. Files sharing a size are grouped by a hash of their first and last
+       PARTIAL_HASH_BYTES.
+    3. Only files that still collide, and were not already read whole, are
+       hashed in full, through a memory mapping.
+
+    Hashing runs on config.hash_workers threads. Files whose extensions are
+    deleted anyway are left out (as are files the deletion rules match
+    otherwise, or that format_selection found surplus, none of which may be
+    the copy kept), and so are symlinks and files that ignore files exclude.
+    Returns the groups of duplicates, each with the copy that is kept.
+    """
+    yield StatusUpdate(message=f"Looking for duplicate designs in {root}...")
+    templates = DeletionRules(TEMPLATE_FILE_EXTENSIONS - {'.ds_store'} - config.extensions_to_delete)
+    rules = DeletionRules.from_configuration(config, format_selection)
+    ignore = inherited_ignore_context(config.target_directory, root) if config.use_ignore_files else None
+    scan_items = configured_scan_tree(root, config, ignore)
+    if progress.throttle is not None:
+        scan_items = throttled_scan(scan_items, progress.throttle)
+
+    size_of: dict[str, int] = {}
+    by_size: dict[int, list[str]] = defaultdict(list)
+    with progress.metrics.phase('duplicate scan'):
+        for item in cancellable(progress.metrics.timed_iteration('duplicate scan', scan_items), progress.cancellation):
+            # Scan errors are reported by the deletion pass, which lists the tree again.
+            if not isinstance(item, os.DirEntry) or item.is_symlink():
+                continue
+            if not (item.is_file(follow_symlinks=False) and templates.matches_name(item.name)):
+                continue
+            if rules.matches(item, progress.metadata):
+                continue
+            try:
+                size = progress.metadata.lstat(item).st_size
+            except OSError:
+                continue
+            size_of[item.path] = size
+            by_size[size].append(item.path)
+
+    groups = [paths for paths in by_size.values() if len(paths) > 1]
+    candidate_count = sum(len(group) for group in groups)
+    yield StatusUpdate(message=f"{candidate_count} of {len(size_of)} template files share their size with another; hashing them...")
+
+    bytes_read = 0
+    with progress.metrics.phase('duplicate hashing'), ThreadPoolExecutor(
+        max_workers=config.hash_workers, thread_name_prefix="hash"
+    ) as executor:
+        bytes_read += sum(min(size_of[path], 2 * PARTIAL_HASH_BYTES) for group in groups for path in group)
+        groups = _rehash_groups(groups, size_of, _partial_hash, 'partial hash', executor, progress)
+
+        # Small files were read whole for their partial hash.
+        final_groups = [group for group in groups if size_of[group[0]] <= 2 * PARTIAL_HASH_BYTES]
+        groups = [group for group in groups if size_of[group[0]] > 2 * PARTIAL_HASH_BYTES]
+        bytes_read += sum(size_of[path] for group in groups for path in group)
+        final_groups += _rehash_groups(groups, size_of, _full_hash, 'full hash', executor, progress)
+
+    duplicates = []
+    for group in final_groups:
+        group.sort(key=_keep_order)
+        duplicates.append(DuplicateGroup(
+            size=size_of[group[0]],
+            original=group[0],
+            copies=group[1:]
+        ))
+    duplicates.sort(key=lambda duplicate: _keep_order(duplicate.original))
+
+    total_bytes = sum(size_of.values())
+    copy_count = sum(len(duplicate.copies) for duplicate in duplicates)
+    yield StatusUpdate(
+        message=f"Found {copy_count} duplicate files of {len(duplicates)} designs "
+                f"(read {bytes_read} of {total_bytes} bytes)."
+    )
+    for duplicate in duplicates:
+        for copy in duplicate.copies:
+            yield StatusUpdate(message=f"Duplicate of {duplicate.original}: {copy}")
+    return duplicates
\ No newline at end of file
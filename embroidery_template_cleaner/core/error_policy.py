@@ -0,0 +1,169 @@
+import errno
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from enum import Enum, auto
+from pathlib import Path
+from typing import Callable
+
+from .configuration import Configuration, DEFAULT_TRANSIENT_ERROR_RETRIES
+from .events import RetrySkipAbortChoice
+
+# The first automatic retry of a transient error waits this long; each
+# further retry waits twice as long as the one before.
+TRANSIENT_RETRY_BACKOFF_SECONDS = 0.5
+
+# Errors that usually clear up on their own: a file held open by another
+# program, or a network share that dropped out for a moment.
+TRANSIENT_ERRNOS = {
+    errno.EBUSY,
+    errno.EAGAIN,
+    errno.EINTR,
+    errno.ETIMEDOUT,
+    errno.ECONNRESET,
+    errno.ECONNABORTED,
+    errno.ENETDOWN,
+    errno.ENETUNREACH,
+    errno.EHOSTUNREACH,
+    errno.ESTALE,
+}
+
+# The same on Windows, where they are reported through winerror.
+TRANSIENT_WINERRORS = {
+    32,  # ERROR_SHARING_VIOLATION
+    33,  # ERROR_LOCK_VIOLATION
+    53,  # ERROR_BAD_NETPATH
+    59,  # ERROR_UNEXP_NET_ERR
+    64,  # ERROR_NETNAME_DELETED
+    121, # ERROR_SEM_TIMEOUT
+}
+
+# --- Error Classification ---
+
+class ErrorKind(Enum):
+    """How an OSError is handled by default."""
+    TRANSIENT = auto()
+    PERMISSION = auto()
+    OTHER = auto()
+
+def classify_error(error: OSError) -> ErrorKind:
+    # Windows reports sharing violations as PermissionError, so winerror is
+    # checked before the exception type.
+    if getattr(error, 'winerror', None) in TRANSIENT_WINERRORS or error.errno in TRANSIENT_ERRNOS:
+        return ErrorKind.TRANSIENT
+    if isinstance(error, PermissionError):
+        return ErrorKind.PERMISSION
+    return ErrorKind.OTHER
+
+def _similarity_key(error: OSError) -> tuple:
+    """Errors with the same key count as "similar" for apply-to-all choices."""
+    return (type(error), error.errno, getattr(error, 'winerror', None))
+
+# --- Deferred Retry Queue ---
+
+@dataclass(order=True)
+class DeferredOperation:
+    """
+    A failed operation set aside to be retried at the end of the run.
+    on_success is called if a later attempt succeeds.
+    """
+    due_time: float
+    sequence: int
+    operation: Callable[[], None] = field(compare=False)
+    operation_description: str = field(compare=False)
+    path: Path = field(compare=False)
+    error: OSError = field(compare=False)
+    attempts: int = field(compare=False)
+    on_success: Callable[[], None] = field(compare=False)
+
+# --- Error Policy ---
+
+class ErrorPolicy:
+    """
+    Decides what happens to a failed operation before (or instead of) asking
+    the user, so one locked subtree does not mean hundreds of dialogs:
+
+    - Transient errors are retried automatically with exponential backoff,
+      up to transient_retries times.
+    - Permission errors are skipped if skip_permission_errors is set.
+    - A Skip or Abort the user chose with "apply to all similar errors" is
+      reused for every later error of the same type and errno. Retry is never
+      repeated automatically, since it could loop forever.
+    - If defer_failures is set, failures are not handled where they happen
+      but queued and retried once the pass is over, so a slow path never
+      stalls the rest of the run.
+    """
+
+    def __init__(
+        self,
+        transient_retries: int = DEFAULT_TRANSIENT_ERROR_RETRIES,
+        skip_permission_errors: bool = True,
+        defer_failures: bool = True,
+    ):
+        self.transient_retries = transient_retries
+        self.skip_permission_errors = skip_permission_errors
+        self.defer_failures = defer_failures
+        self._remembered_choices: dict[tuple, RetrySkipAbortChoice] = {}
+        self._deferred: list[DeferredOperation] = []
+        self._sequence = itertools.count()
+
+    @staticmethod
+    def from_configuration(config: Configuration) -> 'ErrorPolicy':
+        return ErrorPolicy(
+            transient_retries=config.transient_error_retries,
+            skip_permission_errors=config.skip_permission_errors,
+            defer_failures=config.defer_failed_operations
+        )
+
+    def automatic_choice(self, error: OSError) -> RetrySkipAbortChoice | None:
+        """Returns the choice to make without asking the user, or None to ask."""
+        remembered = self._remembered_choices.get(_similarity_key(error))
+        if remembered is not None:
+            return remembered
+        if self.skip_permission_errors and classify_error(error) == ErrorKind.PERMISSION:
+            return RetrySkipAbortChoice.SKIP
+        return None
+
+    def remember_choice(self, error: OSError, choice: RetrySkipAbortChoice):
+        if choice != RetrySkipAbortChoice.RETRY:
+            self._remembered_choices[_similarity_key(error)] = choice
+
+    def should_retry(self, error: OSError, attempts: int) -> bool:
+        """Whether a transient error should be retried automatically after attempts retries."""
+        return classify_error(error) == ErrorKind.TRANSIENT and attempts < self.transient_retries
+
+    def backoff_delay(self, attempts: int) -> float:
+        return TRANSIENT_RETRY_BACKOFF_SECONDS * 2 ** attempts
+
+    # --- Retry Queue ---
+
+    def defer(
+        self,
+        operation: Callable[[], None],
+        operation_description: str,
+        path: Path,
+        error: OSError,
+        on_success: Callable[[], None],
+        attempts: int = 0,
+    ):
+        """Queues a failed operation. Transient errors are retried after a backoff, others right away."""
+        delay = self.backoff_delay(attempts) if self.should_retry(error, attempts) else 0.0
+        heapq.heappush(self._deferred, DeferredOperation(
+            due_time=time.monotonic() + delay,
+            sequence=next(self._sequence),
+            operation=operation,
+            operation_description=operation_description,
+            path=path,
+            error=error,
+            attempts=attempts,
+            on_success=on_success
+        ))
+
+    def pop_deferred(self) -> DeferredOperation | None:
+        """Returns the queued operation that is due first, or None if the queue is empty."""
+        return heapq.heappop(self._deferred) if self._deferred else None
+
+    @property
+    def deferred_count(self) -> int:
+        return len(self._deferred)
\ No newline at end of file
@@ -0,0 +1,84 @@
+import threading
+from pathlib import Path
+
+from .configuration import Configuration, INDEX_FILE_LOCATION
+from .rules import IgnoreContext, inherited_ignore_context
+from .scan_index import count_indexed_entries
+from .scanner import DirectoryEntered, DirectoryExited, ScanError, UnlistedEntries, scan_tree
+
+# --- Total Estimate ---
+
+class TotalEstimate:
+    """
+    How many items a run is going to scan, so its progress can be shown as a
+    fraction of the whole. total stays None until it is known.
+
+    The trees are counted on a background thread, which only lists
+    directories (the file types come with the listing, so nothing is
+    stat'ed) and finishes well before the run itself. Like the run, it
+    does not look into what the ignore files exclude. With a scan index, the
+    directories it records are counted from the index instead, and only the
+    others are listed. Both count what the run would scan today; files added
+    or removed meanwhile only make the estimate a little off.
+
+    A throttled run lists nothing more than it must, so it is only
+    estimated if the scan index records all of it.
+    """
+
+    def __init__(self, roots: list[Path]):
+        self.roots = roots
+        self.total: int | None = None
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def start(config: Configuration) -> 'TotalEstimate':
+        estimate = TotalEstimate(config.target_directories)
+        # Each root is counted as an item of its own, as the cleaner does.
+        count = len(estimate.roots)
+        # Each directory left to list, with the ignore context in force above it.
+        directories: list[tuple[Path, IgnoreContext | None]] = []
+        for root in estimate.roots:
+            indexed = count_indexed_entries(INDEX_FILE_LOCATION, root) if config.use_scan_index else None
+            unrecorded_directories = [root] if indexed is None else indexed[1]
+            if indexed is not None:
+                count += indexed[0]
+            directories.extend(
+                (directory, inherited_ignore_context(root, directory) if config.use_ignore_files else None)
+                for directory in unrecorded_directories
+            )
+
+        throttled = (
+            config.max_operations_per_second is not None or config.max_bytes_per_second is not None
+            or config.adaptive_throttle
+        )
+        if not directories:
+            estimate.total = count
+        elif not throttled:
+            threading.Thread(target=estimate._count, args=(count, directories), name="precount", daemon=True).start()
+        return estimate
+
+    def stop(self):
+        """Abandons the count, if it is still running."""
+        self._stopped.set()
+
+    def _count(self, total: int, directories: list[tuple[Path, IgnoreContext | None]]):
+        """
+        Adds the entries below directories to total, which already counts
+        the directories themselves, as the run's scan counts them.
+        """
+        for directory, ignore in directories:
+            scan_items = scan_tree(directory, ignore)
+            try:
+                for item in scan_items:
+                    if self._stopped.is_set():
+                        return
+                    if isinstance(item, UnlistedEntries):
+                        total += item.count
+                    elif isinstance(item, DirectoryEntered):
+                        total += item.path != directory
+                    elif not isinstance(item, DirectoryExited | ScanError):
+                        total += 1
+            finally:
+                scan_items.close()
+        if not self._stopped.is_set():
+            self.total = total
\ No newline at end of file
@@ -8,6 +8,30 @@ class StatusUpdate:
     """Sent by the worker to update the GUI with a progress message."""
     message: str
 
+@dataclass
+class ProgressUpdate:
+    """
+    Sent by the worker in place of a run of StatusUpdates: the latest message
+    plus the run's counters so far, emitted at a bounded rate.
+    estimated_total_items is how many items the run is expected to scan, or
+    None while that is not known; items_per_second is the recent scanning
+    throughput. A throttled run also reports the recent rate of its
+    operations on the storage and of the bytes of the files they removed,
+    and, if the throttle adapts, how many operations it lets run at once;
+    these are None otherwise. bytes_freed is None if the run does not count
+    them (see Configuration.count_bytes_freed).
+    """
+    message: str
+    items_scanned: int
+    files_deleted: int
+    directories_removed: int
+    bytes_freed: int | None = 0
+    estimated_total_items: int | None = None
+    items_per_second: float = 0.0
+    operations_per_second: float | None = None
+    io_bytes_per_second: float | None = None
+    io_concurrency: int | None = None
+
 @dataclass
 class RequestConfirmation:
     """
@@ -17,6 +41,21 @@ class RequestConfirmation:
     path: str
     files_in_dir: list[str]
 
+@dataclass
+class DisplayOnlyDirectory:
+    """A directory that only contains display files, awaiting confirmation."""
+    path: str
+    files_in_dir: list[str]
+
+@dataclass
+class RequestBatchConfirmation:
+    """
+    Sent once, at the end of the run, with every directory that was found to
+    only contain display files. The worker keeps deleting while it collects
+    them, then pauses until a BatchConfirmationResponse is sent back.
+    """
+    directories: list[DisplayOnlyDirectory]
+
 class RetrySkipAbortChoice(Enum):
     """Enumerates the possible user choices for a failed operation."""
     RETRY = auto()
@@ -38,6 +77,27 @@ class CleaningResult:
     """Sent when the cleaning operation finishes successfully."""
     deleted_files_count: int
     target_dir: str
+    directories_removed: int = 0
+    items_scanned: int = 0
+    # None if the run did not count them.
+    bytes_freed: int | None = 0
+    # Set if the run was cancelled; the counts are then those of the part that ran.
+    cancelled: bool = False
+
+@dataclass
+class RunStatistics:
+    """
+    Sent just before the CleaningResult (or ErrorOccurred): where the run's
+    time went. Phases are wall-clock stretches of the run; operations are
+    counted and timed call by call. profile_summary holds the top of a
+    cProfile report if profiling was turned on.
+    """
+    wall_seconds: float
+    phase_seconds: dict[str, float]
+    operation_counts: dict[str, int]
+    operation_seconds: dict[str, float]
+    operation_max_seconds: dict[str, float]
+    profile_summary: str | None = None
 
 @dataclass
 class ErrorOccurred:
@@ -53,15 +113,28 @@ class UserConfirmationResponse:
     """Sent by the GUI in response to a RequestConfirmation event."""
     accepted: bool
 
+@dataclass
+class BatchConfirmationResponse:
+    """Sent by the GUI in response to a RequestBatchConfirmation event."""
+    accepted_paths: list[str]
+
 @dataclass
 class RetrySkipAbortResponse:
-    """Sent by the GUI in response to a RequestRetrySkipAbort event."""
+    """
+    Sent by the GUI in response to a RequestRetrySkipAbort event. If
+    apply_to_all is set, the same choice is made for every later error of the
+    same kind without asking again.
+    """
     choice: RetrySkipAbortChoice
+    apply_to_all: bool = False
 
 # --- Type Aliases for clarity in function signatures ---
 
 # An Event is any message sent FROM the worker TO the GUI.
-type Event = StatusUpdate | RequestConfirmation | RequestRetrySkipAbort | CleaningResult | ErrorOccurred
+type Event = (
+    StatusUpdate | ProgressUpdate | RequestConfirmation | RequestBatchConfirmation
+    | RequestRetrySkipAbort | RunStatistics | CleaningResult | ErrorOccurred
+)
 
 # A Response is any message sent FROM the GUI TO the worker.
-type Response = UserConfirmationResponse | RetrySkipAbortResponse
\ No newline at end of file
+type Response = UserConfirmationResponse | BatchConfirmationResponse | RetrySkipAbortResponse
\ No newline at end of file
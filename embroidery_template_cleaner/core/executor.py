@@ -0,0 +1,97 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from .throttle import IoThrottle, throttled
+
+# --- Bounded Parallel Unlink Executor ---
+
+class ParallelUnlinker:
+    """
+    Keeps many unlinks in flight on a bounded thread pool. This hides the
+    per-operation round trip on network shares, where a serial loop spends
+    nearly all its time waiting.
+
+    Results are handed back strictly in submission order, one at a time, so
+    the caller can run any OSError through its usual Retry/Skip/Abort
+    handling and keep exact counts. Each submission carries an opaque context
+    object that is returned alongside its result, as does the size of the
+    file: the one submitted with it or, given lstat, the one lstat looks up
+    on the worker thread just before removing the file. Without either, the
+    file is not stat'ed and its size is not known.
+
+    remove is what is done to each path (os.unlink unless given), for
+    instance to move files into a quarantine instead. Given a throttle, the size
+    lookup and the removal each wait for a turn of their own on the worker
+    thread, since both are a round trip to the storage, so an adaptive
+    throttle holds back workers rather than submissions. A submission may
+    also carry a verify callable, which is given the file's stat result
+    before it is removed and raises an OSError to keep it instead.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_in_flight: int | None = None,
+        remove: Callable[[str], None] | None = None,
+        lstat: Callable[[str], os.stat_result] | None = None,
+        throttle: IoThrottle | None = None,
+    ):
+        self._remove = remove or os.unlink
+        self._lstat = lstat
+        self._throttle = throttle
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="unlink")
+        self._in_flight: deque[tuple[Future, str, Any]] = deque()
+        self.max_in_flight = max_in_flight or max_workers * 4
+
+    def __enter__(self) -> 'ParallelUnlinker':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self._in_flight) >= self.max_in_flight
+
+    def _measured_remove(self, path: str, verify: Callable[[os.stat_result], None] | None, size: int | None) -> int | None:
+        if size is None and self._lstat is not None:
+            stat_result = throttled(partial(self._lstat, path), self._throttle)()
+            if verify is not None:
+                verify(stat_result)
+            size = stat_result.st_size
+        throttled(partial(self._remove, path), self._throttle, size or 0)()
+        return size
+
+    def submit(
+        self,
+        path: str,
+        context: Any = None,
+        verify: Callable[[os.stat_result], None] | None = None,
+        size: int | None = None,
+    ):
+        """Schedules removing path, whose size may already be known, without waiting for it."""
+        self._in_flight.append((self._executor.submit(self._measured_remove, path, verify, size), path, context))
+
+    def pop_oldest(self) -> tuple[str, Any, int | None, OSError | None]:
+        """
+        Waits for the oldest submitted unlink and returns its path, context,
+        the size of the removed file (None if it is not known, 0 if it was
+        not removed) and the OSError it raised (None on success).
+        """
+        future, path, context = self._in_flight.popleft()
+        try:
+            size = future.result()
+        except OSError as e:
+            return path, context, 0, e
+        return path, context, size, None
+
+    def shutdown(self):
+        """Cancels queued unlinks and waits for the ones already running."""
+        self._in_flight.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
\ No newline at end of file
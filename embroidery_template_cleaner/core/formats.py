@@ -0,0 +1,101 @@
+import os
+from dataclasses import dataclass, field
+from typing import Generator, Iterable
+
+from .cancellation import cancellable
+from .configuration import Configuration
+from .events import Event, Response, StatusUpdate
+from .progress import CleaningProgress
+from .scanner import ScanItem, DirectoryEntered, DirectoryExited
+
+# --- Format Policy ---
+
+class FormatPolicy:
+    """
+    Keeps the best keep_formats formats of every design and deletes the
+    others. A design is the files of one directory that share a stem (the
+    name without its extension, ignoring case), such as rose.pes, rose.dst
+    and rose.exp. Formats are ranked by their place in preference; only
+    formats in it take part, the others are left to the deletion rules.
+    """
+
+    def __init__(self, preference: list[str], keep_formats: int):
+        self.keep_formats = keep_formats
+        self._ranks = {extension: rank for rank, extension in enumerate(preference)}
+
+    @staticmethod
+    def from_configuration(config: Configuration) -> 'FormatPolicy | None':
+        """The policy config asks for, or None if formats are not grouped."""
+        if not config.keep_formats:
+            return None
+        return FormatPolicy(config.format_preference, config.keep_formats)
+
+    def rank(self, name: str) -> int | None:
+        """The preference rank of the file's format (0 is best), or None if it takes no part."""
+        return self._ranks.get(os.path.splitext(name)[1].lower())
+
+@dataclass
+class FormatSelection:
+    """
+    What the policy decided for the designs below a root. Paths are as the
+    scanner reports them, so they can be matched against a later scan.
+    """
+    policy: FormatPolicy
+    # The files of formats beyond the best keep_formats of their design.
+    surplus: set[str] = field(default_factory=set)
+    designs: int = 0
+
+    def decides(self, name: str) -> bool:
+        """Whether the file is one of a design's formats, which only the policy deletes."""
+        return self.policy.rank(name) is not None
+
+# --- Grouping Pass ---
+
+def _select_in_directory(designs: dict[str, list[tuple[int, str]]], selection: FormatSelection):
+    keep_formats = selection.policy.keep_formats
+    for files in designs.values():
+        if len(files) > keep_formats:
+            files.sort()
+            selection.surplus.update(path for _, path in files[keep_formats:])
+    selection.designs += len(designs)
+
+def select_formats_generator(
+    scan_items: Iterable[ScanItem],
+    policy: FormatPolicy,
+    progress: CleaningProgress,
+) -> Generator[Event, Response, FormatSelection]:
+    """
+    Groups the design files of scan_items by directory and stem, and
+    selects the formats to delete. scan_items is a scan of its own, made
+    before the deletion pass, which lists the same tree again: duplicate
+    detection needs the whole selection before anything is deleted. Each
+    directory's designs are hashed into buckets by stem as its files arrive
+    and decided as it is exited, so only the buckets of the directories
+    being walked are held. Ties in rank (the same format in two spellings)
+    keep the first by name.
+    """
+    selection = FormatSelection(policy=policy)
+    # The designs of each directory on the current path, by stem.
+    stack: list[dict[str, list[tuple[int, str]]]] = []
+    with progress.metrics.phase('format grouping'):
+        scan_items = cancellable(progress.metrics.timed_iteration('format scan', scan_items), progress.cancellation)
+        try:
+            for item in scan_items:
+                if isinstance(item, DirectoryEntered):
+                    stack.append({})
+                elif isinstance(item, DirectoryExited):
+                    _select_in_directory(stack.pop(), selection)
+                elif isinstance(item, os.DirEntry):
+                    # Classified like the deletion pass does, so both see the same files.
+                    rank = policy.rank(item.name)
+                    if rank is not None and progress.metadata.is_file(item):
+                        stem = os.path.splitext(item.name)[0].lower()
+                        stack[-1].setdefault(stem, []).append((rank, item.path))
+        finally:
+            scan_items.close()
+
+    yield StatusUpdate(
+        message=f"Keeping the best {policy.keep_formats} formats of {selection.designs} designs; "
+                f"{len(selection.surplus)} files are in other formats."
+    )
+    return selection
\ No newline at end of file
@@ -0,0 +1,143 @@
+import cProfile
+import io
+import pstats
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Generator, Iterable, Iterator
+
+from .events import RunStatistics
+
+# Number of functions listed in the profile summary sent with RunStatistics.
+PROFILE_SUMMARY_LINES = 25
+
+# --- Timers ---
+
+@dataclass
+class OperationTimer:
+    """How often an operation ran and how long it took in total and at worst."""
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def add(self, seconds: float, count: int = 1):
+        self.count += count
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+# --- Run Metrics ---
+
+class RunMetrics:
+    """
+    Counters and cumulative timers for one cleaning run.
+
+    Phases are wall-clock stretches of the run (the deletion pass, deferred
+    retries, ...); since the cleaner is a generator, a phase includes any time
+    spent waiting for the user while it was running. Operations are timed one
+    call at a time: every scanned entry, unlink, rmdir and stat, every wait
+    for a parallel unlink and for the user's answer. Comparing the two shows
+    where a slow run spent its time.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.operations: dict[str, OperationTimer] = {}
+        self._profiler: cProfile.Profile | None = None
+
+    def record(self, name: str, seconds: float, count: int = 1):
+        timer = self.operations.get(name)
+        if timer is None:
+            timer = self.operations[name] = OperationTimer()
+        timer.add(seconds, count)
+
+    def timed(self, name: str, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Calls function, recording how long it took under name (even if it raises)."""
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def merge(self, statistics: RunStatistics):
+        """
+        Adds another run's statistics (a shard's, say) to these. Phase times
+        of runs that went on side by side add up like CPU time.
+        """
+        for name, seconds in statistics.phase_seconds.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for name, count in statistics.operation_counts.items():
+            timer = self.operations.setdefault(name, OperationTimer())
+            timer.count += count
+            timer.total_seconds += statistics.operation_seconds[name]
+            timer.max_seconds = max(timer.max_seconds, statistics.operation_max_seconds[name])
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def timed_iteration(self, name: str, iterable: Iterable) -> Generator[Any, None, None]:
+        """Yields from iterable, recording the time spent producing each item under name."""
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self.record(name, time.perf_counter() - start, count=0)
+                    return
+                self.record(name, time.perf_counter() - start)
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    # --- Profiling ---
+
+    def start_profiling(self):
+        """Starts cProfile for the calling thread."""
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def stop_profiling(self) -> pstats.Stats | None:
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        return pstats.Stats(self._profiler)
+
+    def to_event(self, profile: pstats.Stats | None = None) -> RunStatistics:
+        summary = None
+        if profile is not None:
+            stream = io.StringIO()
+            profile.stream = stream
+            profile.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_SUMMARY_LINES)
+            summary = stream.getvalue()
+
+        return RunStatistics(
+            wall_seconds=time.perf_counter() - self.start_time,
+            phase_seconds=dict(self.phases),
+            operation_counts={name: timer.count for name, timer in self.operations.items()},
+            operation_seconds={name: timer.total_seconds for name, timer in self.operations.items()},
+            operation_max_seconds={name: timer.max_seconds for name, timer in self.operations.items()},
+            profile_summary=summary
+        )
+
+def format_run_statistics(statistics: RunStatistics) -> str:
+    """Renders RunStatistics as a small plain-text report for the log or the terminal."""
+    lines = [f"Run statistics ({statistics.wall_seconds:.3f}s wall time):"]
+    for name, seconds in statistics.phase_seconds.items():
+        lines.append(f"  phase {name:<24} {seconds:10.3f}s")
+    for name in sorted(statistics.operation_seconds, key=statistics.operation_seconds.get, reverse=True):
+        lines.append(
+            f"  {name:<30} {statistics.operation_counts[name]:>9} x "
+            f"{statistics.operation_seconds[name]:10.3f}s total, {statistics.operation_max_seconds[name] * 1000:9.2f}ms max"
+        )
+    if statistics.profile_summary:
+        lines.append(statistics.profile_summary)
+    return '\n'.join(lines)
\ No newline at end of file
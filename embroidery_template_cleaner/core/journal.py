@@ -0,0 +1,285 @@
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Generator, TextIO
+
+from .configuration import Configuration, JOURNAL_DIRECTORY
+from .events import Event, Response, StatusUpdate
+from .planner import DeletionPlan, PlannedDirectory, plan_directory_generator, apply_plan_generator
+from .progress import CleaningProgress
+
+# Completions are made durable (fsync'ed) after this many settled entries or
+# this many seconds, whichever comes first.
+CHECKPOINT_INTERVAL_ENTRIES = 1000
+CHECKPOINT_INTERVAL_SECONDS = 2.0
+
+JOURNAL_FILE_SUFFIX = '.journal.jsonl'
+
+# --- Run Journal ---
+
+class RunJournal:
+    """
+    A write-ahead journal of one cleaning run, stored as JSON lines in its own
+    file under JOURNAL_DIRECTORY.
+
+    The complete plan is written and fsync'ed before anything is deleted. As
+    the plan is applied, files and directories are settled strictly in plan
+    order, so progress is a prefix of the plan. Checkpoint records only need
+    to store how far each list got; entries that were kept (skipped, failed
+    or not confirmed) are recorded individually. A crash loses at most the
+    completions since the last checkpoint. On resume those entries are simply
+    found to be gone already.
+
+    The journal also serves as an audit trail of what each run planned and
+    did.
+    """
+
+    def __init__(self, path: Path, plan: DeletionPlan, handle: TextIO):
+        self.path = path
+        self.plan = plan
+        self.files_settled = 0
+        self.directories_settled = 0
+        self.files_deleted = 0
+        self.directories_removed = 0
+        self.kept_files: set[str] = set()
+        self.kept_directories: set[str] = set()
+        self.finished = False
+        self._handle = handle
+        self._unsynced_count = 0
+        self._last_sync_time = time.monotonic()
+
+    @staticmethod
+    def create(plan: DeletionPlan, directory: Path = JOURNAL_DIRECTORY) -> 'RunJournal':
+        """Starts a new journal and durably records the whole plan in it."""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{datetime.now():%Y%m%d-%H%M%S-%f}{JOURNAL_FILE_SUFFIX}"
+        journal = RunJournal(path, plan, open(path, 'x', encoding='utf-8'))
+
+        journal._write({
+            'type': 'run',
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'target_directory': plan.target_directory,
+            'extensions_to_delete': plan.extensions_to_delete,
+            'items_scanned': plan.items_scanned,
+            'files_by_extension': plan.files_by_extension,
+            'bytes_by_extension': plan.bytes_by_extension,
+            'bytes_by_top_level_folder': plan.bytes_by_top_level_folder,
+            'confirmation_bytes': plan.confirmation_bytes
+        })
+        for relative_path in plan.files:
+            record = {'type': 'file', 'path': relative_path}
+            if relative_path in plan.file_fingerprints:
+                record['fingerprint'] = plan.file_fingerprints[relative_path]
+            journal._write(record)
+        for planned in plan.directories:
+            journal._write({'type': 'directory', 'path': planned.path, 'display_files': planned.display_files})
+        journal._write({'type': 'planned'})
+        journal._sync()
+        return journal
+
+    @staticmethod
+    def load(path: Path) -> 'RunJournal':
+        """Reopens a journal, restoring its plan and how far it got, to resume it."""
+        plan = None
+        planned = False
+        state = {}
+        kept_files, kept_directories = set(), set()
+        finished = False
+
+        valid_length = 0
+        try:
+            with open(path, 'rb') as handle:
+                for line in handle:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("incomplete line")
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash; everything before it is intact.
+                        break
+                    valid_length += len(line)
+
+                    match record['type']:
+                        case 'run':
+                            plan = DeletionPlan(
+                                target_directory=record['target_directory'],
+                                extensions_to_delete=record['extensions_to_delete'],
+                                items_scanned=record['items_scanned'],
+                                files_by_extension=record['files_by_extension'],
+                                bytes_by_extension=record['bytes_by_extension'],
+                                bytes_by_top_level_folder=record['bytes_by_top_level_folder'],
+                                confirmation_bytes=record['confirmation_bytes']
+                            )
+                        case 'file':
+                            plan.files.append(record['path'])
+                            if 'fingerprint' in record:
+                                plan.file_fingerprints[record['path']] = record['fingerprint']
+                        case 'directory':
+                            plan.directories.append(PlannedDirectory(path=record['path'], display_files=record['display_files']))
+                        case 'planned':
+                            planned = True
+                        case 'checkpoint':
+                            state = record
+                        case 'kept_file':
+                            kept_files.add(record['path'])
+                        case 'recovered_file':
+                            kept_files.discard(record['path'])
+                        case 'kept_directory':
+                            kept_directories.add(record['path'])
+                        case 'finished':
+                            finished = True
+        except (OSError, KeyError, AttributeError) as e:
+            raise ValueError(f"Could not read journal file: {path}\n{e}")
+
+        if plan is None or not planned:
+            # The plan is written before any deletion, so nothing was deleted.
+            raise ValueError(f"Journal was interrupted before its plan was complete: {path}")
+
+        # Drop any torn tail so new records start on a fresh line.
+        if valid_length < path.stat().st_size:
+            os.truncate(path, valid_length)
+
+        journal = RunJournal(path, plan, open(path, 'a', encoding='utf-8'))
+        journal.files_settled = state.get('files_settled', 0)
+        journal.directories_settled = state.get('directories_settled', 0)
+        journal.files_deleted = state.get('files_deleted', 0)
+        journal.directories_removed = state.get('directories_removed', 0)
+        journal.kept_files = kept_files
+        journal.kept_directories = kept_directories
+        journal.finished = finished
+        return journal
+
+    @staticmethod
+    def find_unfinished(target_directory: Path | None = None, directory: Path = JOURNAL_DIRECTORY) -> Path | None:
+        """Returns the newest journal that never finished, optionally only for one target directory."""
+        if not directory.is_dir():
+            return None
+
+        for path in sorted(directory.glob(f"*{JOURNAL_FILE_SUFFIX}"), reverse=True):
+            try:
+                with open(path, 'rb') as handle:
+                    header = json.loads(handle.readline())
+                    handle.seek(max(0, path.stat().st_size - 4096))
+                    last_line = handle.read().splitlines()[-1]
+            except (OSError, IndexError, json.JSONDecodeError):
+                continue
+            try:
+                if json.loads(last_line).get('type') == 'finished':
+                    continue
+            except json.JSONDecodeError:
+                pass # A torn final line means the run did not finish.
+            if target_directory is None or Path(header.get('target_directory', '')) == Path(target_directory):
+                return path
+        return None
+
+    # --- Progress Records ---
+
+    # The journal keeps its own counts, so they stay right when the run's
+    # progress also counts other target directories.
+
+    def file_settled(self, relative_path: str, kept: bool, deleted: bool):
+        self.files_settled += 1
+        if deleted:
+            self.files_deleted += 1
+        if kept:
+            self.kept_files.add(relative_path)
+            self._write({'type': 'kept_file', 'path': relative_path})
+        self._count_unsynced()
+
+    def file_recovered(self, relative_path: str):
+        """Records that a file settled as kept was deleted after all, by a deferred retry."""
+        self.files_deleted += 1
+        self.kept_files.discard(relative_path)
+        self._write({'type': 'recovered_file', 'path': relative_path})
+        self._count_unsynced()
+
+    def directory_settled(self, relative_path: str, kept: bool):
+        self.directories_settled += 1
+        if kept:
+            self.kept_directories.add(relative_path)
+            self._write({'type': 'kept_directory', 'path': relative_path})
+        else:
+            self.directories_removed += 1
+        self._count_unsynced()
+
+    def checkpoint(self):
+        """Durably records how far the plan has been applied."""
+        self._write({
+            'type': 'checkpoint',
+            'files_settled': self.files_settled,
+            'directories_settled': self.directories_settled,
+            'files_deleted': self.files_deleted,
+            'directories_removed': self.directories_removed
+        })
+        self._sync()
+
+    def finish(self):
+        """Marks the run as complete and closes the journal."""
+        self.checkpoint()
+        self._write({'type': 'finished', 'finished_at': datetime.now().isoformat(timespec='seconds')})
+        self._sync()
+        self.finished = True
+        self._handle.close()
+
+    def close(self):
+        """Checkpoints and closes the journal, leaving it resumable."""
+        if self._handle.closed:
+            return
+        self.checkpoint()
+        self._handle.close()
+
+    def _count_unsynced(self):
+        self._unsynced_count += 1
+        if (self._unsynced_count >= CHECKPOINT_INTERVAL_ENTRIES
+                or time.monotonic() - self._last_sync_time >= CHECKPOINT_INTERVAL_SECONDS):
+            self.checkpoint()
+
+    def _write(self, record: dict):
+        self._handle.write(json.dumps(record) + '\n')
+
+    def _sync(self):
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._unsynced_count = 0
+        self._last_sync_time = time.monotonic()
+
+# --- Journaled Run Generators ---
+
+def journaled_clean_generator(
+    config: Configuration,
+    progress: CleaningProgress | None = None,
+) -> Generator[Event, Response, int]:
+    """
+    Cleans like clean_directory_generator, but plans the whole run first and
+    records it in a new journal before deleting anything, so an interrupted
+    run can be resumed with resume_journal_generator.
+    """
+    if progress is None:
+        progress = CleaningProgress()
+    with progress.metrics.phase('plan'):
+        plan = yield from plan_directory_generator(config, progress)
+    journal = RunJournal.create(plan)
+    yield StatusUpdate(message=f"Recorded plan in journal {journal.path}")
+    return (yield from resume_journal_generator(journal, config, progress))
+
+def resume_journal_generator(
+    journal: RunJournal,
+    config: Configuration,
+    progress: CleaningProgress | None = None,
+) -> Generator[Event, Response, int]:
+    """
+    Applies the rest of a journal's plan. The journal is marked finished on
+    success and left resumable if the run is aborted or fails.
+    """
+    finished = False
+    try:
+        deleted_files_count = yield from apply_plan_generator(journal.plan, config, progress, journal)
+        finished = True
+    finally:
+        if finished:
+            journal.finish()
+        else:
+            journal.close()
+    return deleted_files_count
\ No newline at end of file
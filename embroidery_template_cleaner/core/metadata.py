@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from .instrumentation import RunMetrics
+
+# --- Per-Run Metadata Lookups ---
+
+class MetadataCache:
+    """
+    The one place a cleaning run looks up file metadata, so that every entry
+    is stat'ed at most once and the stat calls can be counted.
+
+    Entries from a directory listing carry the file type the listing reported
+    (d_type on POSIX, the find data on Windows), which is enough to classify
+    them without any system call; only symlinks need a stat to be followed.
+    Stat results are cached on the entry objects themselves (os.DirEntry does
+    this, and so does IndexedEntry), so the cache costs no memory per file.
+
+    stat_calls counts the stats made through the cache; they are also timed
+    in metrics under 'stat'. On a file system that reports no file types at
+    all, a DirEntry stats itself once when it is first classified, which is
+    not visible here.
+
+    Classifying entries needs no stat, but counting the bytes freed does,
+    so a run only counts them if it must stat its files anyway or is asked
+    to (see Configuration.count_bytes_freed); every file deleted is then
+    lstat'ed once, just before it is removed, unless the size and age
+    limits already did. Stats may be made from the unlink worker threads
+    too, so they are counted under a lock.
+    """
+
+    def __init__(self, metrics: RunMetrics | None = None):
+        self.stat_calls = 0
+        self._metrics = metrics if metrics is not None else RunMetrics()
+        self._lock = threading.Lock()
+        # Registered up front, so a run that needed no stat at all says so.
+        self._metrics.record('stat', 0.0, count=0)
+
+    def _counted(self, function: Callable[..., Any], *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.stat_calls += 1
+                self._metrics.record('stat', seconds)
+
+    def is_file(self, entry: os.DirEntry) -> bool:
+        """Like entry.is_file(), but a stat is only made (and counted) to follow a symlink."""
+        if not entry.is_symlink():
+            return entry.is_file(follow_symlinks=False)
+        return self._counted(entry.is_file)
+
+    def lstat(self, entry: os.DirEntry) -> os.stat_result:
+        """The entry's own stat result (symlinks are not followed), looked up once per entry."""
+        return self._counted(entry.stat, follow_symlinks=False)
+
+    def stat_path(self, path: Path, follow_symlinks: bool = True) -> os.stat_result:
+        """Stats a path that was not found through a listing, such as the target directory."""
+        return self._counted(os.stat, path, follow_symlinks=follow_symlinks)
+
+    def lstat_path(self, path: str, lstat: Callable[[str], os.stat_result] = os.lstat) -> os.stat_result:
+        """
+        Lstats a file about to be deleted through lstat (os.lstat unless
+        given), from any thread.
+        """
+        return self._counted(lstat, path)
\ No newline at end of file
@@ -0,0 +1,500 @@
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from functools import partial
+from pathlib import Path
+from typing import Generator, Iterable, TYPE_CHECKING
+
+from .cancellation import cancellable
+from .configuration import Configuration, INDEX_FILE_LOCATION
+from .cleaner import (
+    _DirectoryTally,
+    _record_file_outcome,
+    _retry_deferred_operations_generator,
+    _retryable_operation_generator,
+)
+from .error_policy import ErrorPolicy
+from .events import (
+    Event,
+    Response,
+    StatusUpdate,
+    RequestConfirmation,
+    RequestBatchConfirmation,
+    DisplayOnlyDirectory,
+)
+from .executor import ParallelUnlinker
+from .formats import FormatPolicy, select_formats_generator
+from .metadata import MetadataCache
+from .progress import CleaningProgress
+from .rules import DeletionRules, IgnoreContext
+from .scan_index import ScanIndex
+from .throttle import IoThrottle, throttled
+from .scanner import configured_scan_tree, ScanItem, DirectoryEntered, DirectoryExited, UnlistedEntries, ScanError
+
+if TYPE_CHECKING:
+    from .journal import RunJournal
+
+# Key used for files that sit directly in the target directory.
+TOP_LEVEL_FILES_KEY = '.'
+
+# --- Plan Data ---
+
+@dataclass
+class PlannedDirectory:
+    """
+    A directory that would be removed. If display_files is not empty, the
+    directory would only contain those files and is removed after the user
+    confirms deleting them.
+    """
+    path: str
+    display_files: list[str] = field(default_factory=list)
+
+@dataclass
+class DeletionPlan:
+    """
+    What a cleaning run would do, produced without touching the disk. All paths
+    are relative to target_directory. Files are listed in scan order and
+    directories in post-order, so the plan can be applied as-is.
+    """
+    target_directory: str
+    extensions_to_delete: list[str]
+    files: list[str] = field(default_factory=list)
+    directories: list[PlannedDirectory] = field(default_factory=list)
+    items_scanned: int = 0
+    files_by_extension: dict[str, int] = field(default_factory=dict)
+    bytes_by_extension: dict[str, int] = field(default_factory=dict)
+    bytes_by_top_level_folder: dict[str, int] = field(default_factory=dict)
+    # Size of display files that would only be deleted after confirmation.
+    confirmation_bytes: int = 0
+    # The size and modification time (in nanoseconds) of every planned file
+    # when it was planned; a file that no longer matches is not deleted.
+    file_fingerprints: dict[str, list[int]] = field(default_factory=dict)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes_by_extension.values())
+
+    @staticmethod
+    def from_json_file(json_path: Path) -> 'DeletionPlan':
+        """Loads a plan saved with to_json_str."""
+        try:
+            plan_dict = json.loads(json_path.read_text())
+            plan = DeletionPlan(**plan_dict)
+            plan.directories = [PlannedDirectory(**d) for d in plan.directories]
+        except (json.JSONDecodeError, FileNotFoundError, TypeError) as e:
+            raise ValueError(f"Could not read or parse plan file: {json_path}\n{e}")
+
+        # A plan must never reach outside its target directory.
+        for relative_path in plan.files + [d.path for d in plan.directories]:
+            if os.path.isabs(relative_path) or '..' in Path(relative_path).parts:
+                raise ValueError(f"Plan file contains a path outside the target directory: {relative_path}")
+
+        return plan
+
+    def to_json_str(self) -> str:
+        """Serializes the plan to a JSON string."""
+        return json.dumps(asdict(self), indent=2)
+
+# --- Planning Generator ---
+
+def _extension_key(name: str, rules: DeletionRules) -> str:
+    """The extension a planned file is counted under: the one it was matched by, if any."""
+    extension = rules.matched_extension(name)
+    if extension is not None:
+        return extension
+    name = name.lower()
+    return os.path.splitext(name)[1] or name
+
+def plan_directory_generator(
+    config: Configuration,
+    progress: CleaningProgress | None = None,
+) -> Generator[Event, Response, DeletionPlan]:
+    """
+    Runs the same matching and post-order pruning rules as
+    clean_directory_generator, but only records what would be deleted.
+    Directories that would be display-only are assumed to be confirmed
+    (and so may let their parents become empty); they are flagged in the plan
+    so the confirmation is still asked when it is applied.
+    If progress is given, the scan is timed in its metrics and metadata is
+    looked up through its cache. Only yields StatusUpdates. The formats of
+    designs are selected first, as by the cleaner, so the plan lists the
+    files they decide.
+    """
+    plan = DeletionPlan(
+        target_directory=str(config.target_directory),
+        extensions_to_delete=sorted(config.extensions_to_delete)
+    )
+    root_prefix = os.path.join(str(config.target_directory), '')
+    if progress is None:
+        progress = CleaningProgress()
+
+    yield StatusUpdate(message="Scanning target directory to plan deletions...")
+    ignore = IgnoreContext() if config.use_ignore_files else None
+    format_selection = None
+    format_policy = FormatPolicy.from_configuration(config)
+    if format_policy is not None:
+        format_selection = yield from select_formats_generator(
+            configured_scan_tree(config.target_directory, config, ignore), format_policy, progress
+        )
+    rules = DeletionRules.from_configuration(config, format_selection)
+    # The index would hide the formats of designs it does not delete by extension.
+    use_scan_index = config.use_scan_index and format_selection is None
+    index = ScanIndex(INDEX_FILE_LOCATION, rules, progress.metadata) if use_scan_index else None
+    if index:
+        scan_items = index.scan(config.target_directory, ignore)
+    else:
+        scan_items = configured_scan_tree(config.target_directory, config, ignore)
+    scan_items = cancellable(progress.metrics.timed_iteration('scan', scan_items), progress.cancellation)
+    try:
+        yield from _plan_scan_items_generator(scan_items, rules, plan, root_prefix, progress.metadata)
+    finally:
+        scan_items.close()
+        if index is not None:
+            index.close()
+
+    yield StatusUpdate(
+        message=f"Planned deletion of {len(plan.files)} files ({plan.total_bytes} bytes) "
+                f"and {len(plan.directories)} folders."
+    )
+    return plan
+
+def _plan_scan_items_generator(
+    scan_items: Iterable[ScanItem],
+    rules: DeletionRules,
+    plan: DeletionPlan,
+    root_prefix: str,
+    metadata: MetadataCache,
+) -> Generator[Event, Response, None]:
+    """
+    Fills in the plan from the scanner's stream, mirroring the cleaner's
+    deletion pass. Only files in the plan (and display files) are stat'ed,
+    once each, for their size (and modification time).
+    """
+    tallies: list[_DirectoryTally] = []
+    for item in scan_items:
+        if isinstance(item, DirectoryEntered):
+            plan.items_scanned += 1
+            if tallies:
+                tallies[-1].remaining_count += 1
+            tallies.append(_DirectoryTally(path=item.path))
+            continue
+
+        if isinstance(item, DirectoryExited):
+            tally = tallies.pop()
+            if not (tallies and tally.changed):
+                continue
+
+            if tally.remaining_count == 0:
+                planned = PlannedDirectory(path=str(tally.path)[len(root_prefix):])
+            elif tally.remaining_count == len(tally.display_files):
+                planned = PlannedDirectory(
+                    path=str(tally.path)[len(root_prefix):],
+                    display_files=[f.name for f in tally.display_files]
+                )
+                plan.confirmation_bytes += sum(metadata.lstat(f).st_size for f in tally.display_files)
+            else:
+                continue
+
+            plan.directories.append(planned)
+            tallies[-1].remaining_count -= 1
+            tallies[-1].changed = True
+            continue
+
+        if isinstance(item, UnlistedEntries):
+            plan.items_scanned += item.count
+            tallies[-1].remaining_count += item.count
+            continue
+
+        if isinstance(item, ScanError):
+            yield StatusUpdate(message=f"Error reading {item.path}: {item.error}. Skipping.")
+            if tallies:
+                tallies[-1].remaining_count += 1
+            continue
+
+        plan.items_scanned += 1
+        tally = tallies[-1]
+        is_file = metadata.is_file(item)
+        if not (is_file and rules.matches(item, metadata)):
+            _record_file_outcome(tally, item, deleted=False, is_file=is_file)
+            continue
+
+        relative_path = item.path[len(root_prefix):]
+        stat_result = metadata.lstat(item)
+        size = stat_result.st_size
+        extension = _extension_key(item.name, rules)
+        folder = relative_path.split(os.sep, 1)[0] if os.sep in relative_path else TOP_LEVEL_FILES_KEY
+
+        plan.files.append(relative_path)
+        plan.file_fingerprints[relative_path] = [size, stat_result.st_mtime_ns]
+        plan.files_by_extension[extension] = plan.files_by_extension.get(extension, 0) + 1
+        plan.bytes_by_extension[extension] = plan.bytes_by_extension.get(extension, 0) + size
+        plan.bytes_by_top_level_folder[folder] = plan.bytes_by_top_level_folder.get(folder, 0) + size
+        tally.changed = True
+
+# --- Plan Application Generator ---
+
+class PlannedFileChangedError(OSError):
+    """Raised for a planned file that is no longer the one that was planned."""
+
+def _verify_planned_file(plan: DeletionPlan, relative_path: str, stat_result: os.stat_result):
+    """Raises PlannedFileChangedError if the file's size or modification time differs from the plan's."""
+    fingerprint = plan.file_fingerprints.get(relative_path)
+    if fingerprint is not None and [stat_result.st_size, stat_result.st_mtime_ns] != fingerprint:
+        raise PlannedFileChangedError(f"'{relative_path}' changed since it was planned")
+
+@dataclass
+class _PlanApplication:
+    """State shared by the steps of applying a plan."""
+    root: str
+    plan: DeletionPlan
+    progress: CleaningProgress
+    journal: 'RunJournal | None'
+    confirmation_policy: str
+    error_policy: ErrorPolicy
+    # Relative files that were kept (skipped, failed or deferred).
+    kept_files: set[str] = field(default_factory=set)
+    # Relative directories that must stay because something in them was kept.
+    blocked_directories: set[str] = field(default_factory=set)
+    # Relative display-only directories approved by the batched confirmation.
+    confirmed_directories: set[str] = field(default_factory=set)
+
+def apply_plan_generator(
+    plan: DeletionPlan,
+    config: Configuration,
+    progress: CleaningProgress | None = None,
+    journal: 'RunJournal | None' = None,
+) -> Generator[Event, Response, int]:
+    """
+    Carries out a previously computed plan without scanning the tree again.
+    Failures go through the error policy and the usual Retry/Skip/Abort
+    protocol, and display-only directories are confirmed as in a normal run
+    (with the 'batch' policy, all of them in one request once the files are
+    gone). A directory is only removed if everything planned inside it was
+    actually removed; planned entries that have already disappeared count as
+    removed. A planned file whose size or modification time is no longer
+    what the plan recorded has been replaced or written to since, and is
+    kept.
+
+    If a journal is given, every settled file and directory is checkpointed in
+    it, and application resumes after whatever it records as already settled.
+    Returns the count of deleted files.
+
+    If progress.cancellation is cancelled, the deletions in flight are
+    settled and OperationCancelledError is raised; a journal then stays
+    resumable.
+    """
+    if progress is None:
+        progress = CleaningProgress()
+    if progress.throttle is None:
+        progress.throttle = IoThrottle.from_configuration(config, progress.cancellation)
+    progress.items_scanned += plan.items_scanned
+    state = _PlanApplication(
+        root=plan.target_directory,
+        plan=plan,
+        progress=progress,
+        journal=journal,
+        confirmation_policy=config.confirmation_policy,
+        error_policy=ErrorPolicy.from_configuration(config)
+    )
+    first_file, first_directory = 0, 0
+    if journal is not None:
+        first_file, first_directory = journal.files_settled, journal.directories_settled
+        progress.files_deleted += journal.files_deleted
+        progress.directories_removed += journal.directories_removed
+        state.kept_files.update(journal.kept_files)
+        state.blocked_directories.update(os.path.dirname(p) for p in journal.kept_directories)
+
+    yield StatusUpdate(message=f"Applying plan: deleting {len(plan.files) - first_file} files...")
+    with progress.metrics.phase('apply files'):
+        unlinker = None
+        if config.deletion_workers > 1:
+            unlinker = ParallelUnlinker(
+                max_workers=config.deletion_workers, lstat=progress.metadata.lstat_path, throttle=progress.throttle
+            )
+        try:
+            for relative_path in plan.files[first_file:]:
+                if progress.cancellation.is_cancelled:
+                    break
+                path = os.path.join(state.root, relative_path)
+                yield StatusUpdate(message=f"Deleting file: {path}")
+                if unlinker is None:
+                    try:
+                        size = _planned_file_size(state, path, relative_path)
+                    except PlannedFileChangedError as e:
+                        yield from _keep_changed_file_generator(state, relative_path, e)
+                        continue
+                    outcome = yield from _unlink_planned_file_generator(state, path, relative_path, size=size)
+                    _settle_planned_file(state, relative_path, outcome, size)
+                    continue
+
+                while unlinker.is_full:
+                    yield from _settle_oldest_planned_unlink_generator(state, unlinker)
+                unlinker.submit(path, context=relative_path, verify=partial(_verify_planned_file, plan, relative_path))
+
+            while unlinker is not None and len(unlinker):
+                yield from _settle_oldest_planned_unlink_generator(state, unlinker)
+        finally:
+            if unlinker is not None:
+                unlinker.shutdown()
+    progress.cancellation.raise_if_cancelled()
+
+    # Failures deferred by the error policy are retried before any directory
+    # is removed, so a late success still lets its directory go.
+    with progress.metrics.phase('deferred retries'):
+        yield from _retry_deferred_operations_generator(state.error_policy, progress)
+    state.blocked_directories.update(os.path.dirname(p) for p in state.kept_files)
+
+    if config.confirmation_policy == 'batch':
+        with progress.metrics.phase('batch confirmation'):
+            yield from _confirm_planned_directories_generator(state, plan.directories[first_directory:])
+
+    with progress.metrics.phase('apply directories'):
+        for planned in plan.directories[first_directory:]:
+            progress.cancellation.raise_if_cancelled()
+            removed = yield from _remove_planned_directory_generator(state, planned)
+            if journal is not None:
+                journal.directory_settled(planned.path, kept=not removed)
+
+    return progress.files_deleted
+
+def _confirm_planned_directories_generator(state: _PlanApplication, directories: list[PlannedDirectory]) -> Generator[Event, Response, None]:
+    """Asks once about every planned display-only directory that can still be removed."""
+    pending = [
+        DisplayOnlyDirectory(path=str(Path(state.root, planned.path)), files_in_dir=planned.display_files)
+        for planned in directories
+        if planned.display_files and planned.path not in state.blocked_directories
+    ]
+    if not pending:
+        return
+    response: Response = yield RequestBatchConfirmation(directories=pending)
+    root_prefix = os.path.join(state.root, '')
+    state.confirmed_directories.update(path[len(root_prefix):] for path in response.accepted_paths)
+
+def _unlink_planned_file_generator(
+    state: _PlanApplication,
+    path: str,
+    relative_path: str | None = None,
+    error: OSError | None = None,
+    size: int = 0,
+) -> Generator[Event, Response, bool | None]:
+    """
+    Deletes a planned file of size bytes (unless error says an attempt
+    already failed), through the run's throttle if it has one.
+    Returns True if it was deleted, None if it was already gone and False if
+    it was kept. A failure may be deferred to the error policy's retry queue
+    if relative_path is given; it then counts as kept until it succeeds.
+    """
+    operation = throttled(Path(path).unlink, state.progress.throttle, size)
+    if error is None:
+        try:
+            state.progress.metrics.timed('unlink', operation)
+            return True
+        except OSError as e:
+            error = e
+
+    if isinstance(error, FileNotFoundError):
+        return None
+    return (yield from _retryable_operation_generator(
+        operation=operation,
+        operation_description=f"deleting file '{os.path.basename(path)}'",
+        path=Path(path),
+        initial_error=error,
+        error_policy=state.error_policy,
+        on_deferred_success=partial(_recover_planned_file, state, relative_path, size) if relative_path else None,
+        metrics=state.progress.metrics
+    ))
+
+def _planned_file_size(state: _PlanApplication, path: str, relative_path: str) -> int:
+    """
+    The size of a planned file about to be deleted, for the bytes freed (0
+    if it cannot be found). Raises PlannedFileChangedError if it changed
+    since it was planned.
+    """
+    stat_path = partial(state.progress.metadata.stat_path, Path(path), follow_symlinks=False)
+    try:
+        stat_result = throttled(stat_path, state.progress.throttle)()
+    except OSError:
+        return 0
+    _verify_planned_file(state.plan, relative_path, stat_result)
+    return stat_result.st_size
+
+def _keep_changed_file_generator(state: _PlanApplication, relative_path: str, error: PlannedFileChangedError) -> Generator[Event, Response, None]:
+    yield StatusUpdate(message=f"Keeping {error}.")
+    _settle_planned_file(state, relative_path, False)
+
+def _settle_oldest_planned_unlink_generator(state: _PlanApplication, unlinker: ParallelUnlinker) -> Generator[Event, Response, None]:
+    path, relative_path, size, error = state.progress.metrics.timed('parallel unlink wait', unlinker.pop_oldest)
+    if isinstance(error, PlannedFileChangedError):
+        yield from _keep_changed_file_generator(state, relative_path, error)
+        return
+    if error is not None:
+        try:
+            size = _planned_file_size(state, path, relative_path)
+        except PlannedFileChangedError as e:
+            yield from _keep_changed_file_generator(state, relative_path, e)
+            return
+    outcome = True if error is None else (yield from _unlink_planned_file_generator(state, path, relative_path, error, size))
+    _settle_planned_file(state, relative_path, outcome, size)
+
+def _settle_planned_file(state: _PlanApplication, relative_path: str, outcome: bool | None, size: int = 0):
+    if outcome:
+        state.progress.files_deleted += 1
+        state.progress.bytes_freed += size
+    elif outcome is False:
+        state.kept_files.add(relative_path)
+
+    if state.journal is not None:
+        state.journal.file_settled(relative_path, kept=outcome is False, deleted=bool(outcome))
+
+def _recover_planned_file(state: _PlanApplication, relative_path: str, size: int = 0):
+    """Called when a deferred deletion succeeds after its file (of size bytes) was settled as kept."""
+    state.progress.files_deleted += 1
+    state.progress.bytes_freed += size
+    state.kept_files.discard(relative_path)
+    if state.journal is not None:
+        state.journal.file_recovered(relative_path)
+
+def _remove_planned_directory_generator(state: _PlanApplication, planned: PlannedDirectory) -> Generator[Event, Response, bool]:
+    """Removes one planned directory, confirming first if it holds display files. Returns True if removed."""
+    parent = os.path.dirname(planned.path)
+    if planned.path in state.blocked_directories:
+        state.blocked_directories.add(parent)
+        return False
+
+    path = Path(state.root, planned.path)
+    if planned.display_files:
+        if state.confirmation_policy == 'ask':
+            response: Response = yield RequestConfirmation(path=str(path), files_in_dir=planned.display_files)
+            accepted = response.accepted
+        elif state.confirmation_policy == 'batch':
+            accepted = planned.path in state.confirmed_directories
+        else:
+            accepted = state.confirmation_policy == 'always'
+
+        if not accepted:
+            yield StatusUpdate(message=f"Skipping deletion of display files in {path.name}.")
+            state.blocked_directories.add(parent)
+            return False
+
+        yield StatusUpdate(message=f"Deleting display files in {path.name}...")
+        all_removed = True
+        for name in planned.display_files:
+            outcome = yield from _unlink_planned_file_generator(state, str(path / name))
+            all_removed = all_removed and outcome is not False
+        if not all_removed:
+            state.blocked_directories.add(parent)
+            return False
+
+    yield StatusUpdate(message=f"Removing empty directory: {path}")
+    removed = yield from _retryable_operation_generator(
+        operation=throttled(path.rmdir, state.progress.throttle),
+        operation_description=f"removing directory '{path.name}'",
+        path=path,
+        error_policy=state.error_policy,
+        metrics=state.progress.metrics
+    )
+    if removed:
+        state.progress.directories_removed += 1
+    else:
+        state.blocked_directories.add(parent)
+    return removed
\ No newline at end of file
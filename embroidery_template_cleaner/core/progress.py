@@ -0,0 +1,167 @@
+import queue
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from .cancellation import CancellationToken
+from .estimate import TotalEstimate
+from .events import ProgressUpdate
+from .instrumentation import RunMetrics
+from .metadata import MetadataCache
+from .throttle import IoThrottle
+
+# At most this many ProgressUpdate events reach the GUI per second, however
+# fast the cleaner produces status messages.
+MAX_PROGRESS_UPDATES_PER_SECOND = 10
+
+# Throughput is measured over roughly this many of the latest seconds.
+THROUGHPUT_WINDOW_SECONDS = 5.0
+
+# --- Run Counters ---
+
+@dataclass
+class CleaningProgress:
+    """Running counters for a cleaning run, updated in place by the cleaner."""
+    items_scanned: int = 0
+    files_deleted: int = 0
+    directories_removed: int = 0
+    # Sizes of the deleted files, and what filtering archives saved; None if
+    # the run does not count them.
+    bytes_freed: int | None = 0
+    metrics: RunMetrics = field(default_factory=RunMetrics)
+    # Checked between operations; see CancellationToken.
+    cancellation: CancellationToken = field(default_factory=CancellationToken)
+    # All metadata lookups of the run go through here and are counted in metrics.
+    metadata: MetadataCache = field(init=False)
+    # Paces the run's operations on the storage, if it is throttled.
+    throttle: IoThrottle | None = None
+
+    def __post_init__(self):
+        self.metadata = MetadataCache(self.metrics)
+
+# --- Coalescing Progress Channel ---
+
+class ProgressChannel:
+    """
+    Sits between the cleaner and the update queue on the worker side. Status
+    messages are not forwarded one by one; only the latest message is kept and
+    sent, together with the current counters, as a ProgressUpdate at most
+    max_updates_per_second times per second. This keeps the queue (and the
+    GUI's backlog) flat no matter how quickly files are deleted.
+
+    Each update also carries the recent throughput and, if an estimate is
+    given, the total it expects, so the time left can be worked out. The
+    rates of a throttled run are measured from progress.throttle, unless
+    io_rates reports them (operations and bytes per second, and concurrency)
+    instead, as a coordinator does for its shards.
+    """
+
+    def __init__(
+        self,
+        update_queue: queue.Queue,
+        progress: CleaningProgress,
+        max_updates_per_second: float = MAX_PROGRESS_UPDATES_PER_SECOND,
+        estimate: TotalEstimate | None = None,
+        io_rates: Callable[[], tuple[float | None, float | None, int | None]] | None = None,
+    ):
+        self._update_queue = update_queue
+        self._progress = progress
+        self._interval = 1.0 / max_updates_per_second
+        self._next_emit_time = 0.0
+        self._latest_message: str | None = None
+        self._estimate = estimate
+        self._io_rates = io_rates
+        # (time, items scanned, operations, bytes) at each update sent during the window.
+        self._samples: deque[tuple[float, int, int, int]] = deque()
+
+    def publish(self, message: str):
+        """Records a status message, sending it only if the rate limit allows."""
+        self._latest_message = message
+        if time.monotonic() >= self._next_emit_time:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends the pending message, if any, immediately. Called before anything
+        that must not overtake it (user prompts and the final result).
+        """
+        if self._latest_message is None:
+            return
+
+        now = time.monotonic()
+        items_per_second, operations_per_second, io_bytes_per_second = self._rates(now)
+        throttle = self._progress.throttle
+        io_concurrency = int(throttle.concurrency) if throttle is not None and throttle.adaptive else None
+        if self._io_rates is not None:
+            operations_per_second, io_bytes_per_second, io_concurrency = self._io_rates()
+        elif throttle is None:
+            operations_per_second = io_bytes_per_second = None
+        elif self._progress.bytes_freed is None:
+            # The removals' sizes are not looked up.
+            io_bytes_per_second = None
+        self._update_queue.put(ProgressUpdate(
+            message=self._latest_message,
+            items_scanned=self._progress.items_scanned,
+            files_deleted=self._progress.files_deleted,
+            directories_removed=self._progress.directories_removed,
+            bytes_freed=self._progress.bytes_freed,
+            estimated_total_items=self._estimate.total if self._estimate else None,
+            items_per_second=items_per_second,
+            operations_per_second=operations_per_second,
+            io_bytes_per_second=io_bytes_per_second,
+            io_concurrency=io_concurrency
+        ))
+        self._latest_message = None
+        self._next_emit_time = now + self._interval
+
+    def _rates(self, now: float) -> tuple[float, float, float]:
+        """Items scanned, throttled operations and their bytes per second over the window."""
+        throttle = self._progress.throttle
+        sample = (
+            now,
+            self._progress.items_scanned,
+            throttle.operations if throttle is not None else 0,
+            throttle.bytes if throttle is not None else 0
+        )
+        self._samples.append(sample)
+        # The newest sample from before the window is kept as its start.
+        while len(self._samples) > 2 and now - self._samples[1][0] >= THROUGHPUT_WINDOW_SECONDS:
+            self._samples.popleft()
+        start = self._samples[0]
+        if now <= start[0]:
+            return 0.0, 0.0, 0.0
+        elapsed = now - start[0]
+        return tuple((value - start_value) / elapsed for value, start_value in zip(sample[1:], start[1:]))
+
+# --- Reporting Progress ---
+
+def estimate_remaining_seconds(update: ProgressUpdate) -> float | None:
+    """The time the run needs to reach its estimated total at its current throughput, if both are known."""
+    if update.estimated_total_items is None or update.items_per_second <= 0:
+        return None
+    return max(0, update.estimated_total_items - update.items_scanned) / update.items_per_second
+
+def format_io_rates(update: ProgressUpdate) -> str | None:
+    """The rates of a throttled run, or None if it is not throttled."""
+    if update.operations_per_second is None:
+        return None
+    line = f"{update.operations_per_second:.0f} operations/s"
+    if update.io_bytes_per_second is not None:
+        line = f"{line}, {format_byte_count(int(update.io_bytes_per_second))}/s"
+    return line if update.io_concurrency is None else f"{line}, {update.io_concurrency} at once"
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{(seconds % 3600) // 60:02}:{seconds % 60:02}"
+
+def format_file_count(files: int, bytes_freed: int | None) -> str:
+    """'N files', followed by their size if it was counted."""
+    return f"{files} files" if bytes_freed is None else f"{files} files ({format_byte_count(bytes_freed)})"
+
+def format_byte_count(count: int) -> str:
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if count < 1024:
+            return f"{count} {unit}" if unit == 'bytes' else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} TB"
\ No newline at end of file
@@ -0,0 +1,279 @@
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Generator, TextIO
+
+from .configuration import QUARANTINE_DIRECTORY_NAME
+from .events import Event, Response, StatusUpdate
+
+QUARANTINE_MANIFEST_NAME = 'manifest.jsonl'
+QUARANTINE_FILES_DIRECTORY = 'files'
+
+# Runs are named after the time they started, so they sort oldest first.
+_RUN_NAME_FORMAT = '%Y%m%d-%H%M%S-%f'
+_RUN_NAME_TIME_LENGTH = len('20240101-000000-000000')
+
+# --- Quarantine of One Run ---
+
+class Quarantine:
+    """
+    Where one run puts the files it removes from a target directory, instead
+    of deleting them: root/QUARANTINE_DIRECTORY_NAME/<run>/files/, at the same
+    relative paths. Files are moved with os.rename, which only rewrites
+    directory entries on the same file system, so quarantining a file costs
+    about as much as deleting it and no data is copied. A file on another
+    file system (below a mount point) cannot be renamed there; that fails
+    like any other error, and the file is left in place.
+
+    Before each move, the file's relative path is appended to the run's
+    manifest, one JSON string per line, so every quarantined file is listed
+    even if the run is killed part way. The run's directory is only created
+    by the first move. move() may be called from several threads at once.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.run_directory = root / QUARANTINE_DIRECTORY_NAME / f"{datetime.now():{_RUN_NAME_FORMAT}}-{os.getpid()}"
+        self.files_moved = 0
+        self._files_directory = str(self.run_directory / QUARANTINE_FILES_DIRECTORY)
+        self._handle: TextIO | None = None
+        self._created_directories: set[str] = set()
+        self._lock = threading.Lock()
+
+    def move(self, path: str):
+        """Moves the file at path, which is below root, into the quarantine."""
+        relative_path = os.path.relpath(path, self.root)
+        target = os.path.join(self._files_directory, relative_path)
+        parent = os.path.dirname(target)
+        with self._lock:
+            if self._handle is None:
+                os.makedirs(self._files_directory)
+                self._handle = open(self.run_directory / QUARANTINE_MANIFEST_NAME, 'x', encoding='utf-8')
+                self._handle.write(json.dumps({
+                    'type': 'quarantine',
+                    'started_at': datetime.now().isoformat(timespec='seconds'),
+                    'target_directory': str(self.root)
+                }) + '\n')
+            self._handle.write(json.dumps(relative_path) + '\n')
+            self._handle.flush()
+            if parent not in self._created_directories:
+                os.makedirs(parent, exist_ok=True)
+                self._created_directories.add(parent)
+        os.rename(path, target)
+        with self._lock:
+            self.files_moved += 1
+
+    def close(self):
+        """Makes the manifest durable and closes it."""
+        if self._handle is None or self._handle.closed:
+            return
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+
+# --- Quarantined Runs ---
+
+@dataclass
+class QuarantineSummary:
+    """What restoring or purging quarantined runs did."""
+    runs: int = 0
+    files: int = 0
+    # Files that could not be restored (or purged) and are still quarantined.
+    files_left: int = 0
+
+def _run_time(run_directory: Path) -> datetime | None:
+    try:
+        return datetime.strptime(run_directory.name[:_RUN_NAME_TIME_LENGTH], _RUN_NAME_FORMAT)
+    except ValueError:
+        return None
+
+def list_quarantined_runs(root: Path) -> list[Path]:
+    """The run directories quarantined below root, oldest first."""
+    try:
+        with os.scandir(root / QUARANTINE_DIRECTORY_NAME) as iterator:
+            runs = [Path(entry.path) for entry in iterator if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+    return sorted(run for run in runs if _run_time(run) is not None)
+
+def select_quarantined_runs(root: Path, run: str | None = None) -> list[Path]:
+    """Every quarantined run below root, or only the one named run ('latest' for the newest)."""
+    runs = list_quarantined_runs(root)
+    if run is None:
+        return runs
+    if run == 'latest':
+        return runs[-1:]
+    return [r for r in runs if r.name == run]
+
+def read_manifest(run_directory: Path) -> list[str]:
+    """The relative paths listed in a run's manifest, once each, in the order they were moved."""
+    relative_paths: dict[str, None] = {}
+    try:
+        with open(run_directory / QUARANTINE_MANIFEST_NAME, 'rb') as handle:
+            handle.readline() # The header.
+            for line in handle:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete line")
+                    relative_paths[json.loads(line)] = None
+                except ValueError:
+                    # A torn final line; the move it announced never happened.
+                    break
+    except FileNotFoundError:
+        pass
+    return list(relative_paths)
+
+def _remove_empty_quarantine_directory(root: Path):
+    try:
+        (root / QUARANTINE_DIRECTORY_NAME).rmdir()
+    except OSError:
+        pass # Other runs are still quarantined.
+
+# --- Restoring (runs on the quarantine threads) ---
+
+def _restore_file(root: Path, run_directory: Path, relative_path: str) -> tuple[str, OSError | None]:
+    """
+    Moves one quarantined file back. Returns 'restored', 'missing' (it was
+    never moved, or was restored already), 'conflict' (its original path is
+    taken again) or 'failed', and the error for the latter.
+    """
+    source = os.path.join(run_directory, QUARANTINE_FILES_DIRECTORY, relative_path)
+    target = os.path.join(root, relative_path)
+    try:
+        if not os.path.lexists(source):
+            return 'missing', None
+        if os.path.lexists(target):
+            return 'conflict', None
+        # Folders the run removed once they were emptied are created again.
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.rename(source, target)
+    except OSError as e:
+        return 'failed', e
+    return 'restored', None
+
+def _remove_restored_run(run_directory: Path) -> bool:
+    """Removes a run whose files were all restored, unless anything unexpected is left in it."""
+    files_directory = run_directory / QUARANTINE_FILES_DIRECTORY
+    for directory, _, _ in os.walk(files_directory, topdown=False):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+    if files_directory.exists():
+        return False
+    try:
+        (run_directory / QUARANTINE_MANIFEST_NAME).unlink(missing_ok=True)
+        run_directory.rmdir()
+    except OSError:
+        return False
+    return True
+
+def restore_quarantine_generator(
+    root: Path,
+    workers: int,
+    run: str | None = None,
+) -> Generator[Event, Response, QuarantineSummary]:
+    """
+    Moves quarantined files back to where they were, on workers threads:
+    every run quarantined below root, or only the one named run, newest
+    first, as undoing the runs one by one would. A file whose original path
+    has been taken again is left in the quarantine.
+    Runs that were restored completely are removed.
+    """
+    summary = QuarantineSummary()
+    runs = select_quarantined_runs(root, run)
+    if run is not None and not runs:
+        yield StatusUpdate(message=f"No quarantined run '{run}' in {root}.")
+        return summary
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quarantine") as executor:
+        for run_directory in reversed(runs):
+            relative_paths = read_manifest(run_directory)
+            yield StatusUpdate(message=f"Restoring {len(relative_paths)} files from {run_directory.name}...")
+            results = executor.map(
+                _restore_file, [root] * len(relative_paths), [run_directory] * len(relative_paths), relative_paths
+            )
+            files_left = 0
+            for relative_path, (outcome, error) in zip(relative_paths, results):
+                if outcome == 'restored':
+                    summary.files += 1
+                elif outcome == 'conflict':
+                    files_left += 1
+                    yield StatusUpdate(message=f"Not restoring {relative_path}: the path is taken again.")
+                elif outcome == 'failed':
+                    files_left += 1
+                    yield StatusUpdate(message=f"Error restoring {relative_path}: {error}")
+
+            summary.runs += 1
+            summary.files_left += files_left
+            if not files_left and not _remove_restored_run(run_directory):
+                yield StatusUpdate(message=f"Kept {run_directory}, which holds files not in its manifest.")
+
+    _remove_empty_quarantine_directory(root)
+    yield StatusUpdate(message=f"Restored {summary.files} files from {summary.runs} quarantined runs in {root}.")
+    return summary
+
+# --- Purging ---
+
+def _purge_file(run_directory: Path, relative_path: str) -> tuple[bool, OSError | None]:
+    """Deletes one quarantined file. Returns whether it was there, and any error."""
+    try:
+        os.unlink(os.path.join(run_directory, QUARANTINE_FILES_DIRECTORY, relative_path))
+    except FileNotFoundError:
+        return False, None
+    except OSError as e:
+        return False, e
+    return True, None
+
+def purge_quarantine_generator(
+    root: Path,
+    workers: int,
+    run: str | None = None,
+    older_than_days: int | None = None,
+) -> Generator[Event, Response, QuarantineSummary]:
+    """
+    Deletes quarantined files for good, on workers threads: every run
+    quarantined below root, only the one named run, or only the runs that
+    started more than older_than_days ago. The files listed in a run's
+    manifest are unlinked in parallel, then what is left of the run is
+    removed as a whole.
+    """
+    summary = QuarantineSummary()
+    runs = select_quarantined_runs(root, run)
+    if older_than_days is not None:
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        runs = [r for r in runs if _run_time(r) < cutoff]
+    if not runs:
+        if run is not None:
+            yield StatusUpdate(message=f"No quarantined run '{run}' in {root}.")
+        return summary
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quarantine") as executor:
+        for run_directory in runs:
+            relative_paths = read_manifest(run_directory)
+            yield StatusUpdate(message=f"Purging {len(relative_paths)} files from {run_directory.name}...")
+            results = executor.map(_purge_file, [run_directory] * len(relative_paths), relative_paths)
+            files_left = 0
+            for relative_path, (purged, error) in zip(relative_paths, results):
+                if purged:
+                    summary.files += 1
+                elif error is not None:
+                    files_left += 1
+                    yield StatusUpdate(message=f"Error purging {relative_path}: {error}")
+
+            summary.runs += 1
+            summary.files_left += files_left
+            if not files_left:
+                try:
+                    shutil.rmtree(run_directory)
+                except OSError as e:
+                    yield StatusUpdate(message=f"Error removing {run_directory}: {e}")
+
+    _remove_empty_quarantine_directory(root)
+    yield StatusUpdate(message=f"Purged {summary.files} files from {summary.runs} quarantined runs in {root}.")
+    return summary
\ No newline at end of file
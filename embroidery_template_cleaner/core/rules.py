@@ -0,0 +1,261 @@
+import os
+import re
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .configuration import Configuration
+
+if TYPE_CHECKING:
+    from .formats import FormatSelection
+
+# A file of this name in any folder being cleaned lists glob patterns of
+# entries to leave alone, in that folder and below it.
+IGNORE_FILE_NAME = '.cleanerignore'
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+def _translate_glob(pattern: str) -> str:
+    """
+    Translates a glob into a regular expression. * and ? never match a path
+    separator, ** matches across them, and [...] is a character class
+    ([!...] negated). A / stands for the platform's separator.
+    """
+    separator = re.escape(os.sep)
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            parts.append(f'(?:.*{separator})?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+        c = pattern[i]
+        end = pattern.find(']', i + 2) if c == '[' else -1
+        if c == '*':
+            parts.append(f'[^{separator}]*')
+        elif c == '?':
+            parts.append(f'[^{separator}]')
+        elif end != -1:
+            body = pattern[i + 1:end].replace('\\', '\\\\')
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append(f'[{body}]')
+            i = end
+        elif c == '/':
+            parts.append(separator)
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return ''.join(parts)
+
+# --- Deletion Rules ---
+
+class DeletionRules:
+    """
+    Decides which files a run deletes, compiled once from the configuration:
+
+    * extensions, including multi-part suffixes such as '.pes.bak', are
+      looked up in one set, one lookup per dot in the name;
+    * name globs are joined into a single regular expression;
+    * the size and age limits, if any, are only checked for files whose
+      name matched, so only those are stat'ed;
+    * given a format selection, the files of a design's formats are
+      deleted if the selection found them surplus, and only then.
+
+    Names are matched ignoring case, as extensions always were.
+    """
+
+    def __init__(
+        self,
+        extensions: set[str],
+        patterns: list[str] | None = None,
+        min_file_size: int = 0,
+        max_file_size: int | None = None,
+        min_file_age_days: int = 0,
+        format_selection: 'FormatSelection | None' = None,
+    ):
+        self.extensions = extensions
+        self.patterns = list(patterns or [])
+        self.min_file_size = min_file_size
+        self.max_file_size = max_file_size
+        self.min_file_age_days = min_file_age_days
+        self.format_selection = format_selection
+        self._suffixes = frozenset(extension.lower() for extension in extensions)
+        self._pattern = None
+        if self.patterns:
+            self._pattern = re.compile('|'.join(f'(?:{_translate_glob(p)})' for p in self.patterns), re.IGNORECASE)
+        # Ages are measured from the start of the run, so a long run judges every file alike.
+        self._newest_mtime = time.time() - min_file_age_days * _SECONDS_PER_DAY if min_file_age_days else None
+        self._has_limits = bool(min_file_size or max_file_size is not None or min_file_age_days)
+
+    @staticmethod
+    def from_configuration(config: Configuration, format_selection: 'FormatSelection | None' = None) -> 'DeletionRules':
+        return DeletionRules(
+            config.extensions_to_delete,
+            config.delete_patterns,
+            config.min_file_size,
+            config.max_file_size,
+            config.min_file_age_days,
+            format_selection
+        )
+
+    @property
+    def stats_matches(self) -> bool:
+        """Whether every file matches() accepts has been stat'ed (for the limits), so its size is known."""
+        return self._has_limits and self.format_selection is None
+
+    @property
+    def key(self) -> list:
+        """What the names matched depend on, for a scan index built with these rules."""
+        return [sorted(self._suffixes), self.patterns]
+
+    def matched_extension(self, name: str) -> str | None:
+        """The longest of the extensions the file name ends with (in lower case), if any."""
+        lowered = name.lower()
+        dot = lowered.find('.')
+        while dot != -1:
+            if lowered[dot:] in self._suffixes:
+                return lowered[dot:]
+            dot = lowered.find('.', dot + 1)
+        return None
+
+    def matches_name(self, name: str) -> bool:
+        """Whether the file name matches an extension or a pattern; the limits are not checked."""
+        if self.matched_extension(name) is not None:
+            return True
+        return self._pattern is not None and self._pattern.fullmatch(name) is not None
+
+    def matches(self, entry: os.DirEntry, metadata) -> bool:
+        """
+        Whether the file entry is to be deleted: its name matches, and it is
+        within the size and age limits, checked through metadata (a
+        MetadataCache) only if there are any. A file that cannot be stat'ed
+        is not deleted.
+        """
+        if self.format_selection is not None and self.format_selection.decides(entry.name):
+            return entry.path in self.format_selection.surplus
+        if not self.matches_name(entry.name):
+            return False
+        if not self._has_limits:
+            return True
+        try:
+            stat_result = metadata.lstat(entry)
+        except OSError:
+            return False
+        if stat_result.st_size < self.min_file_size:
+            return False
+        if self.max_file_size is not None and stat_result.st_size > self.max_file_size:
+            return False
+        return self._newest_mtime is None or stat_result.st_mtime <= self._newest_mtime
+
+# --- Ignore Files ---
+
+def _read_ignore_file(directory: Path, dir_fd: int | None = None) -> list[str] | None:
+    """The lines of directory's ignore file ([] if it has none), or None if it cannot be read."""
+    try:
+        if dir_fd is None:
+            handle = open(os.path.join(directory, IGNORE_FILE_NAME), encoding='utf-8', errors='replace')
+        else:
+            handle = open(os.open(IGNORE_FILE_NAME, os.O_RDONLY, dir_fd=dir_fd), encoding='utf-8', errors='replace')
+        with handle:
+            return handle.read().splitlines()
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    except OSError:
+        return None
+
+class IgnoreContext:
+    """
+    The ignore patterns in force in one directory: those of its own ignore
+    file and of every one above it, compiled into one regular expression
+    for files and one for directories, matched against full paths. A
+    directory without an ignore file shares its parent's context, so a
+    tree with no ignore files costs one failed open per directory and
+    nothing per entry.
+
+    An ignore file holds one glob per line, much like a .gitignore: blank
+    lines and lines starting with # are skipped, a pattern ending in / only
+    matches directories, a pattern holding another / is matched against the
+    path below the ignore file's directory, and any other pattern against
+    the name of every entry at any depth below it. Negated patterns (!) are
+    not supported and are skipped, which errs on the side of ignoring more.
+    Patterns are matched ignoring case.
+
+    An ignore file that exists but cannot be read ignores everything in its
+    directory, since what it protects is not known.
+    """
+    __slots__ = ('_file_sources', '_directory_sources', '_files', '_directories', '_everything')
+
+    def __init__(
+        self,
+        file_sources: tuple[str, ...] = (),
+        directory_sources: tuple[str, ...] = (),
+        everything: bool = False,
+    ):
+        self._file_sources = file_sources
+        self._directory_sources = directory_sources
+        self._files = re.compile('|'.join(file_sources), re.IGNORECASE) if file_sources else None
+        self._directories = re.compile('|'.join(directory_sources), re.IGNORECASE) if directory_sources else None
+        self._everything = everything
+
+    def child(self, directory: Path, dir_fd: int | None = None, has_ignore_file: bool | None = None) -> 'IgnoreContext':
+        """
+        The context in force in directory, one of the directories this
+        context is in force in: this one, plus directory's own ignore file.
+        The file is opened relative to dir_fd (directory's descriptor) if
+        given; if has_ignore_file says it is not there, it is not looked for.
+        """
+        if self._everything or has_ignore_file is False:
+            return self
+        lines = _read_ignore_file(directory, dir_fd)
+        if lines is None:
+            return IgnoreContext(everything=True)
+
+        prefix = re.escape(os.path.join(str(directory), ''))
+        below = f'(?:.*{re.escape(os.sep)})?'
+        file_sources = list(self._file_sources)
+        directory_sources = list(self._directory_sources)
+        for line in lines:
+            pattern = line.strip()
+            if not pattern or pattern.startswith(('#', '!')):
+                continue
+            directories_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if not pattern:
+                continue
+            anchored = '/' in pattern
+            source = prefix + ('' if anchored else below) + _translate_glob(pattern.lstrip('/'))
+            directory_sources.append(source)
+            if not directories_only:
+                file_sources.append(source)
+
+        if len(directory_sources) == len(self._directory_sources):
+            return self
+        return IgnoreContext(tuple(file_sources), tuple(directory_sources))
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        """Whether the entry at path, in a directory this context is in force in, is ignored."""
+        if self._everything:
+            return True
+        pattern = self._directories if is_dir else self._files
+        return pattern is not None and pattern.fullmatch(path) is not None
+
+def inherited_ignore_context(target_directory: Path, root: Path) -> IgnoreContext:
+    """
+    The context in force in the parent of root, a directory at or below the
+    target directory, read from the target directory down. The target
+    directory itself inherits nothing. If root (or a directory above it) is
+    ignored, the context ignores everything.
+    """
+    context = IgnoreContext()
+    directory = target_directory
+    for name in root.relative_to(target_directory).parts:
+        context = context.child(directory)
+        directory = directory / name
+        if context.is_ignored(str(directory), is_dir=True):
+            return IgnoreContext(everything=True)
+    return context
\ No newline at end of file
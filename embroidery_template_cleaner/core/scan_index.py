@@ -0,0 +1,348 @@
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Generator
+
+from .configuration import DISPLAY_FILE_EXTENSIONS, QUARANTINE_DIRECTORY_NAME, matches_extensions
+from .metadata import MetadataCache
+from .rules import DeletionRules, IgnoreContext
+from .scanner import ScanItem, DirectoryEntered, DirectoryExited, UnlistedEntries, ScanError
+
+# Names are stored joined by a character that cannot occur in a file name.
+_NAME_SEPARATOR = '/'
+
+# Pending rows are written in batches of this size.
+_WRITE_BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirectories TEXT NOT NULL,
+    matching_files TEXT NOT NULL,
+    display_files TEXT NOT NULL,
+    other_count INTEGER NOT NULL
+);
+"""
+
+# --- Index Records ---
+
+@dataclass
+class _DirectoryRecord:
+    """What a directory held the last time it was listed."""
+    mtime_ns: int
+    subdirectories: list[str] = field(default_factory=list)
+    matching_files: list[str] = field(default_factory=list)
+    display_files: list[str] = field(default_factory=list)
+    other_count: int = 0
+
+class IndexedEntry:
+    """
+    Replays a file recorded in the index in place of an os.DirEntry. Only the
+    parts of the DirEntry interface the cleaner uses are provided. Like a
+    DirEntry, it caches its stat result.
+    """
+    __slots__ = ('name', 'path', '_stat')
+
+    def __init__(self, directory: Path, name: str):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._stat: os.stat_result | None = None
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        return True
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        return False
+
+    def is_symlink(self) -> bool:
+        return False
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        if self._stat is None:
+            self._stat = os.stat(self.path, follow_symlinks=follow_symlinks)
+        return self._stat
+
+# --- Persistent Scan Index ---
+
+class ScanIndex:
+    """
+    An SQLite index of directory modification times and the deletable and
+    display files found in each directory. It lets later runs skip listing
+    directories that have not changed.
+
+    A directory's mtime changes whenever an entry is added, removed or
+    renamed directly inside it. So when the mtime matches the index, its
+    recorded contents can be replayed instead of listed. Only its recorded
+    subdirectories are then stat'ed to decide whether to descend into them.
+    An unchanged tree therefore costs one stat per directory.
+
+    The index is only valid for the names its rules match (their extensions
+    and patterns); it is discarded when those change. What ignore files
+    exclude is recorded all the same and left out as it is replayed, so
+    editing an ignore file never makes the index stale. Directories the consumer of the scan modifies
+    must be reported with mark_changed before the walk moves on from their
+    DirectoryExited marker. They are dropped from the index, since their
+    mtime no longer matches what was listed, and get listed again on the next
+    run. (Anything else that changes a directory changes its mtime too, so a
+    stale record is never replayed.)
+    """
+
+    def __init__(self, db_path: Path, rules: DeletionRules, metadata: MetadataCache | None = None):
+        self.rules = rules
+        self.directories_listed = 0
+        self.directories_replayed = 0
+        self._metadata = metadata if metadata is not None else MetadataCache()
+        self._changed_directories: set[Path] = set()
+        self._pending_writes: list[tuple] = []
+        self._pending_deletes: list[tuple[str]] = []
+
+        self._connection = sqlite3.connect(db_path)
+        self._connection.executescript(_SCHEMA)
+        rules_key = json.dumps([rules.key, sorted(DISPLAY_FILE_EXTENSIONS)])
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'rules'").fetchone()
+        if row is None or row[0] != rules_key:
+            with self._connection:
+                self._connection.execute("DELETE FROM directories")
+                self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rules', ?)", (rules_key,))
+
+    def close(self):
+        self._flush()
+        self._connection.close()
+
+    def mark_changed(self, directory: Path):
+        """Reports that the consumer of the scan changed (or removed) a directory it was handed."""
+        self._changed_directories.add(directory)
+
+    def scan(self, root: Path, ignore: IgnoreContext | None = None) -> Generator[ScanItem, None, None]:
+        """
+        Walks the tree below root like scanner.scan_tree, but replays
+        unchanged directories from the index. Unchanged directories yield
+        IndexedEntry objects for their recorded deletable and display files
+        and a single UnlistedEntries marker for everything else. The index is
+        updated as directories are exited and saved when the walk ends.
+        Ignore files are honoured as by scan_tree, replayed directories
+        included.
+        """
+        try:
+            mtime_ns = self._metadata.stat_path(root).st_mtime_ns
+        except OSError as e:
+            yield ScanError(path=root, error=e)
+            return
+
+        try:
+            yield from self._walk(root, mtime_ns, ignore)
+        finally:
+            self._flush()
+
+    def _walk(self, directory: Path, mtime_ns: int, ignore: IgnoreContext | None) -> Generator[ScanItem, None, None]:
+        # Subdirectories found by listing are stat'ed through their DirEntry,
+        # which costs nothing extra on Windows.
+        subdirectory_entries: dict[str, os.DirEntry] = {}
+        # An ignore file edited in place leaves the mtime alone, so it is read even if replayed.
+        context = ignore.child(directory) if ignore is not None else None
+        record = self._load(directory)
+        replayed = record is not None and record.mtime_ns == mtime_ns
+        if replayed:
+            self.directories_replayed += 1
+            yield from self._replay(directory, record, context)
+        else:
+            self.directories_listed += 1
+            record = yield from self._list(directory, mtime_ns, subdirectory_entries, context)
+            if record is None:
+                return
+
+        for name in record.subdirectories:
+            subdirectory = directory / name
+            if context is not None and context.is_ignored(str(subdirectory), is_dir=True):
+                yield UnlistedEntries(path=directory, count=1)
+                continue
+            try:
+                if name in subdirectory_entries:
+                    subdirectory_mtime_ns = self._metadata.lstat(subdirectory_entries.pop(name)).st_mtime_ns
+                else:
+                    subdirectory_mtime_ns = self._metadata.stat_path(subdirectory, follow_symlinks=False).st_mtime_ns
+            except OSError as e:
+                yield ScanError(path=subdirectory, error=e)
+                continue
+            yield from self._walk(subdirectory, subdirectory_mtime_ns, context)
+
+        yield DirectoryExited(path=directory)
+
+        # The consumer has now dealt with the directory. A replayed record
+        # that still holds is already stored.
+        if directory in self._changed_directories:
+            self._changed_directories.discard(directory)
+            self._forget(directory)
+        elif not replayed:
+            self._save(directory, record)
+
+    def _replay(
+        self,
+        directory: Path,
+        record: _DirectoryRecord,
+        context: IgnoreContext | None,
+    ) -> Generator[ScanItem, None, None]:
+        yield DirectoryEntered(path=directory)
+        unlisted_count = record.other_count
+        for name in record.matching_files + record.display_files:
+            entry = IndexedEntry(directory, name)
+            if context is not None and context.is_ignored(entry.path, is_dir=False):
+                unlisted_count += 1
+            else:
+                yield entry
+        if unlisted_count:
+            yield UnlistedEntries(path=directory, count=unlisted_count)
+
+    def _list(
+        self,
+        directory: Path,
+        mtime_ns: int,
+        subdirectory_entries: dict[str, os.DirEntry],
+        context: IgnoreContext | None,
+    ) -> Generator[ScanItem, None, _DirectoryRecord | None]:
+        """
+        Lists a directory, yielding its files. Subdirectories are descended
+        into afterwards; their entries are collected in subdirectory_entries.
+        Files excluded by an ignore file are recorded, but not yielded.
+        """
+        try:
+            iterator = os.scandir(directory)
+        except OSError as e:
+            yield ScanError(path=directory, error=e)
+            return None
+
+        record = _DirectoryRecord(mtime_ns=mtime_ns)
+        yield DirectoryEntered(path=directory)
+        with iterator:
+            try:
+                for entry in iterator:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name == QUARANTINE_DIRECTORY_NAME:
+                            # Never looked into, like in scanner.scan_tree.
+                            record.other_count += 1
+                            yield UnlistedEntries(path=directory, count=1)
+                            continue
+                        record.subdirectories.append(entry.name)
+                        subdirectory_entries[entry.name] = entry
+                        continue
+
+                    is_file = self._metadata.is_file(entry)
+                    if is_file and self.rules.matches_name(entry.name):
+                        record.matching_files.append(entry.name)
+                    elif is_file and matches_extensions(entry.name, DISPLAY_FILE_EXTENSIONS):
+                        record.display_files.append(entry.name)
+                    else:
+                        record.other_count += 1
+                    if context is not None and context.is_ignored(entry.path, is_dir=False):
+                        yield UnlistedEntries(path=directory, count=1)
+                    else:
+                        yield entry
+            except OSError as e:
+                # Incomplete listing: still descend into what was seen, but
+                # make sure it is not recorded as unchanged.
+                record.mtime_ns = -1
+                yield ScanError(path=directory, error=e)
+
+        return record
+
+    # --- Storage ---
+
+    def _load(self, directory: Path) -> _DirectoryRecord | None:
+        row = self._connection.execute(
+            "SELECT mtime_ns, subdirectories, matching_files, display_files, other_count "
+            "FROM directories WHERE path = ?",
+            (str(directory),)
+        ).fetchone()
+        if row is None:
+            return None
+        mtime_ns, subdirectories, matching_files, display_files, other_count = row
+        return _DirectoryRecord(
+            mtime_ns=mtime_ns,
+            subdirectories=_split_names(subdirectories),
+            matching_files=_split_names(matching_files),
+            display_files=_split_names(display_files),
+            other_count=other_count
+        )
+
+    def _save(self, directory: Path, record: _DirectoryRecord):
+        if record.mtime_ns < 0:
+            self._forget(directory)
+            return
+        self._pending_writes.append((
+            str(directory),
+            record.mtime_ns,
+            _NAME_SEPARATOR.join(record.subdirectories),
+            _NAME_SEPARATOR.join(record.matching_files),
+            _NAME_SEPARATOR.join(record.display_files),
+            record.other_count
+        ))
+        if len(self._pending_writes) >= _WRITE_BATCH_SIZE:
+            self._flush()
+
+    def _forget(self, directory: Path):
+        self._pending_deletes.append((str(directory),))
+        if len(self._pending_deletes) >= _WRITE_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        with self._connection:
+            self._connection.executemany("DELETE FROM directories WHERE path = ?", self._pending_deletes)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO directories "
+                "(path, mtime_ns, subdirectories, matching_files, display_files, other_count) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending_writes
+            )
+        self._pending_deletes.clear()
+        self._pending_writes.clear()
+
+# --- Counting ---
+
+def count_indexed_entries(db_path: Path, root: Path) -> tuple[int, list[Path]] | None:
+    """
+    The number of entries the index records below root, as a scan of the
+    tree would count them (the root itself not included), and the recorded
+    subdirectories it holds no record of, such as those changed by the last
+    run, whose contents are not included. None if the index does not record
+    root at all. The index is only read, and may be stale.
+    """
+    directory = str(root)
+    prefix = os.path.join(directory, '')
+    # Every path below root sorts between the prefix and the prefix with its
+    # final separator raised by one.
+    end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    try:
+        connection = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True)
+        try:
+            rows = connection.execute(
+                "SELECT path, subdirectories, matching_files, display_files, other_count FROM directories "
+                "WHERE path = ? OR (path >= ? AND path < ?)",
+                (directory, prefix, end)
+            ).fetchall()
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return None
+
+    recorded = {row[0] for row in rows}
+    if directory not in recorded:
+        return None
+    count = 0
+    unrecorded: list[Path] = []
+    for path, subdirectories, matching_files, display_files, other_count in rows:
+        subdirectory_names = _split_names(subdirectories)
+        count += len(subdirectory_names) + len(_split_names(matching_files)) + len(_split_names(display_files)) + other_count
+        unrecorded.extend(
+            Path(path, name) for name in subdirectory_names if os.path.join(path, name) not in recorded
+        )
+    return count, unrecorded
+
+def _split_names(joined: str) -> list[str]:
+    return joined.split(_NAME_SEPARATOR) if joined else []
\ No newline at end of file
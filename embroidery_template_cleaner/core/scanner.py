@@ -0,0 +1,447 @@
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Generator
+
+from .configuration import Configuration, QUARANTINE_DIRECTORY_NAME
+from .rules import IGNORE_FILE_NAME, IgnoreContext
+
+# Entries the parallel scanner's workers may have listed ahead of the
+# consumer. Once this many are waiting, the workers pause, so a slow
+# deletion stage does not let the listings of a whole library pile up.
+SCAN_QUEUE_ENTRIES = 10000
+
+# --- Scan Items ---
+
+@dataclass
+class DirectoryEntered:
+    """Yielded before any of a directory's entries."""
+    path: Path
+
+@dataclass
+class DirectoryExited:
+    """Yielded after every entry below a directory has been yielded (post-order)."""
+    path: Path
+
+@dataclass
+class UnlistedEntries:
+    """
+    Stands in for entries of a directory that were not listed again because a
+    scan index vouches that they are neither deletable nor display files, or
+    that are never looked into, such as the quarantine and entries an ignore
+    file excludes.
+    """
+    path: Path
+    count: int
+
+@dataclass
+class ScanError:
+    """
+    Yielded by the scanner when a directory cannot be listed. A directory that
+    fails to open is reported without being entered; a listing that breaks off
+    part way is reported before the directory is exited.
+    """
+    path: Path
+    error: OSError
+
+type ScanItem = os.DirEntry | DirectoryEntered | DirectoryExited | UnlistedEntries | ScanError
+
+# --- Streaming Tree Walk ---
+
+def scan_tree(root: Path, ignore: IgnoreContext | None = None) -> Generator[ScanItem, None, None]:
+    """
+    Lazily walks the tree below root depth-first and yields an os.DirEntry for
+    every entry that is not a directory, bracketed by DirectoryEntered and
+    DirectoryExited markers for root and every subdirectory. Subdirectories
+    are descended into as soon as they are found instead of being collected
+    up front, so only one open scandir iterator per level is held at any time
+    and peak memory is bounded by the depth of the tree rather than its size.
+
+    The yielded entries carry the file type reported by the directory listing,
+    so callers can usually classify them without another stat call.
+    Symlinked directories are not followed.
+
+    A directory is only exited once its scandir iterator has been closed, so
+    consumers may remove it when they see the DirectoryExited marker.
+    Quarantine folders are not descended into.
+
+    If given the ignore context in force above root, every directory's
+    ignore file is read as it is entered, and the entries they exclude are
+    reported as UnlistedEntries; excluded directories are not descended into.
+    """
+    try:
+        stack = [(root, os.scandir(root), ignore.child(root) if ignore is not None else None)]
+    except OSError as e:
+        yield ScanError(path=root, error=e)
+        return
+
+    yield DirectoryEntered(path=root)
+    try:
+        while stack:
+            directory, iterator, context = stack[-1]
+            try:
+                entry = next(iterator)
+            except StopIteration:
+                stack.pop()
+                iterator.close()
+                yield DirectoryExited(path=directory)
+                continue
+            except OSError as e:
+                # The listing broke off part way through; keep what was seen.
+                stack.pop()
+                iterator.close()
+                yield ScanError(path=directory, error=e)
+                yield DirectoryExited(path=directory)
+                continue
+
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if context is not None and context.is_ignored(entry.path, is_dir):
+                yield UnlistedEntries(path=directory, count=1)
+            elif is_dir:
+                if entry.name == QUARANTINE_DIRECTORY_NAME:
+                    yield UnlistedEntries(path=directory, count=1)
+                    continue
+                subdirectory = Path(entry.path)
+                try:
+                    stack.append((subdirectory, os.scandir(subdirectory), context.child(subdirectory) if context is not None else None))
+                except OSError as e:
+                    yield ScanError(path=subdirectory, error=e)
+                    continue
+                yield DirectoryEntered(path=subdirectory)
+            else:
+                yield entry
+    finally:
+        for _, iterator, _ in stack:
+            iterator.close()
+
+# --- Parallel Tree Walk ---
+
+@dataclass
+class _DirectoryListing:
+    """One directory, listed in full into memory."""
+    path: Path
+    files: list[os.DirEntry] = field(default_factory=list)
+    subdirectories: list[Path] = field(default_factory=list)
+    # The quarantine and the entries an ignore file excludes.
+    unlisted_count: int = 0
+    # The ignore context in force in the directory, if ignore files are read.
+    context: IgnoreContext | None = None
+    # Set if the directory could not be opened...
+    open_error: OSError | None = None
+    # ...or if its listing broke off part way.
+    error: OSError | None = None
+
+    @property
+    def entry_count(self) -> int:
+        return len(self.files) + len(self.subdirectories)
+
+def _list_directory(directory: Path, ordered: bool, ignore: IgnoreContext | None) -> _DirectoryListing:
+    listing = _DirectoryListing(path=directory)
+    try:
+        iterator = os.scandir(directory)
+    except OSError as e:
+        listing.open_error = e
+        return listing
+    entries = []
+    with iterator:
+        try:
+            for entry in iterator:
+                entries.append(entry)
+        except OSError as e:
+            listing.error = e
+
+    # The whole listing is at hand, so the ignore file is only read if it is there.
+    if ignore is not None:
+        listing.context = ignore.child(directory, has_ignore_file=any(entry.name == IGNORE_FILE_NAME for entry in entries))
+    for entry in entries:
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if (is_dir and entry.name == QUARANTINE_DIRECTORY_NAME) or (
+            listing.context is not None and listing.context.is_ignored(entry.path, is_dir)
+        ):
+            listing.unlisted_count += 1
+        elif is_dir:
+            listing.subdirectories.append(Path(entry.path))
+        else:
+            listing.files.append(entry)
+    if ordered:
+        listing.files.sort(key=lambda entry: entry.name)
+        listing.subdirectories.sort()
+    return listing
+
+class _ParallelListings:
+    """
+    Lists directories on worker threads, ahead of the consumer that walks
+    the tree. Every worker keeps its own deque of directories to list: it
+    pushes the subdirectories it finds onto the deque's tail and pops its
+    next directory from there, so it works its way down the tree much like
+    the consumer does, and when its deque runs dry it steals from the head
+    of another worker's, where the largest subtrees wait. One condition
+    guards everything; listing a directory is done outside it.
+
+    A directory is listed once: by whichever worker claims it first, or by
+    the consumer itself when it needs a directory that nobody has claimed.
+    Listings wait until the consumer takes them, and at most
+    max_queued_entries entries may be waiting before the workers pause.
+    """
+
+    def __init__(self, max_workers: int, ordered: bool, max_queued_entries: int):
+        self.ordered = ordered
+        self.max_queued_entries = max_queued_entries
+        self._condition = threading.Condition()
+        # Each directory waits with the ignore context of its parent.
+        self._deques: list[deque[tuple[Path, IgnoreContext | None]]] = [deque() for _ in range(max_workers)]
+        # The directories being listed by a worker, and those the consumer
+        # listed that still wait in a deque. Every directory is pushed onto
+        # a deque once, so it is forgotten once that entry is popped (or
+        # once its worker is done listing it), which keeps this as small as
+        # the deques.
+        self._claimed: set[Path] = set()
+        # Listings not yet taken by the consumer, and the same paths by
+        # parent, in the order they were listed.
+        self._listings: dict[Path, _DirectoryListing] = {}
+        self._ready: dict[Path, dict[Path, None]] = {}
+        self._queued_entries = 0
+        self._stopped = False
+        for index in range(max_workers):
+            threading.Thread(target=self._work, args=(index,), name=f"scan-{index}", daemon=True).start()
+
+    def stop(self):
+        """Stops the workers once they finish the directories they are listing."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    # --- Workers ---
+
+    def _claim_work(self, own: deque[tuple[Path, IgnoreContext | None]]) -> tuple[Path, IgnoreContext | None] | None:
+        while own:
+            work = own.pop()
+            if work[0] not in self._claimed:
+                return work
+            self._claimed.discard(work[0])
+        for other in sorted(self._deques, key=len, reverse=True):
+            while other:
+                work = other.popleft()
+                if work[0] not in self._claimed:
+                    return work
+                self._claimed.discard(work[0])
+        return None
+
+    def _push(self, deque_: deque[tuple[Path, IgnoreContext | None]], listing: _DirectoryListing):
+        # Reversed, so the first subdirectory is the next one popped.
+        deque_.extend((subdirectory, listing.context) for subdirectory in reversed(listing.subdirectories))
+
+    def _work(self, index: int):
+        own = self._deques[index]
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopped:
+                        return
+                    if self._queued_entries < self.max_queued_entries:
+                        work = self._claim_work(own)
+                        if work is not None:
+                            break
+                    self._condition.wait()
+                path, ignore = work
+                self._claimed.add(path)
+
+            listing = _list_directory(path, self.ordered, ignore)
+            with self._condition:
+                self._claimed.discard(path)
+                self._listings[path] = listing
+                self._ready.setdefault(path.parent, {})[path] = None
+                self._queued_entries += listing.entry_count
+                self._push(own, listing)
+                self._condition.notify_all()
+
+    # --- Consumer ---
+
+    def take(self, parent: Path, pending: dict[Path, IgnoreContext | None]) -> _DirectoryListing:
+        """
+        Removes one of parent's pending subdirectories (each with the ignore
+        context of parent) and returns its listing: the first of them if
+        ordered, and otherwise whichever was listed first. A subdirectory
+        that nobody has claimed is listed right here rather than waited for.
+        """
+        with self._condition:
+            while True:
+                ready = self._ready.get(parent)
+                if self.ordered:
+                    path = next(iter(pending))
+                    is_ready = path in self._listings
+                else:
+                    path = next(iter(ready)) if ready else None
+                    is_ready = path is not None
+                if is_ready:
+                    del pending[path]
+                    del ready[path]
+                    listing = self._listings.pop(path)
+                    self._queued_entries -= listing.entry_count
+                    self._condition.notify_all()
+                    return listing
+
+                # Only a worker listing it right now can hold a directory
+                # back, so few claimed ones are passed over here.
+                if self.ordered:
+                    path = path if path not in self._claimed else None
+                else:
+                    path = next((p for p in pending if p not in self._claimed), None)
+                if path is not None:
+                    ignore = pending.pop(path)
+                    self._claimed.add(path)
+                    break
+                self._condition.wait()
+
+        listing = _list_directory(path, self.ordered, ignore)
+        with self._condition:
+            self._push(min(self._deques, key=len), listing)
+            self._condition.notify_all()
+        return listing
+
+    def forget(self, parent: Path):
+        """Drops the bookkeeping for a directory whose subdirectories were all taken."""
+        with self._condition:
+            self._ready.pop(parent, None)
+
+def parallel_scan_tree(
+    root: Path,
+    max_workers: int,
+    ordered: bool = False,
+    max_queued_entries: int = SCAN_QUEUE_ENTRIES,
+    ignore: IgnoreContext | None = None,
+) -> Generator[ScanItem, None, None]:
+    """
+    Walks the tree below root like scan_tree and yields the same items, but
+    lists directories on max_workers threads, ahead of the caller, so a file
+    system where every listing waits on the network (a NAS) is read with as
+    many listings in flight as there are workers. The caller lists a
+    directory itself when no worker has got to it yet, rather than wait.
+    Listings are held in memory until they are yielded, at most
+    max_queued_entries entries of them.
+
+    Every directory is still yielded whole and depth-first, files first,
+    then its subtrees, so consumers see the same brackets as from scan_tree.
+    Unless ordered, the next subtree is whichever was listed first; if
+    ordered, entries and subtrees are yielded sorted by name, so every run
+    over the same tree yields the same items in the same order.
+
+    A directory is listed in full before it is entered, so its scandir
+    iterator is always closed by the time it is exited. Workers are stopped
+    when the generator is closed. Ignore files are honoured as by scan_tree,
+    but only read where the listing shows one.
+    """
+    listings = _ParallelListings(max_workers, ordered, max_queued_entries)
+    # The root is taken like a subdirectory of its parent, which has no other.
+    stack: list[tuple[Path, dict[Path, IgnoreContext | None], _DirectoryListing | None]] = [(root.parent, {root: ignore}, None)]
+    try:
+        while stack:
+            directory, pending, listing = stack[-1]
+            if not pending:
+                stack.pop()
+                listings.forget(directory)
+                if listing is not None:
+                    if listing.error is not None:
+                        yield ScanError(path=directory, error=listing.error)
+                    yield DirectoryExited(path=directory)
+                continue
+
+            subdirectory = listings.take(directory, pending)
+            if subdirectory.open_error is not None:
+                yield ScanError(path=subdirectory.path, error=subdirectory.open_error)
+                continue
+            yield DirectoryEntered(path=subdirectory.path)
+            yield from subdirectory.files
+            if subdirectory.unlisted_count:
+                yield UnlistedEntries(path=subdirectory.path, count=subdirectory.unlisted_count)
+            stack.append((subdirectory.path, dict.fromkeys(subdirectory.subdirectories, subdirectory.context), subdirectory))
+    finally:
+        listings.stop()
+
+def configured_scan_tree(
+    root: Path,
+    config: Configuration,
+    ignore: IgnoreContext | None = None,
+) -> Generator[ScanItem, None, None]:
+    """
+    Walks the tree below root with scan_tree, or with parallel_scan_tree
+    when config asks for more than one scan worker or for ordered output.
+    """
+    if config.scan_workers > 1 or config.ordered_scan:
+        return parallel_scan_tree(root, config.scan_workers, ordered=config.ordered_scan, ignore=ignore)
+    return scan_tree(root, ignore)
+
+# --- Partial Walks ---
+
+def scan_top_level(root: Path, ignore: IgnoreContext | None = None) -> Generator[ScanItem, None, None]:
+    """
+    Yields only the entries directly in root, bracketed by DirectoryEntered
+    and DirectoryExited for root. Subdirectories are not descended into (they
+    are left to someone else, such as another shard) and are reported in a
+    single UnlistedEntries marker, since they still occupy root, together
+    with any files root's ignore context excludes.
+    """
+    context = ignore.child(root) if ignore is not None else None
+    try:
+        iterator = os.scandir(root)
+    except OSError as e:
+        yield ScanError(path=root, error=e)
+        return
+
+    yield DirectoryEntered(path=root)
+    unlisted_count = 0
+    with iterator:
+        try:
+            for entry in iterator:
+                if entry.is_dir(follow_symlinks=False) or (
+                    context is not None and context.is_ignored(entry.path, is_dir=False)
+                ):
+                    unlisted_count += 1
+                else:
+                    yield entry
+        except OSError as e:
+            yield ScanError(path=root, error=e)
+    if unlisted_count:
+        yield UnlistedEntries(path=root, count=unlisted_count)
+    yield DirectoryExited(path=root)
+
+def scan_new_entries(
+    directory: Path,
+    names: set[str],
+    ignore: IgnoreContext | None = None,
+) -> Generator[ScanItem, None, None]:
+    """
+    Yields only the entries of directory with the given names (such as files
+    that just appeared in it), walking the trees below those that are
+    directories like scan_tree, all bracketed by DirectoryEntered and
+    DirectoryExited for directory. Names that no longer exist, or that the
+    ignore context in force above directory excludes, are left out.
+    The rest of the directory is not accounted for, so a consumer must not
+    judge directory itself empty.
+    """
+    context = ignore.child(directory) if ignore is not None else None
+    try:
+        iterator = os.scandir(directory)
+    except OSError as e:
+        yield ScanError(path=directory, error=e)
+        return
+
+    yield DirectoryEntered(path=directory)
+    with iterator:
+        try:
+            entries = [entry for entry in iterator if entry.name in names]
+        except OSError as e:
+            entries = []
+            yield ScanError(path=directory, error=e)
+    for entry in entries:
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if context is not None and context.is_ignored(entry.path, is_dir):
+            continue
+        if is_dir:
+            if entry.name != QUARANTINE_DIRECTORY_NAME:
+                yield from scan_tree(Path(entry.path), context)
+        else:
+            yield entry
+    yield DirectoryExited(path=directory)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from .configuration import Configuration, QUARANTINE_DIRECTORY_NAME
+from .rules import IgnoreContext
+
+# --- Shards ---
+
+@dataclass
+class Shard:
+    """
+    A part of a cleaning run that one process cleans on its own.
+
+    A shard is either a whole target directory, or one piece of a target
+    directory that was split up: the files directly in it (top_level_only),
+    or one of its top-level subtrees. A subtree's root is an ordinary folder
+    of the library, so unlike a target directory it is removed if the run
+    empties it (remove_empty_root).
+    """
+    root: Path
+    top_level_only: bool = False
+    remove_empty_root: bool = False
+
+    @property
+    def target_directory(self) -> Path:
+        """The target directory this shard is part of."""
+        return self.root.parent if self.remove_empty_root else self.root
+
+def plan_shards(config: Configuration) -> list[Shard]:
+    """
+    Splits a run into shards. Each target directory is one shard if there
+    are at least as many of them as processes; otherwise every target
+    directory is split into its top-level subtrees, so the processes have
+    enough work to share. Journaled runs are never split, since a journal
+    records a whole target directory, and neither are runs that remove
+    duplicates, which are found across a whole target directory. Subtrees
+    the target directory's ignore file excludes get no shard.
+    """
+    roots = config.target_directories
+    if len(roots) >= config.shard_processes or config.use_journal or config.remove_duplicates:
+        return [Shard(root=root) for root in roots]
+
+    shards = []
+    for root in roots:
+        try:
+            context = IgnoreContext().child(root) if config.use_ignore_files else None
+            with os.scandir(root) as iterator:
+                subdirectories = sorted(
+                    entry.name for entry in iterator
+                    if entry.is_dir(follow_symlinks=False) and entry.name != QUARANTINE_DIRECTORY_NAME
+                    and not (context is not None and context.is_ignored(entry.path, is_dir=True))
+                )
+        except OSError:
+            # Let the shard report the error when it tries to list the root.
+            shards.append(Shard(root=root))
+            continue
+
+        shards.append(Shard(root=root, top_level_only=True))
+        shards.extend(Shard(root=root / name, remove_empty_root=True) for name in subdirectories)
+    return shards
\ No newline at end of file
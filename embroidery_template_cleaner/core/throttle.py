@@ -0,0 +1,185 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Generator, Iterator
+
+from .cancellation import CancellationToken
+from .configuration import Configuration
+from .scanner import ScanItem, DirectoryEntered
+
+# A token bucket holds up to this many seconds' worth of tokens, so a short
+# pause is made up for with a short burst, but never more.
+BURST_SECONDS = 1.0
+
+# Operation latencies are smoothed with this weight for the newest one.
+LATENCY_SMOOTHING = 0.2
+
+# The adaptive throttle halves its concurrency once the smoothed latency
+# rises above the lowest seen by this factor: the storage is queueing.
+LATENCY_RISE_FACTOR = 2.0
+
+# --- Token Bucket ---
+
+class TokenBucket:
+    """
+    Hands out rate tokens per second, up to BURST_SECONDS' worth at once.
+    A request larger than what is left is granted right away and paid back
+    by whoever asks next, so a single large file is never held back for
+    ever, and the long-run rate holds. Callers take their turn in the order
+    they ask, from any thread.
+    """
+
+    def __init__(self, rate: float, cancellation: CancellationToken | None = None):
+        self.rate = rate
+        self._capacity = max(rate * BURST_SECONDS, 1.0)
+        self._tokens = self._capacity
+        self._last_time = time.monotonic()
+        self._cancellation = cancellation or CancellationToken()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        """Takes amount tokens, sleeping until they are paid for (or the run is cancelled)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last_time) * self.rate)
+            self._last_time = now
+            # Reserved at once, so callers that come later wait behind this one.
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self._tokens -= amount
+        if wait > 0:
+            self._cancellation.wait(wait)
+
+# --- I/O Throttle ---
+
+class IoThrottle:
+    """
+    Paces the run's operations on the storage (listing a folder, looking up
+    the size of a file to delete, removing a file or folder) so it can go on
+    beside everyone else's work on a shared drive: at most
+    operations_per_second of them, and files of at most bytes_per_second,
+    each through a token bucket. The stats that check size and age
+    limits or follow symlinks are not paced.
+
+    If adaptive, operations also wait for one of concurrency slots, and the
+    slots follow the storage's latency (AIMD): every operation that comes
+    back about as fast as the fastest seen adds 1/concurrency, so one slot
+    per round, and once the smoothed latency rises above LATENCY_RISE_FACTOR
+    times that, the slots are halved, at most once a round. Slots start at,
+    and never exceed, max_concurrency (the deletion workers), so a run that
+    deletes serially has nothing to give back.
+
+    operations and bytes count what went through, for the progress rates.
+    Operations may run on any thread.
+    """
+
+    def __init__(
+        self,
+        operations_per_second: float | None = None,
+        bytes_per_second: int | None = None,
+        adaptive: bool = False,
+        max_concurrency: int = 1,
+        cancellation: CancellationToken | None = None,
+    ):
+        self._operation_bucket = TokenBucket(operations_per_second, cancellation) if operations_per_second else None
+        self._byte_bucket = TokenBucket(bytes_per_second, cancellation) if bytes_per_second else None
+        self.adaptive = adaptive
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.operations = 0
+        self.bytes = 0
+        self._active = 0
+        self._smoothed_latency: float | None = None
+        self._lowest_latency: float | None = None
+        self._completions_since_decrease = 0
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def from_configuration(config: Configuration, cancellation: CancellationToken | None = None) -> 'IoThrottle | None':
+        """The throttle config asks for, or None if the run goes at full speed."""
+        if config.max_operations_per_second is None and config.max_bytes_per_second is None and not config.adaptive_throttle:
+            return None
+        return IoThrottle(
+            config.max_operations_per_second,
+            config.max_bytes_per_second,
+            config.adaptive_throttle,
+            config.deletion_workers,
+            cancellation
+        )
+
+    def _take_turn(self, size: int):
+        if self._operation_bucket is not None:
+            self._operation_bucket.acquire()
+        if self._byte_bucket is not None and size:
+            self._byte_bucket.acquire(size)
+
+    def pace(self):
+        """Waits for the turn of an operation that is not timed, such as listing a folder."""
+        self._take_turn(0)
+        with self._condition:
+            self.operations += 1
+
+    @contextmanager
+    def operation(self, size: int = 0) -> Iterator[None]:
+        """Waits for the operation's turn (and, for a file, its size's), then times it."""
+        self._take_turn(size)
+        if self.adaptive:
+            with self._condition:
+                while self._active >= int(self.concurrency):
+                    self._condition.wait()
+                self._active += 1
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            latency = time.perf_counter() - start
+            with self._condition:
+                self.operations += 1
+                self.bytes += size
+                if self.adaptive:
+                    self._active -= 1
+                    self._adapt(latency)
+                    self._condition.notify_all()
+
+    def _adapt(self, latency: float):
+        if self._smoothed_latency is None:
+            self._smoothed_latency = latency
+        else:
+            self._smoothed_latency += LATENCY_SMOOTHING * (latency - self._smoothed_latency)
+        if self._lowest_latency is None or self._smoothed_latency < self._lowest_latency:
+            self._lowest_latency = self._smoothed_latency
+
+        self._completions_since_decrease += 1
+        if self._smoothed_latency > self._lowest_latency * LATENCY_RISE_FACTOR:
+            # The operations of the last round all saw the same queue; give back once.
+            if self._completions_since_decrease >= self.concurrency:
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self._completions_since_decrease = 0
+        else:
+            self.concurrency = min(float(self.max_concurrency), self.concurrency + 1 / self.concurrency)
+
+def throttled(operation: Callable[[], Any], throttle: IoThrottle | None, size: int = 0) -> Callable[[], Any]:
+    """operation, going through throttle if there is one. Keeps its name, which it is timed under."""
+    if throttle is None:
+        return operation
+
+    @wraps(operation)
+    def throttled_operation():
+        with throttle.operation(size):
+            return operation()
+    return throttled_operation
+
+def throttled_scan(scan_items: Iterator[ScanItem], throttle: IoThrottle) -> Generator[ScanItem, None, None]:
+    """
+    Passes scan_items through, pacing every directory listed as one
+    operation of throttle. Its latency is not seen here, so it takes no
+    part in adapting the concurrency.
+    """
+    try:
+        for item in scan_items:
+            if isinstance(item, DirectoryEntered):
+                throttle.pace()
+            yield item
+    finally:
+        scan_items.close()
\ No newline at end of file
@@ -0,0 +1,328 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Generator
+
+from .cancellation import CANCELLATION_POLL_SECONDS
+from .cleaner import clean_directory_generator, clean_new_entries_generator
+from .configuration import Configuration, QUARANTINE_DIRECTORY_NAME
+from .events import Event, Response, StatusUpdate, ProgressUpdate
+from .progress import CleaningProgress
+
+# A new entry is cleaned once nothing has appeared or been written in it (or
+# below it) for this long, so a vendor package that is still being copied in
+# is only cleaned once the copy is done, and then in one go.
+WATCH_DEBOUNCE_SECONDS = 2.0
+
+# How often the polling watcher looks for new entries.
+WATCH_POLL_SECONDS = 2.0
+
+def _is_watched_directory(entry: os.DirEntry) -> bool:
+    return entry.is_dir(follow_symlinks=False) and entry.name != QUARANTINE_DIRECTORY_NAME
+
+# --- inotify Watcher (Linux) ---
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+_IN_NONBLOCK = 0o4000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_CREATE | _IN_MOVED_TO | _IN_ONLYDIR
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_BUFFER_BYTES = 64 * 1024
+
+class InotifyWatcher:
+    """
+    Reports entries created in (or moved into) the watched trees, and files
+    closed after being written to, through Linux inotify. Every directory
+    needs a watch of its own; new directories are watched as soon as they
+    are reported. If the kernel's event queue
+    overflows, the roots themselves are reported, since anything may have
+    been missed. Quarantine folders are neither watched nor reported.
+    """
+    name = 'inotify'
+
+    def __init__(self, roots: list[Path]):
+        self.roots = roots
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._libc.inotify_init1.argtypes = [ctypes.c_int]
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._directories: dict[int, Path] = {}
+        try:
+            for root in roots:
+                self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, top: Path):
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            watch = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if watch < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "Too many folders to watch (see fs.inotify.max_user_watches)")
+                continue # Gone again, or not readable; nothing can appear in it.
+            # A directory that moved keeps its watch, which now maps to its new path.
+            self._directories[watch] = directory
+            try:
+                with os.scandir(directory) as iterator:
+                    stack.extend(Path(entry.path) for entry in iterator if _is_watched_directory(entry))
+            except OSError:
+                continue
+
+    def wait(self, timeout: float | None) -> tuple[list[Path], list[Path]]:
+        """
+        Waits up to timeout seconds (None: for ever) for changes and returns
+        the paths of the new entries and of the files written to.
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return [], []
+        try:
+            data = os.read(self._fd, _READ_BUFFER_BYTES)
+        except BlockingIOError:
+            return [], []
+
+        new_paths = []
+        written_paths = []
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_length].rstrip(b'\0')
+            offset += _EVENT_HEADER.size + name_length
+
+            if mask & _IN_Q_OVERFLOW:
+                new_paths.extend(self.roots)
+            elif mask & _IN_IGNORED:
+                self._directories.pop(watch, None)
+            elif watch in self._directories and name and os.fsdecode(name) != QUARANTINE_DIRECTORY_NAME:
+                path = self._directories[watch] / os.fsdecode(name)
+                if mask & _IN_CLOSE_WRITE:
+                    written_paths.append(path)
+                    continue
+                if mask & _IN_ISDIR:
+                    self._watch_tree(path)
+                new_paths.append(path)
+        return new_paths, written_paths
+
+    def close(self):
+        os.close(self._fd)
+
+# --- Polling Watcher ---
+
+class PollingWatcher:
+    """
+    Reports new entries by listing directories again every WATCH_POLL_SECONDS,
+    where inotify is not available. Only directories whose modification time
+    changed since the last poll are listed; the others only cost a stat.
+    Writes to files do not change their directory, so they are not
+    reported. Quarantine folders are neither watched nor reported.
+    """
+    name = 'polling'
+
+    def __init__(self, roots: list[Path], interval: float = WATCH_POLL_SECONDS):
+        self.roots = roots
+        self._interval = interval
+        self._next_poll_time = time.monotonic() + interval
+        # Each directory's modification time and entry names at the last poll.
+        self._snapshots: dict[Path, tuple[int, set[str]]] = {}
+        for root in roots:
+            self._snapshot_tree(root)
+
+    def _snapshot(self, directory: Path) -> list[Path]:
+        """Records the directory's listing and returns its subdirectories."""
+        try:
+            # Stat'ed before listing, so a change made while listing shows up at the next poll.
+            mtime_ns = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except OSError:
+            self._snapshots.pop(directory, None)
+            return []
+        self._snapshots[directory] = (mtime_ns, {entry.name for entry in entries if entry.name != QUARANTINE_DIRECTORY_NAME})
+        return [Path(entry.path) for entry in entries if _is_watched_directory(entry)]
+
+    def _snapshot_tree(self, top: Path):
+        stack = [top]
+        while stack:
+            stack.extend(self._snapshot(stack.pop()))
+
+    def wait(self, timeout: float | None) -> tuple[list[Path], list[Path]]:
+        """
+        Waits up to timeout seconds (None: until the next poll) for new
+        entries and returns their paths, and no written files.
+        """
+        delay = self._next_poll_time - time.monotonic()
+        if timeout is not None and timeout < delay:
+            time.sleep(max(timeout, 0.0))
+            return [], []
+        time.sleep(max(delay, 0.0))
+        self._next_poll_time = time.monotonic() + self._interval
+
+        new_paths = []
+        for directory, (mtime_ns, old_names) in list(self._snapshots.items()):
+            try:
+                if os.stat(directory).st_mtime_ns == mtime_ns:
+                    continue
+            except OSError:
+                del self._snapshots[directory]
+                continue
+            subdirectories = self._snapshot(directory)
+            names = self._snapshots[directory][1] if directory in self._snapshots else set()
+            for name in sorted(names - old_names):
+                path = directory / name
+                if path in subdirectories:
+                    self._snapshot_tree(path)
+                new_paths.append(path)
+        return new_paths, []
+
+    def close(self):
+        self._snapshots.clear()
+
+def create_watcher(roots: list[Path]) -> InotifyWatcher | PollingWatcher:
+    """Watches roots with inotify where it is available, and by polling otherwise."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(roots)
+
+# --- Watch Mode Generator ---
+
+def _topmost(paths: set[Path]) -> list[Path]:
+    """The paths that are not below another one of them; the others are cleaned with those."""
+    selected: set[Path] = set()
+    for path in sorted(paths, key=lambda p: len(p.parts)):
+        if not any(parent in selected for parent in path.parents):
+            selected.add(path)
+    return sorted(selected)
+
+def _record_activity(pending: dict[Path, float], new_paths: list[Path], written_paths: list[Path], now: float):
+    """
+    Marks the pending entries that are one of the paths, or that one of them
+    is below, as changed at now. New paths that are not below a pending
+    entry become pending themselves.
+    """
+    for paths, is_new in ((new_paths, True), (written_paths, False)):
+        for path in paths:
+            below_pending = False
+            for touched in (path, *path.parents):
+                if touched in pending:
+                    pending[touched] = now
+                    below_pending = True
+            if is_new and not below_pending:
+                pending[path] = now
+
+def _quiet_entries(pending: dict[Path, float], now: float) -> set[Path]:
+    """
+    The pending entries that have been quiet for WATCH_DEBOUNCE_SECONDS and
+    are not below another pending entry, along with the ones below them.
+    """
+    quiet = {
+        path for path in _topmost(set(pending))
+        if now >= pending[path] + WATCH_DEBOUNCE_SECONDS
+    }
+    return {path for path in pending if path in quiet or any(parent in quiet for parent in path.parents)}
+
+def _clean_new_paths_generator(
+    new_paths: set[Path],
+    config: Configuration,
+    progress: CleaningProgress,
+) -> Generator[Event, Response, None]:
+    """
+    Cleans just the new entries, grouped by the directory they appeared in. A
+    reported root (after the watcher lost track) is cleaned in full.
+    """
+    new_entries: dict[Path, set[str]] = {}
+    for path in _topmost(new_paths):
+        if path in config.target_directories:
+            yield from clean_directory_generator(config.for_root(path), progress)
+        else:
+            new_entries.setdefault(path.parent, set()).add(path.name)
+
+    for directory, names in sorted(new_entries.items()):
+        root = next(root for root in config.target_directories if root == directory or root in directory.parents)
+        yield from clean_new_entries_generator(config.for_root(root), progress, directory, names)
+
+def watch_generator(config: Configuration, progress: CleaningProgress) -> Generator[Event, Response, int]:
+    """
+    Cleans the target directories, then keeps watching them and cleans every
+    entry that appears in them, and only those. A new entry is cleaned once
+    nothing has appeared or been written in it, or below it, for
+    WATCH_DEBOUNCE_SECONDS; a folder that is still being copied in is left
+    alone until then, however long that takes. Entries that settle at the
+    same time are cleaned together, so the work done is proportional to
+    what arrived. Runs until progress.cancellation is
+    cancelled, which is checked at least every CANCELLATION_POLL_SECONDS
+    while waiting, and then raises OperationCancelledError.
+    """
+    roots = config.target_directories
+    # Watching starts first, so nothing that arrives during the full clean is missed.
+    watcher = create_watcher(roots)
+    try:
+        yield StatusUpdate(message=f"Watching {', '.join(str(root) for root in roots)} for new files ({watcher.name}).")
+        for root in roots:
+            yield from clean_directory_generator(config.for_root(root), progress)
+
+        # Each new entry not cleaned yet, and when it (or anything below it) last changed.
+        pending: dict[Path, float] = {}
+        idle = False
+        while True:
+            progress.cancellation.raise_if_cancelled()
+            if not pending and not idle:
+                # Sent straight to the GUI rather than as a StatusUpdate,
+                # which could sit in the progress channel while we wait.
+                yield ProgressUpdate(
+                    message="Waiting for new files...",
+                    items_scanned=progress.items_scanned,
+                    files_deleted=progress.files_deleted,
+                    directories_removed=progress.directories_removed,
+                    bytes_freed=progress.bytes_freed
+                )
+                idle = True
+
+            # Waits in short slices, so cancellation is noticed.
+            timeout = CANCELLATION_POLL_SECONDS
+            if pending:
+                due_time = min(pending.values()) + WATCH_DEBOUNCE_SECONDS
+                timeout = max(0.0, min(timeout, due_time - time.monotonic()))
+            try:
+                new_paths, written_paths = watcher.wait(timeout)
+            except OSError as e:
+                # Typically out of inotify watches; start over by polling.
+                yield StatusUpdate(message=f"Cannot keep watching with {watcher.name} ({e}); polling instead.")
+                watcher.close()
+                watcher = PollingWatcher(roots)
+                new_paths, written_paths = list(roots), []
+
+            now = time.monotonic()
+            _record_activity(pending, new_paths, written_paths, now)
+            quiet = _quiet_entries(pending, now)
+            if not quiet:
+                continue
+
+            yield StatusUpdate(message=f"Cleaning {len(quiet)} new entries...")
+            for path in quiet:
+                del pending[path]
+            yield from _clean_new_paths_generator(quiet, config, progress)
+            idle = False
+    finally:
+        watcher.close()
\ No newline at end of file
@@ -1,22 +1,76 @@
+import logging
+import logging.handlers
+import multiprocessing
 import queue
 import traceback
+from concurrent.futures import ProcessPoolExecutor
 from typing import Generator
 
-from .configuration import Configuration
+from .cancellation import CancellationToken, OperationCancelledError
+from .configuration import Configuration, PROFILE_FILE_LOCATION
 from .cleaner import clean_directory_generator, OperationAbortedError
+from .journal import RunJournal, journaled_clean_generator, resume_journal_generator
+from .planner import DeletionPlan, apply_plan_generator
+from .estimate import TotalEstimate
+from .instrumentation import format_run_statistics
+from .progress import CleaningProgress, ProgressChannel
+from .sharding import Shard, plan_shards
+from .watcher import watch_generator
 from .events import (
     Event,
     Response,
+    StatusUpdate,
+    ProgressUpdate,
     RequestConfirmation,
+    RequestBatchConfirmation,
     RequestRetrySkipAbort,
+    RunStatistics,
     CleaningResult,
     ErrorOccurred,
+    UserConfirmationResponse,
+    BatchConfirmationResponse,
+    RetrySkipAbortResponse,
+    RetrySkipAbortChoice,
 )
 
+# How often the coordinator of a sharded run checks for crashed shard
+# processes, and for cancellation, while no events arrive.
+SHARD_POLL_SECONDS = 0.1
+
+def _report_run_statistics(progress: CleaningProgress, update_queue: queue.Queue):
+    """Stops any profiling, then logs the run's statistics and sends them ahead of the final event."""
+    profile = progress.metrics.stop_profiling()
+    if profile is not None:
+        profile.dump_stats(PROFILE_FILE_LOCATION)
+        logging.info(f"Saved profile of the run to {PROFILE_FILE_LOCATION}")
+    statistics = progress.metrics.to_event(profile)
+    logging.info(format_run_statistics(statistics))
+    update_queue.put(statistics)
+
+def _describe_targets(config: Configuration) -> str:
+    return ', '.join(str(d) for d in config.target_directories) or str(config.target_directory)
+
+def _clean_each_root_generator(config: Configuration, progress: CleaningProgress) -> Generator[Event, Response, int]:
+    """Cleans the target directories one after another, adding up their counts in progress."""
+    for root in config.target_directories:
+        root_config = config.for_root(root)
+        if config.use_journal:
+            yield from journaled_clean_generator(root_config, progress)
+        else:
+            yield from clean_directory_generator(root_config, progress)
+    return progress.files_deleted
+
 def run_cleaning_task(
     config: Configuration,
     update_queue: queue.Queue,
-    response_queue: queue.Queue
+    response_queue: queue.Queue,
+    plan: DeletionPlan | None = None,
+    journal: RunJournal | None = None,
+    shard: Shard | None = None,
+    stop_event=None,
+    watch: bool = False,
+    estimate_total: bool = True,
+    cancellation: CancellationToken | None = None,
 ):
     """
     This function is executed in a background thread. It runs the core
@@ -24,52 +78,126 @@ def run_cleaning_task(
 
     Args:
         config: The application configuration.
-        update_queue: A queue to send events (e.g., StatusUpdate) to the GUI.
+        update_queue: A queue to send events (e.g., ProgressUpdate) to the GUI.
+                      Status messages are coalesced into rate-limited
+                      ProgressUpdates rather than forwarded one by one.
         response_queue: A queue to receive responses (e.g., UserConfirmationResponse)
                         from the GUI.
+        plan: If given, this previously computed plan is applied instead of
+              scanning the target directory.
+        journal: If given, this interrupted run is resumed instead of
+                 scanning the target directory.
+        shard: If given, only this shard of the target directory is cleaned.
+        stop_event: If given (a threading or multiprocessing Event), the run
+                    is aborted at its next event once it is set.
+        watch: If set, the target directories are cleaned and then watched,
+               and new files are cleaned as they arrive, until the worker is
+               stopped.
+        estimate_total: If set, a full scan of the target directories first
+                        estimates how many items it will scan (see
+                        TotalEstimate), and the ProgressUpdates carry it.
+                        Plans, journals, shards and watches are not
+                        estimated.
+        cancellation: If given, cancelling it stops the run within a fraction
+                      of a second: the work in flight is settled and a
+                      CleaningResult with cancelled set reports what was
+                      done. A watch only ends this way.
+
+    Multiple target directories are cleaned one after another, or, with
+    config.shard_processes above 1, in shards on a process pool. Runs that
+    use the scan index always run in this process, since the index is a
+    single file that one process writes at a time.
+
+    Just before the CleaningResult (or ErrorOccurred), a RunStatistics event
+    reports where the run spent its time.
     """
+    if (plan is None and journal is None and shard is None and not watch
+            and config.shard_processes > 1 and not config.use_scan_index and config.target_directories):
+        _run_sharded_cleaning_task(config, update_queue, response_queue, estimate_total, cancellation)
+        return
+
     generator: Generator[Event, Response, int] | None = None
+    progress = CleaningProgress(cancellation=cancellation or CancellationToken())
+    estimate = None
+    if (estimate_total and plan is None and journal is None and shard is None and not watch
+            and not config.use_journal and config.target_directories):
+        estimate = TotalEstimate.start(config)
+    progress_channel = ProgressChannel(update_queue, progress, estimate=estimate)
+    if config.profile_run:
+        progress.metrics.start_profiling()
     try:
         # Create an instance of our main generator
-        generator = clean_directory_generator(config)
+        if journal is not None:
+            generator = resume_journal_generator(journal, config, progress)
+        elif plan is not None:
+            generator = apply_plan_generator(plan, config, progress)
+        elif watch:
+            generator = watch_generator(config, progress)
+        elif shard is not None and config.use_journal:
+            generator = journaled_clean_generator(config, progress)
+        elif shard is not None:
+            generator = clean_directory_generator(config, progress, shard)
+        else:
+            generator = _clean_each_root_generator(config, progress)
         
         # Start iterating through the generator's events
         event = next(generator)
 
         while True:
-            if isinstance(event, (RequestConfirmation, RequestRetrySkipAbort)):
+            if stop_event is not None and stop_event.is_set():
+                raise OperationAbortedError("Stopped because another part of the run failed or was aborted.")
+
+            if isinstance(event, (RequestConfirmation, RequestBatchConfirmation, RequestRetrySkipAbort)):
                 # The generator needs user input.
-                # 1. Send the request to the GUI.
+                # 1. Send the request to the GUI, after any pending progress.
+                progress_channel.flush()
                 update_queue.put(event)
                 
                 # 2. Wait for the GUI's response. This blocks the worker thread.
-                response = response_queue.get()
+                response = progress.metrics.timed('user response wait', response_queue.get)
                 
                 # 3. Send the GUI's response back into the generator to resume it.
                 event = generator.send(response)
+            elif isinstance(event, StatusUpdate):
+                # Status updates are logged individually but coalesced on
+                # their way to the GUI.
+                logging.info(event.message)
+                progress_channel.publish(event.message)
+                event = next(generator)
             else:
-                # For simple status updates, just pass them to the GUI.
+                # Pass anything else straight to the GUI.
                 update_queue.put(event)
                 # Get the next event from the generator.
                 event = next(generator)
     
     except OperationAbortedError as e:
         # The user selected "Abort" from a RetrySkipAbort dialog
+        progress_channel.flush()
+        _report_run_statistics(progress, update_queue)
         error_event = ErrorOccurred(message=str(e))
         update_queue.put(error_event)
 
-    except StopIteration as e:
-        # The generator has finished successfully.
-        deleted_files_count = e.value
+    except (StopIteration, OperationCancelledError) as e:
+        # The generator has finished successfully, or stopped early because it was cancelled.
+        cancelled = isinstance(e, OperationCancelledError)
+        if cancelled:
+            logging.info(f"Cancelled cleaning {_describe_targets(config)}.")
+        progress_channel.flush()
+        _report_run_statistics(progress, update_queue)
         result = CleaningResult(
-            deleted_files_count=deleted_files_count,
-            target_dir=str(config.target_directory)
+            deleted_files_count=progress.files_deleted if cancelled else e.value,
+            target_dir=_describe_targets(config),
+            directories_removed=progress.directories_removed,
+            items_scanned=progress.items_scanned,
+            bytes_freed=progress.bytes_freed,
+            cancelled=cancelled
         )
         update_queue.put(result)
 
     except Exception as e:
         # An unhandled exception occurred within the generator.
         tb_str = traceback.format_exc()
+        _report_run_statistics(progress, update_queue)
         error_event = ErrorOccurred(
             message=f"A critical error occurred: {e}",
             traceback=tb_str
@@ -79,4 +207,305 @@ def run_cleaning_task(
     finally:
         # Ensure the generator is closed properly
         if generator:
-            generator.close()
\ No newline at end of file
+            generator.close()
+        if estimate is not None:
+            estimate.stop()
+
+# --- Sharded Runs ---
+
+# Set in every shard process by _initialize_shard_process.
+_shard_event_queue = None
+_shard_stop_event = None
+_shard_cancellation: CancellationToken | None = None
+
+class _ShardUpdateQueue:
+    """Stands in for the update queue in a shard process, tagging each event with its shard."""
+
+    def __init__(self, event_queue, shard_id: int):
+        self._event_queue = event_queue
+        self._shard_id = shard_id
+
+    def put(self, event: Event):
+        self._event_queue.put((self._shard_id, event))
+
+class _ShardLogHandler(logging.handlers.QueueHandler):
+    """Sends a shard process's log records to the coordinator, which writes them to the log file."""
+
+    def enqueue(self, record: logging.LogRecord):
+        self.queue.put((None, record))
+
+def _initialize_shard_process(event_queue, stop_event, cancel_event):
+    global _shard_event_queue, _shard_stop_event, _shard_cancellation
+    _shard_event_queue = event_queue
+    _shard_stop_event = stop_event
+    _shard_cancellation = CancellationToken()
+    _shard_cancellation.follow(cancel_event)
+    root_logger = logging.getLogger()
+    root_logger.handlers = [_ShardLogHandler(event_queue)]
+    root_logger.setLevel(logging.INFO)
+
+def _run_shard(config: Configuration, shard: Shard, shard_id: int, response_queue):
+    """Runs in a shard process: cleans one shard, reporting to the coordinator."""
+    shard_config = config.for_root(shard.root)
+    # Every shard would overwrite the same profile; only the coordinator's is kept.
+    shard_config.profile_run = False
+    # The shards running at once share the run's limits.
+    if config.max_operations_per_second is not None:
+        shard_config.max_operations_per_second = config.max_operations_per_second / config.shard_processes
+    if config.max_bytes_per_second is not None:
+        shard_config.max_bytes_per_second = max(1, config.max_bytes_per_second // config.shard_processes)
+    run_cleaning_task(
+        shard_config,
+        _ShardUpdateQueue(_shard_event_queue, shard_id),
+        response_queue,
+        shard=shard,
+        stop_event=_shard_stop_event,
+        cancellation=_shard_cancellation
+    )
+
+def _refusal(request: Event) -> Response:
+    """The answer to a request from a shard that is being stopped anyway."""
+    match request:
+        case RequestConfirmation():
+            return UserConfirmationResponse(accepted=False)
+        case RequestBatchConfirmation():
+            return BatchConfirmationResponse(accepted_paths=[])
+        case RequestRetrySkipAbort():
+            return RetrySkipAbortResponse(choice=RetrySkipAbortChoice.ABORT)
+    raise TypeError(f"Unexpected request from shard: {request!r}")
+
+class _ShardCoordinator:
+    """
+    The coordinator's view of a sharded run: each shard's latest counters
+    (summed into progress) and throttle rates (summed over the running
+    shards), which shards have started and finished, and the batch
+    confirmations held back until they can be asked as one.
+    """
+
+    def __init__(
+        self,
+        shards: list[Shard],
+        max_workers: int,
+        update_queue: queue.Queue,
+        response_queue: queue.Queue,
+        estimate: TotalEstimate | None = None,
+    ):
+        self.shards = shards
+        self.max_workers = max_workers
+        self.update_queue = update_queue
+        self.response_queue = response_queue
+        self.progress = CleaningProgress()
+        self.progress_channel = ProgressChannel(update_queue, self.progress, estimate=estimate, io_rates=self.io_rates)
+        self.shard_response_queues: list = []
+        self.shard_counts: dict[int, tuple[int, int, int, int | None]] = {}
+        self.shard_rates: dict[int, tuple[float | None, float | None, int | None]] = {}
+        self.started: set[int] = set()
+        self.finished: set[int] = set()
+        self.batch_requests: dict[int, RequestBatchConfirmation] = {}
+        self.errors: list[ErrorOccurred] = []
+        self.stopping = False
+
+    def set_counts(self, shard_id: int, items_scanned: int, files_deleted: int, directories_removed: int, bytes_freed: int | None):
+        old_items, old_files, old_directories, _ = self.shard_counts.get(shard_id, (0, 0, 0, 0))
+        self.shard_counts[shard_id] = (items_scanned, files_deleted, directories_removed, bytes_freed)
+        self.progress.items_scanned += items_scanned - old_items
+        self.progress.files_deleted += files_deleted - old_files
+        self.progress.directories_removed += directories_removed - old_directories
+        # The shards of a run all count bytes or none do.
+        shard_bytes = [counts[3] for counts in self.shard_counts.values()]
+        self.progress.bytes_freed = None if None in shard_bytes else sum(shard_bytes)
+
+    def io_rates(self) -> tuple[float | None, float | None, int | None]:
+        """The running shards' throttle rates, summed; all None if the run is not throttled."""
+        rates = [rate for shard_id, rate in self.shard_rates.items() if shard_id not in self.finished]
+        if not any(operations is not None for operations, _, _ in rates):
+            return None, None, None
+        shard_bytes = [io_bytes for _, io_bytes, _ in rates if io_bytes is not None]
+        return (
+            sum(operations or 0.0 for operations, _, _ in rates),
+            sum(shard_bytes) if shard_bytes else None,
+            sum(concurrency or 0 for _, _, concurrency in rates) or None
+        )
+
+    def handle(self, shard_id: int, event: Event):
+        self.started.add(shard_id)
+        match event:
+            case ProgressUpdate(message, items_scanned, files_deleted, directories_removed, bytes_freed):
+                self.set_counts(shard_id, items_scanned, files_deleted, directories_removed, bytes_freed)
+                self.shard_rates[shard_id] = (event.operations_per_second, event.io_bytes_per_second, event.io_concurrency)
+                self.progress_channel.publish(message)
+
+            case RequestConfirmation() | RequestBatchConfirmation() | RequestRetrySkipAbort() if self.stopping:
+                self.shard_response_queues[shard_id].put(_refusal(event))
+
+            case RequestBatchConfirmation():
+                self.batch_requests[shard_id] = event
+
+            case RequestConfirmation() | RequestRetrySkipAbort():
+                self.shard_response_queues[shard_id].put(self.ask(event))
+
+            case RunStatistics():
+                self.progress.metrics.merge(event)
+
+            case CleaningResult(deleted_files_count, _, directories_removed, items_scanned, bytes_freed):
+                self.set_counts(shard_id, items_scanned, deleted_files_count, directories_removed, bytes_freed)
+                self.finished.add(shard_id)
+
+            case ErrorOccurred():
+                self.finished.add(shard_id)
+                self.fail(event)
+
+            case _:
+                self.update_queue.put(event)
+
+        self.ask_held_batches()
+
+    def fail(self, error: ErrorOccurred):
+        """Records a failed shard and stops the others."""
+        self.errors.append(error)
+        self.stopping = True
+
+    def ask(self, request: Event) -> Response:
+        """Forwards a request to the GUI and waits for the answer."""
+        self.progress_channel.flush()
+        self.update_queue.put(request)
+        return self.progress.metrics.timed('user response wait', self.response_queue.get)
+
+    def ask_held_batches(self):
+        """
+        Asks the held batch confirmations as one, once every running shard is
+        waiting for its answer and no further shard can start before one of
+        them finishes.
+        """
+        if not self.batch_requests:
+            return
+        if self.stopping:
+            for shard_id, request in self.batch_requests.items():
+                self.shard_response_queues[shard_id].put(_refusal(request))
+            self.batch_requests.clear()
+            return
+
+        running = len(self.started - self.finished)
+        all_started = len(self.started) == len(self.shards)
+        if len(self.batch_requests) < running or not (all_started or running >= self.max_workers):
+            return
+
+        requests = sorted(self.batch_requests.items())
+        self.batch_requests.clear()
+        response = self.ask(RequestBatchConfirmation(
+            directories=[directory for _, request in requests for directory in request.directories]
+        ))
+        accepted_paths = set(response.accepted_paths)
+        for shard_id, request in requests:
+            self.shard_response_queues[shard_id].put(BatchConfirmationResponse(
+                accepted_paths=[d.path for d in request.directories if d.path in accepted_paths]
+            ))
+
+def _run_sharded_cleaning_task(
+    config: Configuration,
+    update_queue: queue.Queue,
+    response_queue: queue.Queue,
+    estimate_total: bool = True,
+    cancellation: CancellationToken | None = None,
+):
+    """
+    Cleans the target directories in shards (see plan_shards) on a pool of
+    config.shard_processes processes, speaking the same protocol over
+    update_queue and response_queue as a single-process run.
+
+    Shards send their events, and their log records, to one queue. This
+    thread logs the records, sums up the shards' progress, forwards their
+    requests one at a time and routes each answer back to the shard that
+    asked. Batch confirmations are held back and asked as one (see
+    _ShardCoordinator.ask_held_batches). If a shard fails or is aborted, the
+    others are stopped. If cancellation is cancelled, so are the shards, and
+    their partial results are added up. The shards' results and statistics are merged into
+    one CleaningResult (or ErrorOccurred) and RunStatistics.
+    """
+    shards = plan_shards(config)
+    max_workers = min(config.shard_processes, len(shards))
+    # Journaled shards start from what their journals record, so they are not estimated.
+    estimate = TotalEstimate.start(config) if estimate_total and not config.use_journal else None
+    coordinator = _ShardCoordinator(shards, max_workers, update_queue, response_queue, estimate)
+    progress = coordinator.progress
+    if config.profile_run:
+        progress.metrics.start_profiling()
+
+    message = f"Cleaning {len(shards)} shards of {_describe_targets(config)} in {max_workers} processes..."
+    logging.info(message)
+    coordinator.progress_channel.publish(message)
+
+    # Shard processes are started fresh rather than forked from this
+    # (multi-threaded) process.
+    context = multiprocessing.get_context('spawn')
+    event_queue = context.Queue()
+    stop_event = context.Event()
+    cancel_event = context.Event()
+    try:
+        with context.Manager() as manager, ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_initialize_shard_process,
+            initargs=(event_queue, stop_event, cancel_event)
+        ) as executor:
+            coordinator.shard_response_queues = [manager.Queue() for _ in shards]
+            futures = [
+                executor.submit(_run_shard, config, shard, shard_id, coordinator.shard_response_queues[shard_id])
+                for shard_id, shard in enumerate(shards)
+            ]
+
+            while len(coordinator.finished) < len(shards):
+                if cancellation is not None and cancellation.is_cancelled and not cancel_event.is_set():
+                    cancel_event.set()
+                try:
+                    shard_id, event = event_queue.get(timeout=SHARD_POLL_SECONDS)
+                except queue.Empty:
+                    # A shard whose process died never reports back.
+                    for shard_id, future in enumerate(futures):
+                        if shard_id not in coordinator.finished and future.done() and future.exception():
+                            coordinator.finished.add(shard_id)
+                            coordinator.fail(ErrorOccurred(message=f"Cleaning {shards[shard_id].root} failed: {future.exception()}"))
+                            stop_event.set()
+                    coordinator.ask_held_batches()
+                    continue
+
+                if shard_id is None:
+                    logger = logging.getLogger(event.name)
+                    if logger.isEnabledFor(event.levelno):
+                        logger.handle(event)
+                    continue
+                coordinator.handle(shard_id, event)
+                if coordinator.stopping:
+                    stop_event.set()
+
+    except Exception as e:
+        stop_event.set()
+        coordinator.fail(ErrorOccurred(message=f"A critical error occurred: {e}", traceback=traceback.format_exc()))
+    finally:
+        event_queue.close()
+        event_queue.join_thread()
+        if estimate is not None:
+            estimate.stop()
+
+    coordinator.progress_channel.flush()
+    _report_run_statistics(progress, update_queue)
+    if coordinator.errors:
+        first_error = coordinator.errors[0]
+        if len(coordinator.errors) > 1:
+            first_error = ErrorOccurred(
+                message=f"{first_error.message}\n({len(coordinator.errors) - 1} more parts of the run failed too; see the log.)",
+                traceback=first_error.traceback
+            )
+        for error in coordinator.errors:
+            logging.error(f"Shard failed: {error.message}\n{error.traceback}")
+        update_queue.put(first_error)
+        return
+
+    update_queue.put(CleaningResult(
+        deleted_files_count=progress.files_deleted,
+        target_dir=_describe_targets(config),
+        directories_removed=progress.directories_removed,
+        items_scanned=progress.items_scanned,
+        bytes_freed=progress.bytes_freed,
+        cancelled=cancel_event.is_set()
+    ))
\ No newline at end of file
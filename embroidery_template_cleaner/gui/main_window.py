@@ -1,3 +1,4 @@
+import copy
 import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import filedialog, messagebox
@@ -6,16 +7,23 @@ import threading
 import logging
 from pathlib import Path
 
+from ..core.cancellation import CancellationToken
 from ..core.configuration import Configuration, TEMPLATE_FILE_EXTENSIONS
 from ..core.events import (
-    Event, StatusUpdate, RequestConfirmation, CleaningResult,
-    ErrorOccurred, UserConfirmationResponse, RequestRetrySkipAbort, RetrySkipAbortChoice, RetrySkipAbortResponse
+    Event, StatusUpdate, ProgressUpdate, RequestConfirmation, RequestBatchConfirmation, CleaningResult,
+    ErrorOccurred, UserConfirmationResponse, BatchConfirmationResponse, RequestRetrySkipAbort,
+    RetrySkipAbortChoice, RetrySkipAbortResponse
 )
+from ..core.journal import RunJournal
+from ..core.progress import format_byte_count, format_file_count
 from ..core.worker import run_cleaning_task
 from .widgets.progress_dialog import ProgressDialog
-from .widgets.confirmation_dialog import ScrollableConfirmationDialog
+from .widgets.confirmation_dialog import ScrollableConfirmationDialog, BatchConfirmationDialog
 from .widgets.retry_dialog import RetryDialog
 
+def _freeing(bytes_freed: int | None) -> str:
+    return "" if bytes_freed is None else f", freeing {format_byte_count(bytes_freed)}"
+
 class CleanerMainWindow(ttk.Frame):
     def __init__(self, master, config: Configuration):
         super().__init__(master)
@@ -70,8 +78,12 @@ class CleanerMainWindow(ttk.Frame):
     def update_config_from_gui(self):
         target_dir = Path(self.directory_entry.get()) if self.directory_entry.get() else None
         selected_exts = {ext for ext, var in self.extension_vars.items() if var.get()}
+        config = copy.copy(self.config)
+        config.target_directory = target_dir
+        config.extensions_to_delete = selected_exts
         try:
-            self.config = Configuration(target_directory=target_dir, extensions_to_delete=selected_exts)
+            # Every option is an __init__ argument; constructing it again validates the edited copy.
+            self.config = Configuration(**vars(config))
             return True
         except ValueError as err:
             messagebox.showerror("Invalid Configuration", str(err))
@@ -80,83 +92,146 @@ class CleanerMainWindow(ttk.Frame):
     def start_cleaner(self):
         if not self.update_config_from_gui():
             return
+
+        journal = None
+        if self.config.use_journal:
+            journal_path = RunJournal.find_unfinished(self.config.target_directory)
+            if journal_path and messagebox.askyesno(
+                "Resume Interrupted Run",
+                f"A previous run on {self.config.target_directory} was interrupted. Resume it instead of starting over?"
+            ):
+                try:
+                    journal = RunJournal.load(journal_path)
+                except ValueError as err:
+                    messagebox.showerror("Could Not Resume", str(err))
+                    return
+                logging.info(f"Resuming interrupted run from {journal_path}")
         
         self.action_button.config(state=tk.DISABLED)
-        self.progress_dialog = ProgressDialog(self.master)
+        cancellation = CancellationToken()
+        self.progress_dialog = ProgressDialog(self.master, on_cancel=cancellation.cancel)
         self.progress_dialog.start_operation()
 
         self.worker_thread = threading.Thread(
             target=run_cleaning_task,
-            args=(self.config, self.update_queue, self.response_queue),
+            args=(self.config, self.update_queue, self.response_queue, None, journal),
+            kwargs={'cancellation': cancellation},
             daemon=True
         )
         self.worker_thread.start()
         self.master.after(100, self._process_update_queue)
 
     def _process_update_queue(self):
-        try:
-            event: Event = self.update_queue.get_nowait()
-
-            match event:
-                case StatusUpdate(message):
-                    logging.info(message)
-                    if self.progress_dialog: 
-                        self.progress_dialog.update_status(message)
-                
-                case RequestConfirmation(path, files_in_dir):
-                    if self.progress_dialog: 
-                        self.progress_dialog.withdraw()
-                    
-                    dialog = ScrollableConfirmationDialog(
-                        self.master,
-                        title='Confirm Deletion',
-                        message_intro=f'The directory "{Path(path).name}" only contains display files:',
-                        items_to_list=files_in_dir,
-                        message_outro='Do you want to delete the folder and its contents?'
-                    )
-                    response = UserConfirmationResponse(accepted=dialog.result)
-                    logging.info(f"User confirmation for '{path}': {'Accepted' if response.accepted else 'Rejected'}")
-                    self.response_queue.put(response)
-
-                    if self.progress_dialog: 
-                        self.progress_dialog.deiconify()
-
-                case RequestRetrySkipAbort(op_desc, path, error_msg):
-                    if self.progress_dialog: self.progress_dialog.withdraw()
-
-                    dialog = RetryDialog(
-                        self.master,
-                        title="Operation Failed",
-                        description=op_desc,
-                        path=path,
-                        error=error_msg
-                    )
-                    logging.error(f"{error_msg} on {op_desc}")
-                    response = RetrySkipAbortResponse(choice=dialog.result)
-                    logging.info(f"User selection for error {error_msg} on {op_desc}: {response.choice.name}")
-                    self.response_queue.put(response)
-
-                    if self.progress_dialog: 
-                        self.progress_dialog.deiconify()
-
-                case CleaningResult(deleted_files_count, target_dir):
-                    self.cleanup_ui()
-                    logging.info(f"Operation complete. Deleted {deleted_files_count} files.")
-                    messagebox.showinfo("Operation Complete", f"Successfully deleted {deleted_files_count} files from {target_dir}!")
-                    return # Stop polling
-
-                case ErrorOccurred(message, traceback):
-                    self.cleanup_ui()
-                    logging.error(f"Error during cleaning: {message}\n{traceback}")
-                    messagebox.showerror("Error", message)
-                    return # Stop polling
-        
-        except queue.Empty:
-            if not (self.worker_thread and self.worker_thread.is_alive()):
-                self.cleanup_ui() # Worker finished unexpectedly
+        # Drain everything the worker has queued since the last tick, so the
+        # GUI never falls behind however fast events arrive.
+        while True:
+            try:
+                event: Event = self.update_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if not self._handle_event(event):
+                return # Stop polling
+
+        if not (self.worker_thread and self.worker_thread.is_alive()) and self.update_queue.empty():
+            self.cleanup_ui() # Worker finished unexpectedly
+            return
 
         self.master.after(100, self._process_update_queue)
 
+    def _handle_event(self, event: Event) -> bool:
+        """Handles one event from the worker. Returns False once the operation has ended."""
+        match event:
+            case StatusUpdate(message):
+                logging.info(message)
+                if self.progress_dialog: 
+                    self.progress_dialog.update_status(message)
+
+            case ProgressUpdate():
+                if self.progress_dialog: 
+                    self.progress_dialog.update_progress(event)
+            
+            case RequestConfirmation(path, files_in_dir):
+                if self.progress_dialog: 
+                    self.progress_dialog.withdraw()
+                
+                dialog = ScrollableConfirmationDialog(
+                    self.master,
+                    title='Confirm Deletion',
+                    message_intro=f'The directory "{Path(path).name}" only contains display files:',
+                    items_to_list=files_in_dir,
+                    message_outro='Do you want to delete the folder and its contents?'
+                )
+                response = UserConfirmationResponse(accepted=dialog.result)
+                logging.info(f"User confirmation for '{path}': {'Accepted' if response.accepted else 'Rejected'}")
+                self.response_queue.put(response)
+
+                if self.progress_dialog: 
+                    self.progress_dialog.deiconify()
+
+            case RequestBatchConfirmation(directories):
+                if self.progress_dialog: 
+                    self.progress_dialog.withdraw()
+
+                dialog = BatchConfirmationDialog(
+                    self.master,
+                    title='Confirm Deletion',
+                    message_intro=f'These {len(directories)} folders only contain display files:',
+                    directories=directories,
+                    message_outro='Do you want to delete the checked folders and their contents?'
+                )
+                response = BatchConfirmationResponse(accepted_paths=dialog.result)
+                logging.info(f"User confirmed {len(response.accepted_paths)} of {len(directories)} display-only folders")
+                self.response_queue.put(response)
+
+                if self.progress_dialog: 
+                    self.progress_dialog.deiconify()
+
+            case RequestRetrySkipAbort(op_desc, path, error_msg):
+                if self.progress_dialog: self.progress_dialog.withdraw()
+
+                dialog = RetryDialog(
+                    self.master,
+                    title="Operation Failed",
+                    description=op_desc,
+                    path=path,
+                    error=error_msg
+                )
+                logging.error(f"{error_msg} on {op_desc}")
+                response = RetrySkipAbortResponse(choice=dialog.result, apply_to_all=dialog.apply_to_all.get())
+                logging.info(f"User selection for error {error_msg} on {op_desc}: {response.choice.name}")
+                self.response_queue.put(response)
+
+                if self.progress_dialog: 
+                    self.progress_dialog.deiconify()
+
+            case CleaningResult(deleted_files_count, target_dir, directories_removed, bytes_freed=bytes_freed, cancelled=True):
+                self.cleanup_ui()
+                logging.info(f"Operation cancelled. Deleted {format_file_count(deleted_files_count, bytes_freed)}.")
+                messagebox.showinfo(
+                    "Operation Cancelled",
+                    f"Cleaning {target_dir} was cancelled after deleting {deleted_files_count} files and "
+                    f"{directories_removed} folders{_freeing(bytes_freed)}."
+                )
+                return False
+
+            case CleaningResult(deleted_files_count, target_dir, bytes_freed=bytes_freed):
+                self.cleanup_ui()
+                logging.info(f"Operation complete. Deleted {format_file_count(deleted_files_count, bytes_freed)}.")
+                messagebox.showinfo(
+                    "Operation Complete",
+                    f"Successfully deleted {deleted_files_count} files from {target_dir}{_freeing(bytes_freed)}!"
+                )
+                return False
+
+            case ErrorOccurred(message, traceback):
+                self.cleanup_ui()
+                logging.error(f"Error during cleaning: {message}\n{traceback}")
+                messagebox.showerror("Error", message)
+                return False
+
+        return True
+
     def cleanup_ui(self):
         if self.progress_dialog:
             self.progress_dialog.stop_operation()
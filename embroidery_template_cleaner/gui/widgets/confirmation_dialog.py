@@ -1,5 +1,6 @@
 import tkinter as tk
 import tkinter.ttk as ttk
+from ...core.events import DisplayOnlyDirectory
 
 class ScrollableConfirmationDialog(tk.Toplevel):
     def __init__(self, parent, title, message_intro, items_to_list, message_outro):
@@ -30,8 +31,7 @@ class ScrollableConfirmationDialog(tk.Toplevel):
         self.text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         if items_to_list:
-            for item in items_to_list:
-                self.text_widget.insert(tk.END, f"\t{item}\n")
+            self._insert_items(items_to_list)
         else:
             self.text_widget.insert(tk.END, "\t(No items to show)\n")
         self.text_widget.config(state=tk.DISABLED)
@@ -55,6 +55,10 @@ class ScrollableConfirmationDialog(tk.Toplevel):
         self.focus_set()
         self.wait_window(self)
 
+    def _insert_items(self, items_to_list):
+        for item in items_to_list:
+            self.text_widget.insert(tk.END, f"\t{item}\n")
+
     def _center_window(self):
         self.update_idletasks()
         parent_x, parent_y = self.parent.winfo_rootx(), self.parent.winfo_rooty()
@@ -66,4 +70,26 @@ class ScrollableConfirmationDialog(tk.Toplevel):
 
     def _on_yes(self): self.result = True; self.destroy()
     def _on_no(self): self.result = False; self.destroy()
-    def _on_close(self): self.result = False; self.destroy()
\ No newline at end of file
+    def _on_close(self): self.result = False; self.destroy()
+
+class BatchConfirmationDialog(ScrollableConfirmationDialog):
+    """
+    Lists every display-only directory of a run with a checkbox, so they can
+    all be confirmed at once. result is the list of checked directory paths
+    (empty if the user answers No or closes the dialog).
+    """
+    def __init__(self, parent, title, message_intro, directories: list[DisplayOnlyDirectory], message_outro):
+        self.selection_vars: dict[str, tk.BooleanVar] = {}
+        super().__init__(parent, title, message_intro, directories, message_outro)
+
+    def _insert_items(self, directories: list[DisplayOnlyDirectory]):
+        for directory in directories:
+            var = tk.BooleanVar(self, value=True)
+            self.selection_vars[directory.path] = var
+            checkbox = ttk.Checkbutton(self.text_widget, text=directory.path, variable=var)
+            self.text_widget.window_create(tk.END, window=checkbox)
+            self.text_widget.insert(tk.END, f"\n\t\t{', '.join(directory.files_in_dir)}\n")
+
+    def _on_yes(self): self.result = [path for path, var in self.selection_vars.items() if var.get()]; self.destroy()
+    def _on_no(self): self.result = []; self.destroy()
+    def _on_close(self): self.result = []; self.destroy()
\ No newline at end of file
@@ -3,29 +3,74 @@ import tkinter.ttk as ttk
 from tkinter import messagebox
 import time
 
+from ...core.events import ProgressUpdate
+from ...core.progress import estimate_remaining_seconds, format_duration, format_file_count, format_io_rates
+
+# The dialog is redrawn at this fixed interval, however often progress arrives.
+REFRESH_INTERVAL_MS = 250
+
 class ProgressDialog(tk.Toplevel):
-    def __init__(self, parent):
+    """
+    Shows a run's progress: a bar that turns from indeterminate to determinate
+    once the run's estimated total is known, the time elapsed and remaining,
+    and the latest counters and message. Updates are only stored as they
+    arrive; the dialog is redrawn every REFRESH_INTERVAL_MS.
+
+    on_cancel, if given, is called when the user cancels the run, with the
+    Cancel button or by closing the dialog.
+    """
+    def __init__(self, parent, on_cancel=None):
         super().__init__(parent)
         self.parent = parent
+        self.on_cancel = on_cancel
         self.transient(parent)
         self.grab_set()
         self.title("Cleaning in Progress...")
         self.resizable(False, False)
-        self.protocol("WM_DELETE_WINDOW", lambda: messagebox.showwarning("In Progress", "Cleaning operation is running. Please wait."))
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
         self.timer_label = ttk.Label(self, text="Elapsed Time: 00:00:00", font=("Arial", 10))
-        self.timer_label.pack(pady=(10, 5), padx=20)
+        self.timer_label.pack(pady=(10, 0), padx=20)
 
-        self.spinner = ttk.Progressbar(self, mode='indeterminate', length=300)
-        self.spinner.pack(pady=5, padx=20)
+        self.remaining_label = ttk.Label(self, text="Time Remaining: estimating...", font=("Arial", 10))
+        self.remaining_label.pack(pady=(0, 5), padx=20)
+
+        self.progress_bar = ttk.Progressbar(self, mode='indeterminate', length=300)
+        self.progress_bar.pack(pady=5, padx=20)
+
+        self.stats_label = ttk.Label(self, text="", justify=tk.LEFT, font=("Arial", 9))
+        self.stats_label.pack(pady=(5, 0), padx=20, fill=tk.X)
 
         self.status_label = ttk.Label(self, text="Initializing...", wraplength=280, justify=tk.LEFT, font=("Arial", 9))
         self.status_label.pack(pady=(5, 10), padx=20, fill=tk.X, expand=True)
 
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self._cancel)
+        self.cancel_button.pack(pady=(0, 10))
+        if on_cancel is None:
+            self.cancel_button.config(state=tk.DISABLED)
+
         self._start_time = None
         self._timer_id = None
+        self._latest_update: ProgressUpdate | None = None
+        self._latest_update_time = 0.0
+        self._pending_message: str | None = None
+        self._determinate = False
         self._center_window()
 
+    def _on_close(self):
+        if self.on_cancel is None:
+            messagebox.showwarning("In Progress", "Cleaning operation is running. Please wait.", parent=self)
+        elif str(self.cancel_button['state']) != tk.DISABLED and messagebox.askyesno(
+            "Cancel Cleaning", "Stop cleaning? Files already deleted stay deleted.", parent=self
+        ):
+            self._cancel()
+
+    def _cancel(self):
+        self.cancel_button.config(state=tk.DISABLED, text="Cancelling...")
+        self.status_label.config(text="Cancelling; finishing the deletions already under way...")
+        self._pending_message = None
+        self.on_cancel()
+
     def _center_window(self):
         self.update_idletasks()
         parent_x, parent_y = self.parent.winfo_rootx(), self.parent.winfo_rooty()
@@ -36,22 +81,59 @@ class ProgressDialog(tk.Toplevel):
         self.geometry(f"+{x_pos}+{y_pos}")
 
     def start_operation(self):
-        self.spinner.start(15)
-        self._start_time = time.time()
-        self._update_timer_display()
+        self.progress_bar.start(15)
+        self._start_time = time.monotonic()
+        self._refresh()
 
-    def _update_timer_display(self):
+    def _refresh(self):
         if self._start_time is None: return
-        elapsed = int(time.time() - self._start_time)
-        h, m, s = elapsed // 3600, (elapsed % 3600) // 60, elapsed % 60
-        self.timer_label.config(text=f"Elapsed Time: {h:02}:{m:02}:{s:02}")
-        self._timer_id = self.after(1000, self._update_timer_display)
+        now = time.monotonic()
+        self.timer_label.config(text=f"Elapsed Time: {format_duration(now - self._start_time)}")
+        update = self._latest_update
+        if update is not None:
+            self._show_update(update, now - self._latest_update_time)
+        self._timer_id = self.after(REFRESH_INTERVAL_MS, self._refresh)
+
+    def _show_update(self, update: ProgressUpdate, age: float):
+        total = update.estimated_total_items
+        if total and not self._determinate:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode='determinate')
+            self._determinate = True
+        if self._determinate:
+            # The estimate may be a little short; the bar then waits at full.
+            total = max(total or 0, 1)
+            self.progress_bar.config(maximum=total, value=min(update.items_scanned, total))
+
+        remaining = estimate_remaining_seconds(update)
+        if remaining is not None:
+            # Counts down between updates.
+            self.remaining_label.config(text=f"Time Remaining: {format_duration(max(0.0, remaining - age))}")
+
+        scanned = f"Scanned {update.items_scanned}" + (f" of about {total}" if self._determinate else "")
+        io_rates = format_io_rates(update)
+        self.stats_label.config(text=(
+            f"{scanned} items ({update.items_per_second:.0f}/s)\n"
+            f"Deleted {format_file_count(update.files_deleted, update.bytes_freed)} "
+            f"and {update.directories_removed} folders"
+            + ("" if io_rates is None else f"\nThrottled: {io_rates}")
+        ))
+        if self._pending_message is not None:
+            self.status_label.config(text=self._pending_message)
+            self._pending_message = None
+
+    def update_progress(self, update: ProgressUpdate):
+        """Records the latest progress; it is shown at the next refresh."""
+        self._latest_update = update
+        self._latest_update_time = time.monotonic()
+        self._pending_message = update.message
 
     def update_status(self, message):
         self.status_label.config(text=message)
+        self._pending_message = None
 
     def stop_operation(self):
-        self.spinner.stop()
+        self.progress_bar.stop()
         if self._timer_id:
             self.after_cancel(self._timer_id)
         self._timer_id = None
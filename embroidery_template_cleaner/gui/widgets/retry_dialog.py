@@ -9,6 +9,7 @@ class RetryDialog(tk.Toplevel):
         self.title(title)
         self.parent = parent
         self.result = RetrySkipAbortChoice.SKIP  # Default to skipping
+        self.apply_to_all = tk.BooleanVar(self, value=False)
 
         main_frame = ttk.Frame(self, padding="15")
         main_frame.pack(expand=True, fill=tk.BOTH)
@@ -22,7 +23,10 @@ class RetryDialog(tk.Toplevel):
         path_label.pack(pady=(0, 10), anchor="w", padx=10)
         
         error_label = ttk.Label(main_frame, text=f"Error: {error}", wraplength=480, justify=tk.LEFT)
-        error_label.pack(pady=(0, 15), anchor="w")
+        error_label.pack(pady=(0, 10), anchor="w")
+
+        apply_to_all_check = ttk.Checkbutton(main_frame, text="Skip or abort all similar errors without asking", variable=self.apply_to_all)
+        apply_to_all_check.pack(pady=(0, 15), anchor="w")
 
         # Button frame
         button_frame = ttk.Frame(main_frame)
@@ -1,26 +1,20 @@
 # file_cleaner/main.py
-import tkinter as tk
 import logging
-from logging.handlers import RotatingFileHandler
-
-# Set up logging
-from embroidery_template_cleaner.core.configuration import LOG_FILE_LOCATION, load_config, save_config
-log_handler = RotatingFileHandler(
-    filename=LOG_FILE_LOCATION, 
-    maxBytes=5*1024*1024, # 5MB
-    backupCount=3
-)
-logging.basicConfig(
-    handlers=[log_handler, logging.StreamHandler()], # Also log to console
-    level=logging.INFO, 
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-from embroidery_template_cleaner.gui.main_window import CleanerMainWindow
+import multiprocessing
+import sys
 
 VERSION = 'v2.0.2'
 
 def main():
+    # Tk and the GUI are imported here rather than at module level so that
+    # headless runs (see below) never pay for them.
+    import tkinter as tk
+
+    from embroidery_template_cleaner.core.configuration import load_config, save_config, setup_logging
+    setup_logging()
+
+    from embroidery_template_cleaner.gui.main_window import CleanerMainWindow
+
     root = tk.Tk()
     root.title(f"Embroidery Template Cleaner {VERSION}")
     
@@ -42,4 +36,10 @@ def main():
         tk.messagebox.showerror("Fatal Error", f"A critical error occurred: {e}\nSee log file for details.")
 
 if __name__ == "__main__":
+    # Lets the frozen executable start the processes of a sharded run.
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        # Any command-line arguments select the headless CLI.
+        from embroidery_template_cleaner.cli import main as cli_main
+        sys.exit(cli_main())
     main()
\ No newline at end of file
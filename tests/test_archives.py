@@ -0,0 +1,98 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from embroidery_template_cleaner.core.archives import filter_archive, UnsupportedArchiveError
+from embroidery_template_cleaner.core.rules import DeletionRules
+
+
+class _UnseekableWriter(io.RawIOBase):
+    """Makes zipfile write data descriptors, as streaming archivers do."""
+
+    def __init__(self, handle):
+        self._handle = handle
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._handle.write(data)
+
+
+class FilterArchiveTests(unittest.TestCase):
+
+    MEMBERS = {
+        'rose/rose.pes': b'pes' * 1000,
+        'rose/rose.dst': b'dst' * 1000,
+        'rose/röschen.DST': b'umlaut' * 100,
+        'rose/preview.png': b'png' * 100,
+    }
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = Path(self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _make_archive(self, name: str, streamed: bool = False) -> Path:
+        path = self.root / name
+        with open(path, 'wb') as handle:
+            target = _UnseekableWriter(handle) if streamed else handle
+            with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for member_name, data in self.MEMBERS.items():
+                    with archive.open(member_name, 'w') as member:
+                        member.write(data)
+                archive.comment = b'kept comment'
+        return path
+
+    def _assert_filtered(self, path: Path):
+        with zipfile.ZipFile(path) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(sorted(archive.namelist()), ['rose/preview.png', 'rose/rose.pes'])
+            for name in archive.namelist():
+                self.assertEqual(archive.read(name), self.MEMBERS[name])
+            self.assertEqual(archive.comment, b'kept comment')
+
+    def test_removes_matching_members(self):
+        path = self._make_archive('plain.zip')
+        size = path.stat().st_size
+        result = filter_archive(str(path), DeletionRules({'.dst'}))
+        self.assertEqual(result.members_removed, 2)
+        self.assertEqual(result.bytes_saved, size - path.stat().st_size)
+        self._assert_filtered(path)
+
+    def test_keeps_data_descriptors(self):
+        path = self._make_archive('streamed.zip', streamed=True)
+        with zipfile.ZipFile(path) as archive:
+            self.assertTrue(all(member.flag_bits & 0x08 for member in archive.infolist()))
+        result = filter_archive(str(path), DeletionRules({'.dst'}))
+        self.assertEqual(result.members_removed, 2)
+        self._assert_filtered(path)
+
+    def test_matches_non_ascii_names(self):
+        path = self._make_archive('names.zip')
+        filter_archive(str(path), DeletionRules({'.dst'}))
+        with zipfile.ZipFile(path) as archive:
+            self.assertNotIn('rose/röschen.DST', archive.namelist())
+
+    def test_nothing_to_remove_leaves_archive_untouched(self):
+        path = self._make_archive('untouched.zip')
+        before = path.read_bytes()
+        result = filter_archive(str(path), DeletionRules({'.jef'}))
+        self.assertEqual(result.members_removed, 0)
+        self.assertEqual(path.read_bytes(), before)
+
+    def test_bad_archive_raises(self):
+        path = self.root / 'bad.zip'
+        path.write_bytes(b'not a zip')
+        with self.assertRaises((zipfile.BadZipFile, UnsupportedArchiveError)):
+            filter_archive(str(path), DeletionRules({'.dst'}))
+        self.assertEqual(path.read_bytes(), b'not a zip')
+
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
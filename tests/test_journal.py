@@ -0,0 +1,104 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from embroidery_template_cleaner.core.configuration import Configuration
+from embroidery_template_cleaner.core.events import RequestConfirmation, UserConfirmationResponse
+from embroidery_template_cleaner.core.journal import RunJournal, resume_journal_generator
+from embroidery_template_cleaner.core.planner import plan_directory_generator
+
+
+def _drive(generator):
+    """Runs a generator to its return value, accepting every confirmation."""
+    try:
+        event = next(generator)
+        while True:
+            if isinstance(event, RequestConfirmation):
+                event = generator.send(UserConfirmationResponse(accepted=True))
+            else:
+                event = next(generator)
+    except StopIteration as stop:
+        return stop.value
+
+
+class JournalResumeTests(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        base = Path(self._directory.name)
+        self.target = base / 'target'
+        self.journals = base / 'journals'
+        for design in range(3):
+            folder = self.target / f"design{design}"
+            folder.mkdir(parents=True)
+            (folder / f"d{design}.pes").write_text('x' * 10)
+            (folder / f"d{design}.dst").write_text('x' * 10)
+        self.config = Configuration(
+            target_directory=self.target,
+            extensions_to_delete={'.pes', '.dst'},
+            confirmation_policy='never'
+        )
+        self.plan = _drive(plan_directory_generator(self.config))
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_load_restores_plan_and_progress(self):
+        journal = RunJournal.create(self.plan, self.journals)
+        journal.file_settled(self.plan.files[0], kept=False, deleted=True)
+        journal.file_settled(self.plan.files[1], kept=True, deleted=False)
+        journal.close()
+
+        loaded = RunJournal.load(journal.path)
+        self.assertEqual(loaded.plan.files, self.plan.files)
+        self.assertEqual(loaded.files_settled, 2)
+        self.assertEqual(loaded.files_deleted, 1)
+        self.assertEqual(loaded.kept_files, {self.plan.files[1]})
+        self.assertFalse(loaded.finished)
+        loaded.close()
+
+    def test_torn_tail_is_truncated(self):
+        journal = RunJournal.create(self.plan, self.journals)
+        journal.file_settled(self.plan.files[0], kept=False, deleted=True)
+        journal.close()
+        intact_size = journal.path.stat().st_size
+        with open(journal.path, 'a', encoding='utf-8') as handle:
+            handle.write('{"type": "kept_fi')
+
+        loaded = RunJournal.load(journal.path)
+        self.assertEqual(loaded.files_settled, 1)
+        loaded.close()
+        self.assertGreater(journal.path.stat().st_size, intact_size)
+        # The checkpoint written on close starts on a line of its own.
+        RunJournal.load(journal.path).close()
+
+    def test_resume_skips_settled_files(self):
+        self.assertEqual(len(self.plan.files), 6)
+        journal = RunJournal.create(self.plan, self.journals)
+        skipped = self.plan.files[:2]
+        for relative_path in skipped:
+            journal.file_settled(relative_path, kept=True, deleted=False)
+        journal.close()
+
+        loaded = RunJournal.load(journal.path)
+        deleted = _drive(resume_journal_generator(loaded, self.config))
+        self.assertEqual(deleted, 4)
+        remaining = sorted(str(path.relative_to(self.target)) for path in self.target.rglob('*.*'))
+        self.assertEqual(remaining, sorted(skipped))
+        # Folders holding kept files stay; the others are removed.
+        kept_folders = {str(Path(relative_path).parent) for relative_path in skipped}
+        self.assertEqual({path.name for path in self.target.iterdir()}, kept_folders)
+        self.assertTrue(loaded.finished)
+        self.assertIsNone(RunJournal.find_unfinished(self.target, self.journals))
+
+    def test_interrupted_plan_cannot_be_resumed(self):
+        journal = RunJournal.create(self.plan, self.journals)
+        journal.close()
+        lines = journal.path.read_text(encoding='utf-8').splitlines(keepends=True)
+        journal.path.write_text(''.join(line for line in lines if '"planned"' not in line), encoding='utf-8')
+        with self.assertRaises(ValueError):
+            RunJournal.load(journal.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,53 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from embroidery_template_cleaner.core.quarantine import Quarantine, read_manifest, QUARANTINE_MANIFEST_NAME
+
+
+class ReadManifestTests(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = Path(self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _write_manifest(self, content: bytes) -> Path:
+        run_directory = self.root / 'run'
+        run_directory.mkdir()
+        header = json.dumps({'type': 'quarantine'}).encode() + b'\n'
+        (run_directory / QUARANTINE_MANIFEST_NAME).write_bytes(header + content)
+        return run_directory
+
+    def test_lists_moved_files(self):
+        (self.root / 'a').mkdir()
+        for name in ('a/one.pes', 'two.dst'):
+            (self.root / name).write_text('x')
+        quarantine = Quarantine(self.root)
+        quarantine.move(str(self.root / 'a' / 'one.pes'))
+        quarantine.move(str(self.root / 'two.dst'))
+        quarantine.close()
+        self.assertEqual(read_manifest(quarantine.run_directory), [str(Path('a/one.pes')), 'two.dst'])
+
+    def test_torn_final_line_is_dropped(self):
+        run_directory = self._write_manifest(b'"one.pes"\n"two.d')
+        self.assertEqual(read_manifest(run_directory), ['one.pes'])
+
+    def test_unterminated_final_line_is_dropped(self):
+        # Valid JSON, but the move it announced may not have happened.
+        run_directory = self._write_manifest(b'"one.pes"\n"two.dst"')
+        self.assertEqual(read_manifest(run_directory), ['one.pes'])
+
+    def test_duplicates_are_listed_once(self):
+        run_directory = self._write_manifest(b'"one.pes"\n"two.dst"\n"one.pes"\n')
+        self.assertEqual(read_manifest(run_directory), ['one.pes', 'two.dst'])
+
+    def test_missing_manifest_lists_nothing(self):
+        self.assertEqual(read_manifest(self.root / 'missing'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,108 @@
+import os
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+from embroidery_template_cleaner.core.rules import IgnoreContext, IGNORE_FILE_NAME, _translate_glob, inherited_ignore_context
+
+
+def _matches(pattern: str, path: str) -> bool:
+    return re.fullmatch(_translate_glob(pattern), path.replace('/', os.sep)) is not None
+
+
+class TranslateGlobTests(unittest.TestCase):
+
+    def test_star_and_question_mark_stop_at_separators(self):
+        self.assertTrue(_matches('*.pes', 'rose.pes'))
+        self.assertFalse(_matches('*.pes', 'roses/rose.pes'))
+        self.assertTrue(_matches('rose?.pes', 'rose1.pes'))
+        self.assertFalse(_matches('a?b', 'a/b'))
+
+    def test_double_star_crosses_separators(self):
+        self.assertTrue(_matches('**/rose.pes', 'rose.pes'))
+        self.assertTrue(_matches('**/rose.pes', 'a/b/rose.pes'))
+        self.assertTrue(_matches('vendor/**', 'vendor/a/b'))
+
+    def test_character_classes(self):
+        self.assertTrue(_matches('d[0-9].pes', 'd3.pes'))
+        self.assertFalse(_matches('d[!0-9].pes', 'd3.pes'))
+        self.assertTrue(_matches('d[!0-9].pes', 'dx.pes'))
+        self.assertTrue(_matches('a[b', 'a[b'))
+
+    def test_other_characters_are_literal(self):
+        self.assertTrue(_matches('a+b(1).pes', 'a+b(1).pes'))
+        self.assertFalse(_matches('a.pes', 'aXpes'))
+
+
+class IgnoreContextTests(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = Path(self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _context(self, directory: Path, *lines: str, parent: IgnoreContext | None = None) -> IgnoreContext:
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / IGNORE_FILE_NAME).write_text('\n'.join(lines), encoding='utf-8')
+        return (parent or IgnoreContext()).child(directory)
+
+    def _ignored(self, context: IgnoreContext, relative_path: str, is_dir: bool = False) -> bool:
+        return context.is_ignored(str(self.root / relative_path), is_dir)
+
+    def test_without_ignore_file_nothing_is_ignored(self):
+        context = IgnoreContext().child(self.root)
+        self.assertFalse(self._ignored(context, 'rose.pes'))
+
+    def test_unanchored_pattern_matches_at_any_depth(self):
+        context = self._context(self.root, '*.PES')
+        self.assertTrue(self._ignored(context, 'rose.pes'))
+        self.assertTrue(self._ignored(context, 'a/b/rose.pes'))
+        self.assertFalse(self._ignored(context, 'rose.dst'))
+
+    def test_anchored_pattern_matches_below_the_ignore_file(self):
+        context = self._context(self.root, 'vendor/*.pes')
+        self.assertTrue(self._ignored(context, 'vendor/rose.pes'))
+        self.assertFalse(self._ignored(context, 'other/vendor/rose.pes'))
+
+    def test_trailing_slash_matches_directories_only(self):
+        context = self._context(self.root, 'keep/')
+        self.assertTrue(self._ignored(context, 'keep', is_dir=True))
+        self.assertFalse(self._ignored(context, 'keep', is_dir=False))
+
+    def test_comments_blank_and_negated_lines_are_skipped(self):
+        context = self._context(self.root, '# *.pes', '', '!*.dst')
+        self.assertFalse(self._ignored(context, 'rose.pes'))
+        self.assertFalse(self._ignored(context, 'rose.dst'))
+
+    def test_patterns_accumulate_down_the_tree(self):
+        parent = self._context(self.root, '*.pes')
+        child = self._context(self.root / 'vendor', '*.dst', parent=parent)
+        self.assertTrue(self._ignored(child, 'vendor/rose.pes'))
+        self.assertTrue(self._ignored(child, 'vendor/rose.dst'))
+        self.assertFalse(self._ignored(parent, 'rose.dst'))
+
+    @unittest.skipIf(os.name == 'nt' or os.geteuid() == 0, "file permissions are not enforced")
+    def test_unreadable_ignore_file_ignores_everything(self):
+        ignore_file = self.root / IGNORE_FILE_NAME
+        ignore_file.write_text('*.pes', encoding='utf-8')
+        ignore_file.chmod(0)
+        try:
+            context = IgnoreContext().child(self.root)
+        finally:
+            ignore_file.chmod(0o644)
+        self.assertTrue(self._ignored(context, 'rose.dst'))
+
+    def test_inherited_context_ignores_below_an_ignored_directory(self):
+        self._context(self.root, 'keep/')
+        (self.root / 'keep' / 'inner').mkdir(parents=True)
+        context = inherited_ignore_context(self.root, self.root / 'keep' / 'inner')
+        self.assertTrue(self._ignored(context, 'keep/inner/rose.pes'))
+        context = inherited_ignore_context(self.root, self.root / 'other')
+        self.assertFalse(self._ignored(context, 'other/rose.pes'))
+
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,79 @@
+import time
+import unittest
+
+from embroidery_template_cleaner.core.throttle import TokenBucket, IoThrottle, LATENCY_RISE_FACTOR
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    def test_burst_is_granted_without_waiting(self):
+        bucket = TokenBucket(rate=100)
+        start = time.monotonic()
+        for _ in range(100):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_rate_holds_past_the_burst(self):
+        bucket = TokenBucket(rate=100)
+        start = time.monotonic()
+        for _ in range(120):
+            bucket.acquire()
+        # 100 tokens of burst, then 20 paid for at 100 per second.
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_large_request_is_paid_by_the_next_caller(self):
+        bucket = TokenBucket(rate=100)
+        start = time.monotonic()
+        bucket.acquire(200)
+        self.assertLess(time.monotonic() - start, 0.1)
+        bucket.acquire()
+        # The debt of 100 tokens takes a second to pay back.
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+
+
+class AdaptiveThrottleTests(unittest.TestCase):
+
+    def test_steady_latency_keeps_full_concurrency(self):
+        throttle = IoThrottle(adaptive=True, max_concurrency=8)
+        for _ in range(50):
+            throttle._adapt(0.01)
+        self.assertEqual(throttle.concurrency, 8.0)
+
+    def test_rising_latency_halves_concurrency_once_a_round(self):
+        throttle = IoThrottle(adaptive=True, max_concurrency=8)
+        throttle._adapt(0.01)
+        slow = 0.01 * LATENCY_RISE_FACTOR * 10
+        concurrency_seen = []
+        for _ in range(8):
+            throttle._adapt(slow)
+            concurrency_seen.append(throttle.concurrency)
+        self.assertEqual(throttle.concurrency, 4.0)
+        # Halved exactly once in the round of 8 completions.
+        self.assertEqual(sorted(set(concurrency_seen)), [4.0, 8.0])
+
+    def test_concurrency_never_drops_below_one(self):
+        throttle = IoThrottle(adaptive=True, max_concurrency=4)
+        throttle._adapt(0.001)
+        for _ in range(200):
+            throttle._adapt(1.0)
+        self.assertEqual(throttle.concurrency, 1.0)
+
+    def test_concurrency_recovers_additively(self):
+        throttle = IoThrottle(adaptive=True, max_concurrency=4)
+        throttle.concurrency = 1.0
+        throttle._adapt(0.01)
+        self.assertEqual(throttle.concurrency, 2.0)
+        throttle._adapt(0.01)
+        self.assertEqual(throttle.concurrency, 2.5)
+
+    def test_operations_and_bytes_are_counted(self):
+        throttle = IoThrottle(operations_per_second=1000, bytes_per_second=10**9)
+        with throttle.operation(size=10):
+            pass
+        throttle.pace()
+        self.assertEqual(throttle.operations, 2)
+        self.assertEqual(throttle.bytes, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file